@@ -0,0 +1,111 @@
+"""
+Admission control of the inference routes, per worker.
+
+At most `max_concurrent` requests run inference at once (each one holds a
+threadpool thread and the model). Up to `max_queue` more wait their turn,
+FIFO, on the event loop without holding a thread. A request that finds the
+queue full is refused at once (429), and one whose deadline passes while it
+waits leaves the queue (503). Neither reaches the model, and both responses
+carry Retry-After.
+
+All methods run on the event loop of the worker (async routes), so the
+state needs no lock. `on_change(in_flight, queued, rejected_reason)` is
+called on every transition (Prometheus gauges, see metrics.py).
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+
+
+class Rejected(Exception):
+    """Request shed before inference: HTTP `status` with Retry-After `retry_after_s`."""
+
+    def __init__(self, status: int, reason: str, retry_after_s: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """Concurrency cap, bounded FIFO wait queue and per-request deadlines; see the module docstring."""
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 64, retry_after_s: int = 1,
+                 on_change: Optional[Callable[[int, int, Optional[str]], None]] = None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after_s = max(1, int(retry_after_s))
+        self.on_change = on_change
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.waited = 0
+        self.rejected = {QUEUE_FULL: 0, DEADLINE: 0}
+
+    def _changed(self, rejected: Optional[str] = None) -> None:
+        if rejected is not None:
+            self.rejected[rejected] += 1
+        if self.on_change is not None:
+            self.on_change(self.in_flight, len(self._waiters), rejected)
+
+    async def acquire(self, deadline: float) -> None:
+        """Wait for a slot until `deadline` (time.monotonic()); raises Rejected."""
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self._changed()
+            return
+        remaining = deadline - time.monotonic()
+        if len(self._waiters) >= self.max_queue:
+            self._changed(QUEUE_FULL)
+            raise Rejected(429, "too many requests queued", self.retry_after_s)
+        if remaining <= 0:
+            self._changed(DEADLINE)
+            raise Rejected(503, "deadline exceeded before admission", self.retry_after_s)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._changed()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), remaining)
+        except BaseException as e:  # deadline, or the client went away
+            if fut.done() and not fut.cancelled():
+                self.release()  # the slot was handed over just as we gave up
+            else:
+                fut.cancel()
+                self._waiters.remove(fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self._changed(DEADLINE)
+                raise Rejected(503, "deadline exceeded while queued", self.retry_after_s) from None
+            self._changed()
+            raise
+        self.admitted += 1
+        self.waited += 1
+
+    def release(self) -> None:
+        """Give the slot to the oldest waiter still queued, or free it."""
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # in_flight unchanged: the slot changes hands
+                self._changed()
+                return
+        self.in_flight -= 1
+        self._changed()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "admitted_after_wait": self.waited,
+            "rejected_queue_full": self.rejected[QUEUE_FULL],
+            "rejected_deadline": self.rejected[DEADLINE],
+        }
@@ -0,0 +1,246 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Names accepted by INFERENCE_BACKEND
+BACKENDS = ("keras", "tf_function", "tflite", "onnx", "transformer")
+# Backends that need TensorFlow / Keras at runtime
+KERAS_BACKENDS = ("keras", "tf_function")
+
+
+def parse_buckets(spec: str) -> tuple:
+    """Parse an env value such as "1,4,16" into a sorted tuple of ints."""
+    return tuple(sorted({int(b) for b in spec.split(",") if b.strip()}))
+
+
+def variable_length_model(model: Any) -> Any:
+    """
+    Same graph and *same weight variables* as `model`, rebuilt on an input of
+    shape (None, None) so it accepts sequences shorter than the training
+    `max_len` (Keras rejects them on the original fixed-length input).
+    """
+    from tensorflow import keras
+
+    inputs = getattr(model, "inputs", None)
+    in_dtype = inputs[0].dtype if inputs else "int32"
+    return keras.models.clone_model(
+        model,
+        input_tensors=keras.Input(shape=(None,), dtype=in_dtype),
+        clone_function=lambda layer: layer,  # reuse layers -> shared weights
+    )
+
+
+def pick_length_bucket(x: np.ndarray, length_buckets: Sequence[int]) -> int:
+    """
+    Smallest bucket holding the longest row of a post-padded batch
+    (id 0 is only used for padding, so the row length is its non-zero count).
+    """
+    longest = int(np.count_nonzero(x, axis=1).max()) if len(x) else 0
+    i = int(np.searchsorted(length_buckets, longest, side="left"))
+    return length_buckets[min(i, len(length_buckets) - 1)]
+
+
+class LengthBucketedForward:
+    """
+    Runs a post-padded (n, max_len) batch at the smallest length bucket that
+    holds its longest row: trailing padding columns are cut before the model.
+
+    Probabilities equal the full-length ones when the model masks padding
+    (Embedding(mask_zero=True)); otherwise the Conv1D / LSTM no longer see the
+    trailing zeros and results differ slightly (measure with
+    benchmarks/bench_length_buckets.py before enabling).
+    """
+
+    def __init__(self, forward_at: Callable[[np.ndarray], np.ndarray], length_buckets: Iterable[int], max_len: int):
+        self.forward_at = forward_at
+        self.length_buckets = tuple(sorted({int(b) for b in length_buckets if 0 < int(b) < max_len} | {int(max_len)}))
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return self.forward_at(x[:, :pick_length_bucket(x, self.length_buckets)])
+
+
+class TFFunctionBackend:
+    """
+    Calls the Keras model through traced `tf.function` graphs instead of
+    `model.predict`, which rebuilds a data adapter and a predict loop per call.
+
+    One concrete function is traced per batch-size bucket with a fully static
+    (bucket, length) signature; a batch is zero-padded up to the smallest
+    bucket that fits, so no call ever retraces. `length_buckets` adds one
+    graph per sequence length (input width must then be one of them).
+    """
+
+    def __init__(self, model: Any, max_len: int, batch_buckets: Iterable[int] = (1, 2, 4, 8, 16, 32, 64),
+                 length_buckets: Iterable[int] = ()):
+        import tensorflow as tf
+
+        self.max_len = int(max_len)
+        self.buckets = tuple(sorted({int(b) for b in batch_buckets if int(b) > 0}))
+        if not self.buckets:
+            raise ValueError("at least one batch bucket is required")
+        self.lengths = tuple(sorted({int(n) for n in length_buckets if 0 < int(n) < self.max_len} | {self.max_len}))
+
+        inputs = getattr(model, "inputs", None)
+        in_dtype = inputs[0].dtype if inputs else "int32"
+        if len(self.lengths) > 1:
+            model = variable_length_model(model)
+
+        @tf.function
+        def _call(x):
+            return model(tf.cast(x, in_dtype), training=False)
+
+        self._fns: Dict[Tuple[int, int], Any] = {
+            (b, n): _call.get_concrete_function(tf.TensorSpec([b, n], tf.int32))
+            for b in self.buckets for n in self.lengths
+        }
+
+    def _bucket(self, n: int) -> int:
+        for b in self.buckets:
+            if b >= n:
+                return b
+        return self.buckets[-1]
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Positive-class probabilities for a padded (n, length) batch."""
+        x = np.asarray(x, dtype=np.int32)
+        width = x.shape[1]
+        largest = self.buckets[-1]
+        out = []
+        for start in range(0, len(x), largest):
+            chunk = x[start:start + largest]
+            n = len(chunk)
+            b = self._bucket(n)
+            if b > n:
+                chunk = np.concatenate([chunk, np.zeros((b - n, width), dtype=np.int32)])
+            y = self._fns[(b, width)](chunk)
+            out.append(np.asarray(y).reshape(-1)[:n])
+        return np.concatenate(out) if out else np.zeros((0,), dtype=np.float32)
+
+    def warmup(self) -> None:
+        """Run every bucket once so the first real request pays no graph setup."""
+        for (b, n), fn in self._fns.items():
+            fn(np.zeros((b, n), dtype=np.int32))
+
+
+def _litert_interpreter():
+    # Lightweight runtimes first; full TensorFlow only as a last resort
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    """
+    Serves an exported `.tflite` file (see `python -m app.export`) with the
+    LiteRT / tflite_runtime interpreter. Models exported with a static batch
+    size run in chunks of that size; dynamic ones are resized per batch.
+    The interpreter is not thread-safe, hence the lock.
+    """
+
+    def __init__(self, model_path: str, max_len: int, num_threads: Optional[int] = None):
+        import threading
+
+        self.max_len = int(max_len)
+        self._interp = _litert_interpreter()(model_path=str(model_path), num_threads=num_threads)
+        self._in = self._interp.get_input_details()[0]
+        self._out = self._interp.get_output_details()[0]
+        sig = self._in.get("shape_signature", self._in["shape"])
+        self._static_batch = int(sig[0]) if int(sig[0]) > 0 else None
+        self._batch = None
+        self._lock = threading.Lock()
+        self._interp.allocate_tensors()
+
+    def _invoke(self, x: np.ndarray) -> np.ndarray:
+        if self._static_batch is None and self._batch != len(x):
+            self._interp.resize_tensor_input(self._in["index"], [len(x), self.max_len])
+            self._interp.allocate_tensors()
+            self._batch = len(x)
+        self._interp.set_tensor(self._in["index"], x)
+        self._interp.invoke()
+        return np.array(self._interp.get_tensor(self._out["index"])).reshape(-1)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=self._in["dtype"])
+        with self._lock:
+            if self._static_batch is None:
+                return self._invoke(x)
+            b = self._static_batch
+            out = []
+            for start in range(0, len(x), b):
+                chunk = x[start:start + b]
+                n = len(chunk)
+                if n < b:
+                    chunk = np.concatenate([chunk, np.zeros((b - n, self.max_len), dtype=chunk.dtype)])
+                out.append(self._invoke(chunk)[:n])
+            return np.concatenate(out) if out else np.zeros((0,), dtype=np.float32)
+
+    def warmup(self) -> None:
+        self.predict(np.zeros((1, self.max_len), dtype=np.int32))
+
+
+class OnnxBackend:
+    """Serves an exported `.onnx` file with ONNX Runtime (CPU provider)."""
+
+    _DTYPES = {"tensor(int32)": np.int32, "tensor(int64)": np.int64, "tensor(float)": np.float32}
+
+    def __init__(self, model_path: str, max_len: int, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        self.max_len = int(max_len)
+        opts = ort.SessionOptions()
+        if num_threads:
+            opts.intra_op_num_threads = int(num_threads)
+        self._sess = ort.InferenceSession(str(model_path), opts, providers=["CPUExecutionProvider"])
+        inp = self._sess.get_inputs()[0]
+        self._in_name = inp.name
+        self._in_dtype = self._DTYPES.get(inp.type, np.int32)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        y = self._sess.run(None, {self._in_name: np.asarray(x, dtype=self._in_dtype)})[0]
+        return np.asarray(y).reshape(-1)
+
+    def warmup(self) -> None:
+        self.predict(np.zeros((1, self.max_len), dtype=np.int32))
+
+
+def make_backend(
+    name: str,
+    model: Any,
+    max_len: int,
+    batch_buckets: Optional[Iterable[int]] = None,
+    model_path: Optional[str] = None,
+    num_threads: Optional[int] = None,
+    length_buckets: Iterable[int] = (),
+):
+    """
+    Build the backend selected by INFERENCE_BACKEND.
+    Returns None for "keras": the caller keeps using `model.predict`.
+    "tflite" and "onnx" load `model_path` and ignore `model`; they are
+    exported for a fixed length and do not support `length_buckets`.
+    "transformer" loads a train.py output directory (or its ONNX export)
+    and already cuts every batch to its longest row.
+    """
+    if name in ("tflite", "onnx", "transformer") and any(0 < int(n) < max_len for n in length_buckets):
+        raise ValueError(f"LENGTH_BUCKETS needs a Keras backend, not INFERENCE_BACKEND={name!r}")
+    if name == "keras":
+        return None
+    if name == "tf_function":
+        backend = TFFunctionBackend(model, max_len, batch_buckets or (1, 2, 4, 8, 16, 32, 64), length_buckets)
+    elif name == "tflite":
+        backend = TFLiteBackend(model_path, max_len, num_threads)
+    elif name == "onnx":
+        backend = OnnxBackend(model_path, max_len, num_threads)
+    elif name == "transformer":
+        from .transformer import TransformerBackend
+        backend = TransformerBackend(model_path, max_len, num_threads)
+    else:
+        raise ValueError(f"Unknown INFERENCE_BACKEND={name!r}, expected one of {BACKENDS}")
+    backend.warmup()
+    return backend
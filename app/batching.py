@@ -0,0 +1,118 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching of single-row inference calls.
+
+    Concurrent callers submit one padded row each; a background thread
+    collects them and flushes a batch when `max_batch_size` rows are queued
+    or `max_wait_ms` has elapsed since the first row of the batch arrived.
+    The stacked batch goes through `forward` in one call and every caller
+    receives its own probability through a `concurrent.futures.Future`;
+    a caller that stops waiting cancels its Future and the row is skipped.
+    `on_wait`, when given, receives the seconds each row spent queued.
+    """
+
+    def __init__(
+        self,
+        forward: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        on_wait: Optional[Callable[[float], None]] = None,
+    ):
+        self.forward = forward
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.on_wait = on_wait
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, Future, float]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # Simple counters, useful to check the effective batch size
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, row: np.ndarray) -> Future:
+        """Queue one padded row, returns a Future resolved with its probability."""
+        fut: Future = Future()
+        self._ensure_started()
+        self._queue.put((row, fut, time.perf_counter()))
+        return fut
+
+    def close(self) -> None:
+        """Stop the worker thread once the rows already queued are served; later submits fail."""
+        with self._lock:
+            self._closed = True
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    # --- internals ---
+    def _ensure_started(self) -> None:
+        # Started lazily (and restarted after a fork, where threads do not survive)
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._closed:  # retired model version: never revived
+                raise RuntimeError("micro-batcher is closed")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[Tuple[np.ndarray, Future, float]]) -> None:
+        # Rows whose caller gave up (Future cancelled on timeout) skip the model
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        if self.on_wait is not None:
+            start = time.perf_counter()
+            try:
+                for _, _, queued in batch:
+                    self.on_wait(start - queued)
+            except Exception:
+                pass  # metrics only: must not kill the thread and leave callers waiting
+        rows = [r for r, _, _ in batch]
+        futs = [f for _, f, _ in batch]
+        try:
+            probs = np.asarray(self.forward(np.stack(rows))).reshape(-1)
+            if probs.shape[0] != len(futs):
+                raise ValueError(f"forward returned {probs.shape[0]} outputs for a batch of {len(futs)}")
+        except BaseException as e:  # propagate to every waiting caller
+            for f in futs:
+                f.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(futs)
+        for f, p in zip(futs, probs):
+            f.set_result(float(p))
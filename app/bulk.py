@@ -0,0 +1,251 @@
+"""
+Offline bulk scoring of a CSV / Parquet file with the serving model.
+
+    python -m app.bulk --input data/sentiment140.csv --text_col text --out scores/ --processes 4
+    python -m app.bulk --input tweets.parquet --keep_cols id,created_at --format parquet --out scores/
+
+The input is streamed in chunks of `--chunk_size` rows; each chunk is
+tokenized and scored in batches of `--batch_size` by a pool of processes
+(one model per process, `INFERENCE_THREADS` split between them) and
+written to `out/part-000042.<format>`. `out/manifest.json` records the
+completed chunks: re-running the same command resumes after an
+interruption. Parquet needs pyarrow.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import numpy as np
+
+from .runtime import available_cpus, thread_budget
+
+Columns = Dict[str, List[Any]]
+
+# Settings that a resumed run must share with the run that wrote the manifest
+RESUME_KEYS = ("input", "text_col", "keep_cols", "chunk_size", "format", "model")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet input/output needs pyarrow (pip install pyarrow)") from e
+
+
+def iter_chunks(path: Path, columns: Sequence[str], chunk_size: int) -> Iterator[Columns]:
+    """Only `columns` of `path`, `chunk_size` rows at a time (column -> values)."""
+    if path.suffix.lower() in (".parquet", ".pq"):
+        pf = _pyarrow().parquet.ParquetFile(str(path))
+        missing = [c for c in columns if c not in pf.schema_arrow.names]
+        if missing:
+            raise ValueError(f"columns {missing} not in {path}")
+        for batch in pf.iter_batches(batch_size=chunk_size, columns=list(columns)):
+            yield batch.to_pydict()
+        return
+
+    with path.open(newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise ValueError(f"columns {missing} not in {path}")
+        pos = [header.index(c) for c in columns]
+        chunk: Columns = {c: [] for c in columns}
+        n = 0
+        for row in reader:
+            for c, i in zip(columns, pos):
+                chunk[c].append(row[i] if i < len(row) else "")
+            n += 1
+            if n == chunk_size:
+                yield chunk
+                chunk, n = {c: [] for c in columns}, 0
+        if n:
+            yield chunk
+
+
+def model_fingerprint(path: Path) -> Dict[str, Any]:
+    """Path, size and mtime of the served model (summed over a model directory)."""
+    files = [p for p in path.rglob("*") if p.is_file()] if path.is_dir() else [path]
+    stats = [p.stat() for p in files if p.exists()]
+    return {"path": str(path.resolve()), "bytes": sum(s.st_size for s in stats),
+            "mtime": max((s.st_mtime for s in stats), default=None)}
+
+
+def write_part(path: Path, columns: Columns, fmt: str) -> None:
+    """Write one chunk of results; the file only appears once complete."""
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        pa = _pyarrow()
+        pa.parquet.write_table(pa.table(columns), str(tmp))
+    else:
+        names = list(columns)
+        with tmp.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(names)
+            w.writerows(zip(*(columns[c] for c in names)))
+    os.replace(tmp, path)
+
+
+# --- scoring (runs in the pool processes) ---
+_inference = None
+
+
+def _init_worker(env: Dict[str, str]) -> None:
+    """Load the model once per process, with this process' share of the CPUs."""
+    global _inference
+    os.environ.update(env)
+    from . import inference
+    if not inference.model_loaded():
+        inference.load_model()
+    _inference = inference
+
+
+def _score_chunk(index: int, chunk: Columns, text_col: str, keep_cols: Sequence[str],
+                 part: Path, fmt: str, batch_size: int) -> Tuple[int, int, str]:
+    texts = ["" if t is None else str(t) for t in chunk[text_col]]
+    p_pos, version = _inference.predict_proba(texts, batch_size, return_version=True)
+    out = {c: chunk[c] for c in keep_cols}
+    out["sentiment"] = np.where(p_pos >= 0.5, "pos", "neg").tolist()
+    out["proba_pos"] = p_pos.tolist()
+    write_part(part, out, fmt)
+    return index, len(texts), version
+
+
+# --- driver ---
+def _load_manifest(path: Path, settings: Dict[str, Any]) -> Dict[str, Any]:
+    if not path.exists():
+        return {**settings, "model_version": None, "done": {}, "rows": 0, "complete": False}
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    changed = [k for k in RESUME_KEYS if manifest.get(k) != settings[k]]
+    if changed:
+        raise ValueError(f"{path} was written with other settings ({', '.join(changed)}); use another --out")
+    return manifest
+
+
+def _save_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def score_file(input_path: str, out_dir: str, text_col: str = "text", keep_cols: Sequence[str] = (),
+               chunk_size: int = 50_000, batch_size: int = 512, processes: int = 1, fmt: str = "csv",
+               log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Score every row of `input_path` into part files under `out_dir` and
+    return the run summary. `processes=0` scores in the calling process.
+    Chunks already listed in `out_dir/manifest.json` are skipped.
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"unknown format {fmt!r} (csv | parquet)")
+    if fmt == "parquet":
+        _pyarrow()
+    src = Path(input_path)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    keep_cols = [c for c in keep_cols if c]
+    from . import inference  # tokenizer only: the model is loaded by the scoring processes
+    settings = {"input": str(src.resolve()), "text_col": text_col, "keep_cols": keep_cols,
+                "chunk_size": int(chunk_size), "format": fmt,
+                "model": model_fingerprint(inference.served_model_path())}
+    manifest_path = out / "manifest.json"
+    manifest = _load_manifest(manifest_path, settings)
+    done: Set[int] = {int(i) for i in manifest["done"]}
+    log = log or (lambda msg: print(msg, file=sys.stderr))
+
+    env = {
+        "INFERENCE_THREADS": str(thread_budget(max(1, processes))),
+        "BATCH_MAX_SIZE": "1",
+        "PRED_CACHE_SIZE": "0",
+    }
+    pool = None
+    if processes > 0:
+        pool = ProcessPoolExecutor(processes, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(env,))
+    else:
+        _init_worker({})
+
+    t0 = time.perf_counter()
+    scored = 0
+
+    def finish(index: int, n: int, version: str) -> None:
+        nonlocal scored
+        if manifest["model_version"] not in (None, version):
+            raise ValueError(f"{out} holds scores of {manifest['model_version']}, the model is now {version}")
+        manifest["model_version"] = version
+        manifest["done"][str(index)] = n
+        manifest["rows"] += n
+        scored += n
+        _save_manifest(manifest_path, manifest)
+        log(f"chunk {index}: {n} rows, {scored / (time.perf_counter() - t0):.0f} rows/s")
+
+    # At most two chunks per process in flight: memory stays bounded by the chunk size
+    max_pending = 2 * max(1, processes)
+    pending: Set[Future] = set()
+    try:
+        for index, chunk in enumerate(iter_chunks(src, [text_col, *keep_cols], chunk_size)):
+            if index in done:
+                continue
+            args = (index, chunk, text_col, keep_cols, out / f"part-{index:06d}.{fmt}", fmt, batch_size)
+            if pool is None:
+                finish(*_score_chunk(*args))
+                continue
+            pending.add(pool.submit(_score_chunk, *args))
+            if len(pending) >= max_pending:
+                completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in completed:
+                    finish(*fut.result())
+        for fut in pending:
+            finish(*fut.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - t0
+    manifest["complete"] = True
+    _save_manifest(manifest_path, manifest)
+    return {
+        "out": str(out),
+        "chunks": len(manifest["done"]),
+        "rows": manifest["rows"],
+        "rows_this_run": scored,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(scored / elapsed, 1) if elapsed > 0 else 0.0,
+        "model_version": manifest["model_version"],
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input", required=True, help=".csv or .parquet")
+    ap.add_argument("--out", required=True, help="output directory (part files + manifest.json)")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--keep_cols", default="", help="comma-separated input columns copied to the output")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    ap.add_argument("--chunk_size", type=int, default=50_000, help="rows per chunk / part file")
+    ap.add_argument("--batch_size", type=int, default=512, help="rows per forward pass")
+    ap.add_argument("--processes", type=int, default=available_cpus(), help="0 = score in this process")
+    args = ap.parse_args(argv)
+
+    summary = score_file(
+        args.input, args.out, args.text_col, args.keep_cols.split(","),
+        args.chunk_size, args.batch_size, args.processes, args.format,
+    )
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of positive-class probabilities.
+
+    Keys are the padded token-id rows, so texts that normalize to the same
+    tokens (case, punctuation, unknown words...) share one entry. Entries
+    older than `ttl_s` are ignored (0 = no TTL) and the whole cache is
+    dropped as soon as it is used with a different model version.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl_s: float = 0.0):
+        self.max_size = max(1, int(max_size))
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.version: Optional[str] = None
+        self._data: "OrderedDict[bytes, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(row: np.ndarray) -> bytes:
+        return np.ascontiguousarray(row, dtype=np.int32).tobytes()
+
+    def _check_version(self, version: str) -> None:
+        # Caller holds the lock
+        if version != self.version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self.version = version
+
+    def get(self, key: bytes, version: str) -> Optional[float]:
+        with self._lock:
+            self._check_version(version)
+            item = self._data.get(key)
+            if item is not None and self.ttl_s and time.monotonic() - item[1] > self.ttl_s:
+                del self._data[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: bytes, p_pos: float, version: str) -> None:
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = (p_pos, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "model_version": self.version,
+            }
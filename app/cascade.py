@@ -0,0 +1,221 @@
+"""
+First stage of the prediction cascade (`CASCADE_PATH`): logistic regression on
+hashed word uni/bi-grams, trained on the CSVs of azureml/src/train.py (same
+text / label columns, 1 = positive). It answers alone when its confidence
+max(p, 1 - p) reaches the threshold; the other texts go to the served model.
+
+    python -m app.cascade --train data/train.csv --val data/val.csv       # -> artifacts/cascade.npz
+    python benchmarks/bench_cascade.py --csv data/test.csv                # accuracy / offload / latency
+
+The threshold is calibrated on --val against the served model (app.inference,
+so INFERENCE_BACKEND / MODEL_PATH apply): the lowest one whose cascade accuracy
+stays within --max_loss of the model alone, i.e. the largest offload for that
+loss. CASCADE_THRESHOLD overrides it at serving time.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import re
+import sys
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ART = Path(__file__).parent / "artifacts"
+THRESHOLDS = np.round(np.arange(0.5, 1.0, 0.005), 3)
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def hashed_features(text: str, n_features: int, ngrams: int = 2) -> np.ndarray:
+    """Unique feature indices of the word 1..`ngrams`-grams of `text` (crc32 modulo `n_features`)."""
+    words = _TOKEN.findall(text.lower())
+    feats = {zlib.crc32(w.encode("utf-8")) % n_features for w in words}
+    for n in range(2, ngrams + 1):
+        feats.update(zlib.crc32(" ".join(words[i:i + n]).encode("utf-8")) % n_features
+                     for i in range(len(words) - n + 1))
+    return np.fromiter(feats, dtype=np.int64, count=len(feats))
+
+
+def featurize(texts: Sequence[str], n_features: int, ngrams: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """(indices, row of each index) of a batch of texts, concatenated."""
+    feats = [hashed_features(t, n_features, ngrams) for t in texts]
+    idx = np.concatenate(feats) if feats else np.empty(0, dtype=np.int64)
+    rows = np.repeat(np.arange(len(feats)), [len(f) for f in feats])
+    return idx, rows
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
+def read_labelled(path: str, text_col: str = "text", label_col: str = "label",
+                  n: int = 0) -> Tuple[List[str], np.ndarray]:
+    """Texts and 0/1 labels of a train.py CSV (sentiment140 0 / 4 labels mapped to 0 / 1)."""
+    texts, labels = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get(text_col) and row.get(label_col) not in (None, ""):
+                texts.append(row[text_col])
+                labels.append(int(float(row[label_col])))
+            if n and len(texts) >= n:
+                break
+    y = np.array(labels, dtype=np.int64)
+    return texts, (y > 0).astype(np.int64) if set(np.unique(y)) <= {0, 4} else y
+
+
+class FirstStage:
+    """Hashed n-gram logistic regression plus its threshold and answered / deferred counters."""
+
+    def __init__(self, weights: np.ndarray, bias: float, ngrams: int = 2, threshold: float = 1.0,
+                 info: Optional[Dict[str, Any]] = None, version: str = "cascade"):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.n_features = len(self.weights)
+        self.ngrams = int(ngrams)
+        self.threshold = float(threshold)
+        self.info = dict(info or {})
+        # Reported as model_version of the answers it gives (not the served model's)
+        self.version = version
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.deferred = 0
+
+    @classmethod
+    def train(cls, texts: Sequence[str], y: np.ndarray, n_features: int = 1 << 20, ngrams: int = 2,
+              epochs: int = 3, batch_size: int = 512, lr: float = 0.2, l2: float = 1e-6, seed: int = 42,
+              log=print) -> "FirstStage":
+        """Mini-batch Adagrad; L2 applied to the weights of each batch only (sparse updates)."""
+        idx, rows = featurize(texts, n_features, ngrams)
+        starts = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(texts)))])
+        y = np.asarray(y, dtype=np.float64)
+        w = np.zeros(n_features, dtype=np.float64)
+        g2 = np.full(n_features, 1e-8)
+        b, b2 = 0.0, 1e-8
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            order = rng.permutation(len(texts))
+            loss = 0.0
+            for start in range(0, len(order), batch_size):
+                docs = order[start:start + batch_size]
+                lens = starts[docs + 1] - starts[docs]
+                flat = np.concatenate([idx[starts[d]:starts[d + 1]] for d in docs])
+                doc_of = np.repeat(np.arange(len(docs)), lens)
+                p = _sigmoid(np.bincount(doc_of, weights=w[flat], minlength=len(docs)) + b)
+                err = p - y[docs]
+                loss -= float(np.sum(y[docs] * np.log(p + 1e-12) + (1 - y[docs]) * np.log(1 - p + 1e-12)))
+                touched, inv = np.unique(flat, return_inverse=True)
+                grad = np.bincount(inv, weights=err[doc_of], minlength=len(touched)) / len(docs) + l2 * w[touched]
+                g2[touched] += grad ** 2
+                w[touched] -= lr * grad / np.sqrt(g2[touched])
+                gb = float(err.mean())
+                b2 += gb ** 2
+                b -= lr * gb / np.sqrt(b2)
+            log(f"[cascade] epoch {epoch + 1}/{epochs} log_loss={loss / len(texts):.4f}")
+        return cls(w, b, ngrams, info={"train_rows": len(texts), "epochs": epochs, "n_features": n_features})
+
+    @classmethod
+    def load(cls, path: Path, threshold: Optional[float] = None) -> "FirstStage":
+        with np.load(path, allow_pickle=False) as z:
+            info = json.loads(str(z["info"]))
+            return cls(z["weights"], float(z["bias"]), int(z["ngrams"]),
+                       float(z["threshold"]) if threshold is None else threshold, info,
+                       version=f"cascade:{Path(path).stem}")
+
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        with path.open("wb") as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, ngrams=self.ngrams,
+                                threshold=self.threshold, info=json.dumps(self.info))
+        return path
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Positive-class probabilities (float64)."""
+        idx, rows = featurize(texts, self.n_features, self.ngrams)
+        return _sigmoid(np.bincount(rows, weights=self.weights[idx], minlength=len(texts)) + self.bias)
+
+    def split(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(probabilities, rows confident enough to answer here)."""
+        p = self.predict_proba(texts)
+        ok = np.maximum(p, 1.0 - p) >= self.threshold
+        answered = int(ok.sum())
+        with self._lock:
+            self.answered += answered
+            self.deferred += len(texts) - answered
+        return p, ok
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.answered + self.deferred
+            return {"version": self.version, "threshold": self.threshold, "answered": self.answered, "deferred": self.deferred,
+                    "offload_rate": self.answered / total if total else 0.0,
+                    "n_features": self.n_features, "ngrams": self.ngrams,
+                    **{k: v for k, v in self.info.items() if k.startswith("calibration_")}}
+
+
+def sweep(p_first: np.ndarray, p_model: np.ndarray, y: np.ndarray,
+          thresholds: Sequence[float] = THRESHOLDS) -> List[Dict[str, float]]:
+    """Offload share and cascade accuracy for each threshold, against the served model alone."""
+    y = np.asarray(y)
+    model_pred = p_model >= 0.5
+    model_acc = float(np.mean(model_pred == y))
+    conf = np.maximum(p_first, 1.0 - p_first)
+    out = []
+    for t in thresholds:
+        ok = conf >= t
+        pred = np.where(ok, p_first >= 0.5, model_pred)
+        acc = float(np.mean(pred == y))
+        out.append({"threshold": float(t), "offload": float(ok.mean()), "accuracy": acc,
+                    "model_accuracy": model_acc, "accuracy_loss": model_acc - acc,
+                    "first_stage_accuracy_answered": float(np.mean((p_first[ok] >= 0.5) == y[ok])) if ok.any() else 1.0})
+    return out
+
+
+def calibrate(rows: List[Dict[str, float]], max_loss: float) -> Dict[str, float]:
+    """Lowest threshold within `max_loss` (the highest one, answering least, when none is)."""
+    ok = [r for r in rows if r["accuracy_loss"] <= max_loss]
+    return min(ok, key=lambda r: r["threshold"]) if ok else max(rows, key=lambda r: r["threshold"])
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--train", required=True)
+    ap.add_argument("--val", required=True)
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--label_col", default="label")
+    ap.add_argument("--out", default=str(ART / "cascade.npz"))
+    ap.add_argument("--n_features", type=int, default=1 << 20)
+    ap.add_argument("--ngrams", type=int, default=2)
+    ap.add_argument("--epochs", type=int, default=3)
+    ap.add_argument("--max_loss", type=float, default=0.005, help="accuracy the cascade may lose on --val")
+    ap.add_argument("--report", default="", help="write the threshold sweep as JSON")
+    args = ap.parse_args(argv)
+
+    texts, y = read_labelled(args.train, args.text_col, args.label_col)
+    first = FirstStage.train(texts, y, args.n_features, args.ngrams, args.epochs)
+    del texts, y
+
+    from . import inference  # served model, for the calibration reference
+    inference.load_model()
+    val_texts, val_y = read_labelled(args.val, args.text_col, args.label_col)
+    rows = sweep(first.predict_proba(val_texts), inference.predict_proba(val_texts), val_y)
+    best = calibrate(rows, args.max_loss)
+    if best["accuracy_loss"] > args.max_loss:
+        print(f"no threshold within max_loss={args.max_loss}, using {best['threshold']}", file=sys.stderr)
+    first.threshold = best["threshold"]
+    first.info.update({f"calibration_{k}": v for k, v in best.items()},
+                      calibration_model_version=inference.MODEL_VERSION, calibration_rows=len(val_texts))
+    first.save(Path(args.out))
+    print(f"saved {args.out}")
+    print(json.dumps(best, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps({"calibrated": best, "sweep": rows}, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Export `artifacts/model.keras` for the TensorFlow-free serving backends and
+check that the exported model gives the same probabilities.
+
+    python -m app.export --format tflite                 # -> artifacts/model.tflite
+    python -m app.export --format tflite --quantize      # -> artifacts/model.int8.tflite
+    python -m app.export --format onnx --quantize --reference_csv data/test.csv
+
+Needs the full training stack (tensorflow, plus tf2onnx / onnxruntime for ONNX);
+the API itself then only needs ai-edge-litert or onnxruntime (requirements-lite.txt).
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import numpy as np
+
+from .backends import OnnxBackend, TFLiteBackend
+
+ART = Path(__file__).parent / "artifacts"
+
+
+def default_out(fmt: str, quantize: bool) -> Path:
+    return ART / (f"model.int8.{fmt}" if quantize else f"model.{fmt}")
+
+
+def export_tflite(model: Any, out: Path, max_len: int, quantize: bool = False,
+                  allow_select_ops: bool = False) -> Path:
+    """
+    Keras -> TFLite; `quantize` applies dynamic-range INT8 weights.
+    Keras 3 LSTMs only lower to builtin ops with a fully static input and
+    frozen weights, so the graph is traced for a (1, max_len) input;
+    TFLiteBackend then runs larger batches row by row.
+    """
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    in_dtype = model.inputs[0].dtype if getattr(model, "inputs", None) else "int32"
+    fn = tf.function(lambda x: model(tf.cast(x, in_dtype), training=False))
+    concrete = fn.get_concrete_function(tf.TensorSpec([1, max_len], tf.int32, name="input_ids"))
+
+    conv = tf.lite.TFLiteConverter.from_concrete_functions([convert_variables_to_constants_v2(concrete)])
+    if quantize:
+        conv.optimizations = [tf.lite.Optimize.DEFAULT]
+    if allow_select_ops:
+        # Only if some op has no builtin kernel: the runtime then needs TF Select ops
+        conv.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+    out.write_bytes(conv.convert())
+    return out
+
+
+def export_onnx(model: Any, out: Path, max_len: int, quantize: bool = False, opset: int = 17) -> Path:
+    """Keras -> ONNX via tf2onnx; `quantize` applies ONNX Runtime dynamic INT8 quantization."""
+    import tensorflow as tf
+    import tf2onnx
+
+    in_dtype = model.inputs[0].dtype if getattr(model, "inputs", None) else "int32"
+    spec = (tf.TensorSpec([None, max_len], tf.int32, name="input_ids"),)
+    fn = tf.function(lambda x: model(tf.cast(x, in_dtype), training=False))
+
+    if not quantize:
+        tf2onnx.convert.from_function(fn, input_signature=spec, opset=opset, output_path=str(out))
+        return out
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32 = Path(tmp) / "model.fp32.onnx"
+        tf2onnx.convert.from_function(fn, input_signature=spec, opset=opset, output_path=str(fp32))
+        quantize_dynamic(str(fp32), str(out), weight_type=QuantType.QInt8)
+    return out
+
+
+def reference_inputs(tok_path: Path, max_len: int, csv_path: str = "", text_col: str = "text",
+                     n: int = 2000, seed: int = 42) -> np.ndarray:
+    """
+    Padded ids for the parity check: texts from `csv_path` when given,
+    otherwise random rows drawn from the tokenizer vocabulary.
+    """
+    from tensorflow.keras.preprocessing.text import tokenizer_from_json
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+    tok = tokenizer_from_json(tok_path.read_text(encoding="utf-8"))
+    if csv_path:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            texts = [row[text_col] for _, row in zip(range(n), csv.DictReader(f)) if row.get(text_col)]
+        return pad_sequences(tok.texts_to_sequences(texts), maxlen=max_len, padding="post", truncating="post")
+
+    rng = np.random.default_rng(seed)
+    vocab = tok.num_words or (len(tok.word_index) + 1)
+    x = np.zeros((n, max_len), dtype=np.int32)
+    for i, length in enumerate(rng.integers(1, max_len + 1, size=n)):
+        x[i, :length] = rng.integers(1, vocab, size=length)
+    return x
+
+
+def parity_report(model: Any, backend: Any, x: np.ndarray, batch_size: int = 256) -> Dict[str, float]:
+    """Compare Keras probabilities with an exported backend on the same padded ids."""
+    ref = np.asarray(model.predict(x, batch_size=batch_size, verbose=0)).reshape(-1)
+    got = np.concatenate([backend.predict(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+    diff = np.abs(ref - got)
+    return {
+        "n": int(len(x)),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "label_agreement": float(np.mean((ref >= 0.5) == (got >= 0.5))),
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--format", choices=["tflite", "onnx"], required=True)
+    ap.add_argument("--model", default=str(ART / "model.keras"))
+    ap.add_argument("--tokenizer", default=str(ART / "tokenizer.json"))
+    ap.add_argument("--out", default="")
+    ap.add_argument("--quantize", action="store_true", help="dynamic-range INT8 weights")
+    ap.add_argument("--allow_select_ops", action="store_true", help="tflite only")
+    ap.add_argument("--max_len", type=int, default=int(os.getenv("MAX_LEN", 80)))
+    ap.add_argument("--skip_export", action="store_true", help="only run the parity check on --out")
+    ap.add_argument("--reference_csv", default="")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--n", type=int, default=2000)
+    ap.add_argument("--tol", type=float, default=0.02, help="max |p_keras - p_exported| allowed")
+    ap.add_argument("--min_agreement", type=float, default=0.99, help="min share of identical labels")
+    args = ap.parse_args(argv)
+
+    from tensorflow import keras
+
+    model = keras.models.load_model(args.model)
+    out = Path(args.out) if args.out else default_out(args.format, args.quantize)
+    if not args.skip_export:
+        if args.format == "tflite":
+            export_tflite(model, out, args.max_len, args.quantize, args.allow_select_ops)
+        else:
+            export_onnx(model, out, args.max_len, args.quantize)
+        print(f"exported {out} ({out.stat().st_size / 1e6:.2f} MB)")
+
+    backend = (TFLiteBackend if args.format == "tflite" else OnnxBackend)(str(out), args.max_len)
+    x = reference_inputs(Path(args.tokenizer), args.max_len, args.reference_csv, args.text_col, args.n)
+    report = parity_report(model, backend, x)
+    print(json.dumps(report, indent=2))
+
+    ok = report["max_abs_diff"] <= args.tol and report["label_agreement"] >= args.min_agreement
+    if not ok:
+        print("parity check FAILED", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Local append-only store of the /feedback corrections (`FEEDBACK_DIR`), and
+their export as a training CSV.
+
+Records are JSON lines in segment files `feedback-<start>-<pid>-<n>.jsonl`,
+one writer per process, never rewritten. `append` only enqueues: a
+background thread writes what is queued in one go and fsyncs once per group
+(group commit), so request threads never wait on the disk. At most
+`commit_interval_ms` of accepted records can be lost on a crash. A segment
+is closed once it reaches `max_segment_bytes` and the next one is started.
+
+    python -m app.feedback_store --dir /home/feedback --out data/feedback_train.csv
+    python azureml/src/train.py --train_csv data/feedback_train.csv ...
+
+The export reads every segment (a line torn by a crash is skipped) and
+writes one row per distinct text with the label users confirmed or
+corrected (1 = positive, as in train.py). A text reported with both labels
+keeps the majority one; ties are dropped.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .runtime import stop_worker
+
+
+def feedback_label(predicted: str, correct: bool) -> Optional[int]:
+    """1 = positive: the prediction when confirmed, the other class when corrected."""
+    if predicted not in ("pos", "neg"):
+        return None
+    positive = predicted == "pos"
+    return int(positive if correct else not positive)
+
+
+class FeedbackStore:
+    """Segmented JSONL store with a group-commit writer thread; see the module docstring."""
+
+    def __init__(self, root: str, max_segment_bytes: int = 64 << 20, max_queue: int = 10_000,
+                 batch_size: int = 1000, commit_interval_ms: float = 20.0, fsync: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max(1, int(max_segment_bytes))
+        self.batch_size = max(1, int(batch_size))
+        self.commit_interval_s = max(0.0, float(commit_interval_ms)) / 1000.0
+        self.fsync = fsync
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._file = None
+        self._size = 0
+        self.segments = 0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.commits = 0
+        self.write_errors = 0
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        """Queue one record; False (counted as dropped) when the queue is full or after close()."""
+        if not self._ensure_started():
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(record)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Commit what is still queued, then stop the writer (called on shutdown).
+        Returns after `timeout` seconds at most, even with a full queue on a
+        stalled disk. Later appends are refused: the writer is not restarted.
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+        stop_worker(thread, self._queue, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dir": str(self.root),
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "commits": self.commits,
+            "records_per_commit": self.written / self.commits if self.commits else 0.0,
+            "segments": self.segments,
+            "segment_bytes": self._size,
+            "write_errors": self.write_errors,
+        }
+
+    # --- internals ---
+    def _ensure_started(self) -> bool:
+        # Started lazily (and restarted after a fork, where threads do not survive); False once closed
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        with self._lock:
+            if self._closed:
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                stop = item is None
+                batch = [] if stop else [item]
+                # Group commit: whatever arrives within the interval shares the fsync
+                deadline = time.monotonic() + self.commit_interval_s
+                while not stop and len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        stop = True
+                    else:
+                        batch.append(nxt)
+                if stop:  # shutdown: commit everything still queued
+                    while True:
+                        try:
+                            nxt = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if nxt is not None:
+                            batch.append(nxt)
+                self._commit(batch)
+                if stop:
+                    return
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _commit(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch).encode("utf-8")
+        try:
+            if self._file is None or (self._size and self._size + len(data) > self.max_segment_bytes):
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._size += len(data)
+            self.written += len(batch)
+            self.commits += 1
+        except OSError:
+            # Feedback must never take the API down; the records of the group are
+            # lost and the next group starts a new segment (no line after a torn one)
+            self.write_errors += 1
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+            self._file = None
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self.segments += 1
+        # pid read here, not at init: with PRELOAD_APP the store is built before the fork
+        path = self.root / f"feedback-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self.segments:05d}.jsonl"
+        self._file = path.open("ab")
+        self._size = 0
+        if self.fsync:  # the new file name itself must survive a crash
+            fd = os.open(self.root, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def iter_records(root: str) -> Iterator[Dict[str, Any]]:
+    """Records of every segment, oldest segment first; torn or invalid lines are skipped."""
+    for path in sorted(Path(root).glob("feedback-*.jsonl")):
+        with path.open("rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict):
+                    yield rec
+
+
+def export_csv(root: str, out: str, text_col: str = "text", label_col: str = "label") -> Dict[str, int]:
+    """Deduplicated (text, label) CSV for train.py; returns the counts of the export."""
+    votes: Dict[str, List[int]] = {}
+    records = 0
+    for rec in iter_records(root):
+        records += 1
+        text = str(rec.get("text") or "").strip()
+        label = rec.get("label")
+        if text and label in (0, 1):
+            votes.setdefault(text, [0, 0])[label] += 1
+    rows: List[Tuple[str, int]] = [(t, int(v[1] > v[0])) for t, v in votes.items() if v[0] != v[1]]
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([text_col, label_col])
+        w.writerows(rows)
+    return {"records": records, "texts": len(votes), "rows": len(rows), "ties_dropped": len(votes) - len(rows),
+            "positive": sum(label for _, label in rows)}
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dir", default=os.getenv("FEEDBACK_DIR", ""), required=not os.getenv("FEEDBACK_DIR"))
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--label_col", default="label")
+    args = ap.parse_args(argv)
+    print(json.dumps(export_csv(args.dir, args.out, args.text_col, args.label_col), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,48 +1,500 @@
 from __future__ import annotations
+import functools
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")  # reduce TF logs
 
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras.preprocessing.text import tokenizer_from_json
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+from .backends import (
+    KERAS_BACKENDS, LengthBucketedForward, make_backend, parse_buckets, variable_length_model,
+)
+from .batching import MicroBatcher
+from .cache import PredictionCache
+from .cascade import FirstStage
+from .singleflight import SingleFlight
+from .metrics import metrics
+from .registry import ModelRegistry, ServedModel
+from .runtime import configure_tf_threads, rss_mb, thread_budget
+from .tokenizer import load_fast_tokenizer
+
+log = logging.getLogger(__name__)
 
 ART = Path(__file__).parent / "artifacts"
-MODEL_PATH = ART / "model.keras"
-TOK_PATH   = ART / "tokenizer.json"
 
-# Must match training
-MAX_LEN = int(os.getenv("MAX_LEN", 80))
+# Forward-pass backend:
+#   "keras"       -> model.predict
+#   "tf_function" -> traced graphs per batch-size bucket, warmed up at startup
+#   "tflite"/"onnx" -> exported file, served without importing TensorFlow
+#   "transformer" -> DistilBERT from azureml/src/train.py (directory or .onnx)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras")
+TRANSFORMER = INFERENCE_BACKEND == "transformer"
+
+MODEL_PATH = Path(os.getenv("MODEL_PATH", ART / ("distilbert" if TRANSFORMER else "model.keras")))
+# The transformer tokenizer is saved next to the model by train.py
+_default_tok = (MODEL_PATH if MODEL_PATH.is_dir() else MODEL_PATH.parent) if TRANSFORMER else ART / "tokenizer.json"
+TOK_PATH   = Path(os.getenv("TOKENIZER_PATH", _default_tok))
+# Files written by `python -m app.export` for the TF-free backends
+EXPORTED_PATHS = {"tflite": ART / "model.tflite", "onnx": ART / "model.onnx"}
+
+# Must match training (train.py --max_length for the transformer)
+MAX_LEN = int(os.getenv("MAX_LEN", 128 if TRANSFORMER else 80))
+
+SERVED_MODEL_PATH = Path(os.getenv("SERVED_MODEL_PATH", EXPORTED_PATHS.get(INFERENCE_BACKEND, MODEL_PATH)))
+TF_BATCH_BUCKETS = parse_buckets(os.getenv("TF_BATCH_BUCKETS", "1,2,4,8,16,32,64"))
+# Sequence-length buckets, e.g. "16,32,48,80": each batch runs at the smallest
+# bucket holding its longest row instead of MAX_LEN (empty = always MAX_LEN).
+# Keras backends only; exact when the model masks padding, see backends.py.
+LENGTH_BUCKETS = tuple(b for b in parse_buckets(os.getenv("LENGTH_BUCKETS", "")) if b < MAX_LEN)
+# Rows of similar length in the same forward pass keep the padding short
+SORT_BY_LENGTH = bool(LENGTH_BUCKETS) or TRANSFORMER
+
+# CPU budget of this process: with N gunicorn workers on C cores each worker
+# gets C // N threads unless overridden (TF intra-op, TFLite / ONNX Runtime, torch)
+SERVING_PROCESSES = int(os.getenv("GUNICORN_WORKERS", 1))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", 0)) or thread_budget(SERVING_PROCESSES)
+TF_INTER_OP_THREADS = int(os.getenv("TF_INTER_OP_THREADS", 0)) or min(2, INFERENCE_THREADS)
+
+# Only the fork-safe, pure-Python part (tokenizer) is loaded at import: the
+# model is loaded explicitly, by the API's startup hook (startup(), after the
+# gunicorn fork) or by the CLIs (load_model()), never as an import side effect.
+
+# Binary cache of the Keras tokenizer (`<tokenizer>.cache.npz` next to the
+# JSON, rebuilt when the JSON changes; skipped if the directory is read-only)
+TOKENIZER_CACHE = os.getenv("TOKENIZER_CACHE", "1") == "1"
+# Warm-up inferences at the serving shapes before GET /ready turns 200
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
+# Timed startup phases (seconds) and readiness, see startup()
+startup_info: Dict[str, Any] = {"phases_s": {}}
+loaded = threading.Event()  # boot model loaded: requests can be served
+ready = threading.Event()   # loaded and warmed up: GET /ready
+_startup_lock = threading.Lock()
+
+
+@contextmanager
+def _phase(name: str, logger: logging.Logger):
+    t = time.perf_counter()
+    yield
+    dt = time.perf_counter() - t
+    startup_info["phases_s"][name] = round(dt, 3)
+    logger.info("startup phase %s: %.3f s (pid %s)", name, dt, os.getpid())
+
+
+def _load_tokenizer(path: Path) -> Tuple[Any, str]:
+    """(tokenizer, source): source is "cache" / "json" / "json_uncached" (see tokenizer.py)."""
+    if TRANSFORMER:
+        from .transformer import WordPieceTokenizer
+        return WordPieceTokenizer(str(path)), "wordpiece"
+    cache = path.with_name(f"{path.stem}.cache.npz") if TOKENIZER_CACHE else None
+    return load_fast_tokenizer(path, cache)
+
 
 # --- Load at startup (singletons) ---
-with TOK_PATH.open("r", encoding="utf-8") as f:
-    tok = tokenizer_from_json(f.read())
+# Precompiled port of the Keras tokenizer: same ids as texts_to_sequences +
+# pad_sequences(padding="post", truncating="post"), encoded in one pass
+# (WordPiece `tokenizer.json` of the model directory for the transformer)
+with _phase("tokenizer", log):
+    tok, startup_info["tokenizer_source"] = _load_tokenizer(TOK_PATH)
+
+MODEL_VERSION = os.getenv("MODEL_VERSION", "distilbert:v1" if TRANSFORMER else "keras_cnn_bilstm:v1")
+
+# Rollouts without restart: JSON file polled by every worker (see registry.py)
+MODEL_REGISTRY_FILE = os.getenv("MODEL_REGISTRY_FILE", "")
+MODEL_REGISTRY_POLL_S = float(os.getenv("MODEL_REGISTRY_POLL_S", 5))
+
+def _load_components(path: Path):
+    """(Keras model, backend, length-bucketed forward) serving the file at `path`."""
+    m = None
+    if INFERENCE_BACKEND in KERAS_BACKENDS:
+        configure_tf_threads(INFERENCE_THREADS, TF_INTER_OP_THREADS)
+        from tensorflow import keras
+        m = keras.models.load_model(path)
+    be = make_backend(
+        INFERENCE_BACKEND, m, MAX_LEN, TF_BATCH_BUCKETS,
+        model_path=path, num_threads=INFERENCE_THREADS,
+        length_buckets=LENGTH_BUCKETS,
+    )
+    bk = None
+    if LENGTH_BUCKETS:
+        if be is not None:
+            bk = LengthBucketedForward(be.predict, LENGTH_BUCKETS, MAX_LEN)
+        else:
+            var_model = variable_length_model(m)
+            bk = LengthBucketedForward(
+                lambda x: np.asarray(var_model.predict(x, verbose=0)).reshape(-1), LENGTH_BUCKETS, MAX_LEN,
+            )
+    return m, be, bk
+
+
+def _memory_info(m: Any, path: Path, rss_before: float) -> Dict[str, Any]:
+    """Weights size and RSS growth of one loaded version (approximate with concurrent loads)."""
+    if m is not None and hasattr(m, "get_weights"):
+        weights = sum(w.nbytes for w in m.get_weights())
+    else:
+        from .transformer import weights_bytes
+        weights = weights_bytes(path)
+    return {"model_path": str(path), "weights_mb": round(weights / 1e6, 2),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1)}
+
+
+# Micro-batching of concurrent calls (BATCH_MAX_SIZE <= 1 disables it)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+# Longest wait for a micro-batched result when the caller gives no deadline
+# (same default as the API's REQUEST_DEADLINE_MS)
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_DEADLINE_MS", 10_000)) / 1000.0
+
+
+def _raw_forward(m: Any, be: Any, bk: Any, x: np.ndarray) -> np.ndarray:
+    if bk is not None:
+        return bk(x)
+    if be is not None:
+        return be.predict(x)
+    return np.asarray(m.predict(x, verbose=0)).reshape(-1)
+
+
+def _predict_with(m: Any, be: Any, bk: Any, x: np.ndarray) -> np.ndarray:
+    t = metrics.now()
+    probs = _raw_forward(m, be, bk, x)
+    metrics.observe_forward(len(x), metrics.now() - t)
+    return probs
+
 
-model = keras.models.load_model(MODEL_PATH)
+def _new_batcher(forward) -> Optional[MicroBatcher]:
+    if BATCH_MAX_SIZE <= 1:
+        return None
+    return MicroBatcher(forward, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+                        on_wait=metrics.observe_queue_wait if metrics.enabled else None)
 
-MODEL_VERSION = os.getenv("MODEL_VERSION", "keras_cnn_bilstm:v1")
 
-def predict_one(text: str) -> Dict[str, Any]:
+# Prediction cache keyed on padded token ids (PRED_CACHE_SIZE=0 disables it,
+# PRED_CACHE_TTL_S=0 means no expiry); one per resident model version
+PRED_CACHE_SIZE = int(os.getenv("PRED_CACHE_SIZE", 10_000))
+PRED_CACHE_TTL_S = float(os.getenv("PRED_CACHE_TTL_S", 0))
+
+
+def _new_cache() -> Optional[PredictionCache]:
+    return PredictionCache(PRED_CACHE_SIZE, PRED_CACHE_TTL_S) if PRED_CACHE_SIZE > 0 else None
+
+
+# Concurrent /predict calls whose padded ids are identical (viral tweet) share
+# one forward pass, with or without the cache (COALESCE_REQUESTS=0 disables)
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "1") == "1"
+inflight = SingleFlight(on_coalesced=metrics.observe_coalesced if metrics.enabled else None) \
+    if COALESCE_REQUESTS else None
+
+# Bulk scoring (/predict_batch): rows per forward pass (the cap per request,
+# PREDICT_BATCH_MAX_ITEMS, is enforced by the request schema)
+PREDICT_BATCH_CHUNK = int(os.getenv("PREDICT_BATCH_CHUNK", 64))
+
+
+# Two-stage cascade (cascade.py): CASCADE_PATH=<cascade.npz> lets the hashed
+# n-gram model answer the texts it is confident about; CASCADE_THRESHOLD
+# overrides the calibrated threshold (1 = everything goes to the model).
+# Requests pinning model_version always reach that model.
+CASCADE_PATH = os.getenv("CASCADE_PATH", "")
+CASCADE_THRESHOLD = os.getenv("CASCADE_THRESHOLD", "")
+first_stage = FirstStage.load(Path(CASCADE_PATH), float(CASCADE_THRESHOLD) if CASCADE_THRESHOLD else None) \
+    if CASCADE_PATH else None
+
+
+def warmup_shapes() -> List[Tuple[int, int]]:
     """
-    Run binary sentiment inference with Keras CNN+BiLSTM model.
-    Returns sentiment label and probabilities for neg/pos.
+    (rows, tokens) of the forward passes met in serving: single requests,
+    full micro-batches and /predict_batch chunks, at every length bucket.
+    """
+    sizes = sorted({1, max(1, BATCH_MAX_SIZE), max(1, PREDICT_BATCH_CHUNK)})
+    return [(b, n) for b in sizes for n in (*LENGTH_BUCKETS, MAX_LEN)]
+
+
+def warmup() -> int:
+    """One forward pass of the active version per serving shape."""
+    shapes = warmup_shapes()
+    forward = registry.active.forward
+    for b, n in shapes:
+        x = np.zeros((b, MAX_LEN), dtype=np.int32)
+        x[:, :n] = 1  # n tokens: the length bucket of n is used
+        forward(x)
+    return len(shapes)
+
+
+def startup(logger: Optional[logging.Logger] = None) -> Dict[str, Any]:
+    """
+    Load the boot model (unless already loaded) and warm it up, each phase
+    timed in `startup_info` and logged; sets `ready` once done. Idempotent;
+    a failure is recorded in `startup_info["error"]` and re-raised.
+    """
+    logger = logger or log
+    with _startup_lock:
+        if ready.is_set():
+            return startup_info
+        try:
+            if not loaded.is_set():
+                with _phase("model_load", logger):
+                    load_model()
+            if STARTUP_WARMUP:
+                with _phase("warmup", logger):
+                    startup_info["warmup_shapes"] = warmup()
+        except Exception as e:
+            startup_info["error"] = f"{type(e).__name__}: {e}"
+            logger.exception("startup failed (pid %s)", os.getpid())
+            raise
+        startup_info.pop("error", None)
+        startup_info["total_s"] = round(sum(startup_info["phases_s"].values()), 3)
+        ready.set()
+        logger.info("model ready pid=%s startup_s=%.3f tokenizer=%s", os.getpid(), startup_info["total_s"],
+                    startup_info.get("tokenizer_source"))
+    return startup_info
+
+
+def model_loaded() -> bool:
+    return loaded.is_set()
+
+
+def startup_status() -> Dict[str, Any]:
+    """Readiness and timed startup phases (GET /ready)."""
+    return {"ready": ready.is_set(), "loaded": loaded.is_set(), **startup_info}
+
+
+def load_version(spec: Dict[str, Any]) -> ServedModel:
+    """
+    Load another model version next to the boot one (registry loader):
+    `spec` has version, model_path (file served by INFERENCE_BACKEND) and
+    optionally tokenizer_path. Warmed up before it is returned.
     """
-    # 1) text -> seq ids using the SAME tokenizer as training
-    seq = tok.texts_to_sequences([text])
-    x = pad_sequences(seq, maxlen=MAX_LEN, padding="post", truncating="post")
+    path = Path(spec["model_path"])
+    rss0 = rss_mb()
+    default_tok = (path if path.is_dir() else path.parent) if TRANSFORMER else TOK_PATH
+    version_tok, _ = _load_tokenizer(Path(spec.get("tokenizer_path") or default_tok))
+    m, be, bk = _load_components(path)
+    forward = functools.partial(_predict_with, m, be, bk)
+    forward(np.zeros((1, MAX_LEN), dtype=np.int32))  # warm-up before it takes traffic
+    info = _memory_info(m, path, rss0)
+    return ServedModel(spec["version"], version_tok, forward, _new_batcher(forward), _new_cache(), info)
 
-    # 2) model -> sigmoid proba for positive class
-    p_pos = float(model.predict(x, verbose=0).ravel()[0])
+
+def _not_loaded(x: np.ndarray) -> np.ndarray:
+    raise RuntimeError("model not loaded: call load_model() (or startup()) first")
+
+
+# Until load_model(), the active version is a placeholder without a model
+registry = ModelRegistry(
+    ServedModel(MODEL_VERSION, tok, _not_loaded),
+    loader=load_version,
+    on_swap=lambda served: metrics.set_info(model_version=served.version),
+    config_path=MODEL_REGISTRY_FILE,
+    poll_s=MODEL_REGISTRY_POLL_S,
+    max_len=MAX_LEN,
+)
+
+
+def install_model(m: Any, be: Any = None, bk: Any = None, info: Optional[Dict[str, Any]] = None) -> ServedModel:
+    """
+    Serve (Keras model, backend, length-bucketed forward) as the boot version
+    MODEL_VERSION. Only the returned ServedModel references them, so a later
+    swap releases the boot model once it is drained.
+    """
+    forward = functools.partial(_predict_with, m, be, bk)
+    served = ServedModel(MODEL_VERSION, tok, forward, _new_batcher(forward), _new_cache(), info)
+    registry.swap(served)
+    loaded.set()
+    return served
+
+
+def served_model_path() -> Path:
+    """File (or directory) that load_model() serves with INFERENCE_BACKEND."""
+    return MODEL_PATH if INFERENCE_BACKEND in KERAS_BACKENDS else SERVED_MODEL_PATH
+
+
+def load_model() -> None:
+    """
+    Load the boot model and build the forward-pass backend for this process.
+    Only TFLite memory-maps the model file, so its pages are shared between
+    workers through the OS page cache; Keras and ONNX Runtime weights are
+    private to each worker (see benchmarks/bench_workers.py --backend).
+    """
+    rss0 = rss_mb()
+    path = served_model_path()
+    m, be, bk = _load_components(path)
+    install_model(m, be, bk, _memory_info(m, path, rss0))
+
+
+def _to_response(p_pos: float, version: str, stage: str = "model") -> Dict[str, Any]:
     p_neg = 1.0 - p_pos
     sentiment = "pos" if p_pos >= 0.5 else "neg"
-
     return {
         "sentiment": sentiment,
         "proba_neg": p_neg,
         "proba_pos": p_pos,
-        "model_version": MODEL_VERSION,
+        "model_version": version,
+        "stage": stage,
     }
+
+
+def _first_stage(texts: Sequence[str], version: Optional[str]):
+    """(probabilities, rows answered) of the cascade's first stage, or None when it does not apply."""
+    if first_stage is None or version:
+        return None
+    t = metrics.now()
+    out = first_stage.split(texts)
+    metrics.lap("cascade", t)
+    return out
+
+
+def _score_row(served: ServedModel, x: np.ndarray, key: Optional[bytes], deadline: float) -> float:
+    if served.batcher is not None:
+        fut = served.batcher.submit(x[0])
+        try:
+            p_pos = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except TimeoutError:
+            fut.cancel()  # still queued: the row never reaches the model
+            raise
+    else:
+        p_pos = float(served.forward(x)[0])
+    if served.cache is not None:
+        served.cache.put(key, p_pos, served.version)
+    return p_pos
+
+
+def predict_one(text: str, version: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run binary sentiment inference with Keras CNN+BiLSTM model.
+    Returns sentiment label and probabilities for neg/pos.
+    `deadline` (time.monotonic()) bounds the wait on the micro-batcher
+    (TimeoutError); REQUEST_TIMEOUT_S from now by default.
+    `version` pins a resident model version (registry.UnknownVersion otherwise).
+    With the cascade, confident texts are answered by the first stage.
+    """
+    first = _first_stage([text], version)
+    if first is not None and first[1][0]:
+        return _to_response(float(first[0][0]), first_stage.version, "cascade")
+    with registry.serving(version) as served:
+        # 1) text -> padded ids using the SAME tokenizer as training
+        t = metrics.now()
+        ids = served.tok.tokenize_batch([text], MAX_LEN)
+        t = metrics.lap("tokenize", t)
+        x = served.tok.pad_batch(ids, MAX_LEN)
+        t = metrics.lap("pad", t)
+
+        # 2) same token ids already scored by this model version -> no forward pass
+        key = PredictionCache.key(x[0]) if served.cache is not None or inflight is not None else None
+        p_pos = None
+        if served.cache is not None:
+            p_pos = served.cache.get(key, served.version)
+            metrics.lap("cache_lookup", t)
+
+        # 3) model -> sigmoid proba for positive class
+        #    (stacked with concurrent requests when the micro-batcher is enabled,
+        #    shared with the identical requests already in flight)
+        if p_pos is None:
+            if deadline is None:
+                deadline = time.monotonic() + REQUEST_TIMEOUT_S
+            score = functools.partial(_score_row, served, x, key, deadline)
+            p_pos = inflight.do((served.version, key), score, timeout=deadline - time.monotonic()) \
+                if inflight is not None else score()
+
+    registry.shadow_score(served, [text], [p_pos])
+    return _to_response(p_pos, served.version)
+
+
+def _forward_in_chunks(x: np.ndarray, chunk: int, forward) -> np.ndarray:
+    """Probabilities for every row of `x`, `chunk` rows per forward pass."""
+    order = np.arange(len(x))
+    if SORT_BY_LENGTH:
+        # Similar lengths in the same chunk -> each chunk runs at a short length
+        order = np.argsort(np.count_nonzero(x, axis=1), kind="stable")
+    probs = np.empty(len(x), dtype=np.float64)
+    chunk = max(1, chunk)
+    for start in range(0, len(order), chunk):
+        idx = order[start:start + chunk]
+        probs[idx] = forward(x[idx])
+    return probs
+
+
+def predict_proba(texts: Sequence[str], chunk: int = 0, return_version: bool = False):
+    """
+    Positive-class probabilities of `texts` (float64, input order) from the
+    active version, without the prediction cache: for offline scoring where
+    rows rarely repeat. `return_version` -> (probabilities, version that
+    computed them), the active version may change between two calls.
+    """
+    with registry.serving(canary=False) as served:
+        x = served.tok.encode_batch(texts, MAX_LEN)
+        probs = _forward_in_chunks(x, chunk or PREDICT_BATCH_CHUNK, served.forward)
+    return (probs, served.version) if return_version else probs
+
+
+def predict_many(texts: Sequence[str], version: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Vectorized inference for a list of texts.
+    Tokenizes and pads the whole list in one pass, then runs the model on
+    chunks of PREDICT_BATCH_CHUNK rows. Results keep the input order.
+    With the cascade, only the texts the first stage defers reach the model.
+    """
+    if not texts:
+        return []
+    first = _first_stage(texts, version)
+    if first is not None and first[1].all():
+        return [_to_response(float(p), first_stage.version, "cascade") for p in first[0]]
+    rest = list(texts) if first is None else [texts[i] for i in np.flatnonzero(~first[1])]
+    with registry.serving(version) as served:
+        t = metrics.now()
+        ids = served.tok.tokenize_batch(rest, MAX_LEN)
+        t = metrics.lap("tokenize", t)
+        x = served.tok.pad_batch(ids, MAX_LEN)
+        metrics.lap("pad", t)
+
+        probs = np.empty(len(x), dtype=np.float64)
+        todo = np.arange(len(x))
+        keys = None
+        if served.cache is not None:
+            keys = [PredictionCache.key(row) for row in x]
+            cached = [served.cache.get(k, served.version) for k in keys]
+            todo = np.array([i for i, p in enumerate(cached) if p is None], dtype=np.intp)
+            for i, p in enumerate(cached):
+                if p is not None:
+                    probs[i] = p
+
+        if len(todo):
+            probs[todo] = _forward_in_chunks(x[todo], PREDICT_BATCH_CHUNK, served.forward)
+            if keys is not None:
+                for i in todo:
+                    served.cache.put(keys[i], float(probs[i]), served.version)
+
+    registry.shadow_score(served, rest, probs)
+    if first is None:
+        return [_to_response(float(p), served.version) for p in probs]
+    model_probs = iter(probs)
+    return [_to_response(float(p), first_stage.version, "cascade") if ok
+            else _to_response(float(next(model_probs)), served.version)
+            for p, ok in zip(*first)]
+
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss/eviction counters of the active version's prediction cache
+    (sizing aid), and the requests coalesced with an identical one in flight.
+    """
+    served_cache = registry.active.cache
+    out = {"enabled": True, **served_cache.stats()} if served_cache is not None else {"enabled": False}
+    out["coalescing"] = {"enabled": True, **inflight.stats()} if inflight is not None else {"enabled": False}
+    return out
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """Threshold and share of the traffic answered by the cascade's first stage."""
+    if first_stage is None:
+        return {"enabled": False}
+    return {"enabled": True, **first_stage.stats()}
+
+
+def model_stats() -> Dict[str, Any]:
+    """Resident versions (memory, traffic), routing and shadow agreement."""
+    return registry.stats()
@@ -1,19 +1,60 @@
 from __future__ import annotations
+import logging
 import os
-from typing import Any, Dict
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi import HTTPException
 
 from pathlib import Path
 
-from .schemas import PredictRequest, PredictResponse, FeedbackRequest
-from .inference import predict_one
+# Importer l'API ne charge que le tokenizer : TensorFlow et le modèle sont
+# chargés par le hook de démarrage (lifespan), puis chauffés avant /ready
+from .schemas import (
+    PredictRequest, PredictResponse, PredictBatchRequest, PredictBatchResponse, FeedbackRequest,
+)
+from .inference import (
+    predict_one, predict_many, cache_stats, cascade_stats, model_stats, startup, startup_status, model_loaded,
+    INFERENCE_BACKEND, MODEL_VERSION,
+)
+from .admission import AdmissionController, Rejected
+from .feedback_store import FeedbackStore, feedback_label
+from .metrics import MetricsMiddleware, metrics
+from .registry import UnknownVersion
+from .telemetry import BackgroundTelemetry, build_sink
+
+
+# Logger configuré par uvicorn / gunicorn : les phases de démarrage apparaissent dans leurs logs
+startup_log = logging.getLogger("uvicorn.error")
+
+
+def _startup() -> None:
+    try:
+        startup(startup_log)
+    except Exception:
+        pass  # déjà journalisé ; /ready reste à 503 avec l'erreur
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chargement + warm-up en tâche de fond : /health répond pendant ce temps,
+    # /ready passe à 200 une fois le modèle chaud
+    threading.Thread(target=_startup, name="startup", daemon=True).start()
+    yield
+    # Arrêt : envoyer les événements encore en file
+    if telemetry_client is not None and hasattr(telemetry_client, "close"):
+        telemetry_client.close()
+    if feedback_store is not None:
+        feedback_store.close()
 
 # --- FastAPI setup ---
-app = FastAPI(title="Sentiment API (Keras)")
+app = FastAPI(title="Sentiment API (Keras)", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,15 +63,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Application Insights (simple SDK) ---
+# --- Métriques Prometheus (GET /metrics) ; METRICS_ENABLED=0 les coupe ---
+if metrics.enabled:
+    app.add_middleware(MetricsMiddleware, metrics=metrics, paths=lambda: [r.path for r in app.routes])
+    metrics.set_info(model_version=MODEL_VERSION, backend=INFERENCE_BACKEND)
+
+# --- Télémétrie (Application Insights, fichier local ou rien) ---
+# Les événements passent par une file bornée vidée en tâche de fond :
+# aucun envoi réseau sur le thread de la requête.
 APPINSIGHTS_KEY = os.getenv("APPINSIGHTS_INSTRUMENTATIONKEY")
+TELEMETRY_SINK = os.getenv("TELEMETRY_SINK", "appinsights" if APPINSIGHTS_KEY else "none")
 telemetry_client = None
-if APPINSIGHTS_KEY:
+_sink = build_sink(TELEMETRY_SINK, APPINSIGHTS_KEY, os.getenv("TELEMETRY_FILE", "telemetry.jsonl"))
+if _sink is not None:
+    telemetry_client = BackgroundTelemetry(
+        _sink,
+        max_queue=int(os.getenv("TELEMETRY_QUEUE_SIZE", 1000)),
+        batch_size=int(os.getenv("TELEMETRY_BATCH_SIZE", 50)),
+        flush_interval_s=float(os.getenv("TELEMETRY_FLUSH_INTERVAL_S", 2)),
+    )
+
+# --- Contrôle d'admission (par worker) ---
+# Au plus ADMISSION_MAX_CONCURRENT inférences en parallèle ; ADMISSION_MAX_QUEUE
+# requêtes attendent leur tour sans occuper de thread. File pleine -> 429,
+# échéance dépassée en file -> 503, avec Retry-After. L'échéance vient de
+# l'en-tête X-Deadline-Ms (budget en ms) ou de REQUEST_DEADLINE_MS ; la garder
+# sous le `timeout` de gunicorn. ADMISSION_MAX_CONCURRENT=0 désactive.
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 16))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", 1))
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", 10_000))
+admission = None
+if ADMISSION_MAX_CONCURRENT > 0:
+    admission = AdmissionController(
+        ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_RETRY_AFTER_S,
+        on_change=metrics.observe_admission if metrics.enabled else None,
+    )
+
+# Retry-After des requêtes reçues avant la fin du chargement du modèle
+STARTUP_RETRY_AFTER_S = int(os.getenv("STARTUP_RETRY_AFTER_S", 2))
+
+
+def _deadline(deadline_ms: Optional[float]) -> float:
+    # Échéance absolue (time.monotonic()) : en-tête X-Deadline-Ms ou REQUEST_DEADLINE_MS
+    return time.monotonic() + (deadline_ms if deadline_ms is not None else REQUEST_DEADLINE_MS) / 1000.0
+
+
+async def _run(fn, /, *args, **kwargs):
     try:
-        from applicationinsights import TelemetryClient
-        telemetry_client = TelemetryClient(APPINSIGHTS_KEY)
-    except Exception:
-        telemetry_client = None
+        return await run_in_threadpool(fn, *args, **kwargs)
+    except TimeoutError:  # échéance atteinte en attendant le micro-batcher
+        raise HTTPException(status_code=503, detail="Service saturé : deadline exceeded during inference.",
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER_S)})
+
+
+async def _admitted(deadline: float, fn, /, *args, **kwargs):
+    # Attend un créneau (ou rejette), puis lance l'inférence dans le threadpool
+    if not model_loaded():
+        raise HTTPException(status_code=503, detail="Modèle en cours de chargement.",
+                            headers={"Retry-After": str(STARTUP_RETRY_AFTER_S)})
+    if admission is None:
+        return await _run(fn, *args, **kwargs)
+    t = metrics.now()
+    try:
+        await admission.acquire(deadline)
+    except Rejected as e:
+        raise HTTPException(status_code=e.status, detail=f"Service saturé : {e.reason}.",
+                            headers={"Retry-After": str(e.retry_after_s)})
+    metrics.lap("admission_wait", t)
+    try:
+        return await _run(fn, *args, **kwargs)
+    finally:
+        admission.release()
+
+# --- Stockage local des retours utilisateurs (FEEDBACK_DIR, vide = désactivé) ---
+# Segments JSONL en ajout seul, écrits par un thread de fond (fsync groupé) ;
+# export pour train.py : python -m app.feedback_store --out feedback_train.csv
+FEEDBACK_DIR = os.getenv("FEEDBACK_DIR", "")
+feedback_store = None
+if FEEDBACK_DIR:
+    feedback_store = FeedbackStore(
+        FEEDBACK_DIR,
+        max_segment_bytes=int(os.getenv("FEEDBACK_SEGMENT_MB", 64)) << 20,
+        max_queue=int(os.getenv("FEEDBACK_QUEUE_SIZE", 10_000)),
+        commit_interval_ms=float(os.getenv("FEEDBACK_COMMIT_INTERVAL_MS", 20)),
+    )
 
 ROOT = Path(__file__).resolve().parents[0]  # adapte si besoin
 INDEX = ROOT / "static" / "index.html"
@@ -47,26 +164,115 @@ def home():
 
 @app.get("/health")
 def health() -> Dict[str, Any]:
+    # Liveness : le processus répond, sans toucher au modèle
     return {"status": "ok"}
 
+@app.get("/ready")
+def get_ready():
+    # Readiness : 200 une fois le modèle chargé et chauffé, 503 avant ;
+    # durées des phases de démarrage (tokenizer, model_load, warmup)
+    status = startup_status()
+    if not status["ready"]:
+        return JSONResponse(status, status_code=503, headers={"Retry-After": str(STARTUP_RETRY_AFTER_S)})
+    return status
+
+@app.get("/cache/stats")
+def get_cache_stats() -> Dict[str, Any]:
+    # Compteurs hit/miss/éviction pour dimensionner PRED_CACHE_SIZE
+    return cache_stats()
+
+@app.get("/cascade/stats")
+def get_cascade_stats() -> Dict[str, Any]:
+    # Seuil et part du trafic servie par le premier étage (CASCADE_PATH)
+    return cascade_stats()
+
+@app.get("/admission/stats")
+def get_admission_stats() -> Dict[str, Any]:
+    # Profondeur de file et rejets du worker : signaux d'autoscaling
+    if admission is None:
+        return {"enabled": False}
+    return {"enabled": True, "deadline_ms": REQUEST_DEADLINE_MS, **admission.stats()}
+
+@app.get("/feedback/stats")
+def get_feedback_stats() -> Dict[str, Any]:
+    # Enregistrements en file / écrits / perdus, commits groupés, segment courant
+    if feedback_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **feedback_store.stats()}
+
+@app.get("/models")
+def get_models() -> Dict[str, Any]:
+    # Versions résidentes (mémoire, trafic), routage canary / shadow, chargements en cours
+    return model_stats()
+
+def _unknown_version(e: UnknownVersion) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"Version de modèle non chargée : {e.args[0]}")
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Histogrammes par étape + requêtes en cours, par worker (label pid)
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Métriques désactivées (METRICS_ENABLED=0).")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/telemetry/stats")
+def get_telemetry_stats() -> Dict[str, Any]:
+    # Profondeur de file et événements perdus : la télémétrie est-elle en délestage ?
+    if telemetry_client is None or not hasattr(telemetry_client, "stats"):
+        return {"enabled": False}
+    return {"enabled": True, "sink": TELEMETRY_SINK, **telemetry_client.stats()}
+
 @app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
-    res = predict_one(req.text)
+async def predict(req: PredictRequest, x_deadline_ms: Optional[float] = Header(None, gt=0)):
+    try:
+        deadline = _deadline(x_deadline_ms)
+        res = await _admitted(deadline, predict_one, req.text, version=req.model_version, deadline=deadline)
+    except UnknownVersion as e:
+        raise _unknown_version(e)
 
     if telemetry_client:
+        t = metrics.now()
         telemetry_client.track_event(
             "prediction",
-            {"sentiment": res["sentiment"], "model_version": res["model_version"]},
+            {"sentiment": res["sentiment"], "model_version": res["model_version"], "stage": res["stage"]},
         )
-        telemetry_client.flush()
+        metrics.lap("telemetry", t)
+    metrics.handler_done()
     return res
 
+@app.post("/predict_batch", response_model=PredictBatchResponse)
+async def predict_batch(req: PredictBatchRequest, x_deadline_ms: Optional[float] = Header(None, gt=0)):
+    # Plafond par requête (PREDICT_BATCH_MAX_ITEMS) : rejeté par le schéma (422)
+    # avant l'appel, un seul appelant ne doit pas monopoliser le worker
+    try:
+        results = await _admitted(_deadline(x_deadline_ms), predict_many, req.texts, version=req.model_version)
+    except UnknownVersion as e:
+        raise _unknown_version(e)
+
+    if telemetry_client:
+        t = metrics.now()
+        telemetry_client.track_event(
+            "prediction_batch",
+            {"count": str(len(results)), "model_version": results[0]["model_version"]},
+        )
+        metrics.lap("telemetry", t)
+    metrics.handler_done()
+    return {"results": results}
+
 @app.post("/feedback")
 def feedback(req: FeedbackRequest) -> Dict[str, Any]:
     """
     L'utilisateur nous indique si la prédiction était correcte (correct=True) ou non.
-    On trace dans Application Insights afin de créer des alertes sur les erreurs.
+    On trace dans Application Insights afin de créer des alertes sur les erreurs,
+    et on conserve le texte complet et son label dans FEEDBACK_DIR (réentraînement).
     """
+    if feedback_store is not None:
+        record = {"ts": time.time(), "text": req.text, "predicted": req.predicted, "correct": req.correct,
+                  "label": feedback_label(req.predicted, req.correct), "note": req.note}
+        # File pleine : on refuse plutôt que de bloquer la requête sur le disque
+        if not feedback_store.append(record):
+            raise HTTPException(status_code=503, detail="Stockage des retours saturé.",
+                                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_S)})
     if telemetry_client:
         # On tronque le texte pour éviter d'envoyer trop de données
         txt = (req.text or "")[:500]
@@ -80,5 +286,4 @@ def feedback(req: FeedbackRequest) -> Dict[str, Any]:
                 "text": txt,
             },
         )
-        telemetry_client.flush()
     return {"status": "stored"}
@@ -0,0 +1,246 @@
+"""
+In-process latency histograms exposed in the Prometheus text format
+(`GET /metrics`), without any client library.
+
+Stages of a prediction are timed with `now()` / `lap()`:
+
+    t = metrics.now()
+    ids = tok.tokenize_batch(texts, MAX_LEN)
+    t = metrics.lap("tokenize", t)
+
+When disabled (METRICS_ENABLED=0) both return 0.0 without reading the clock,
+so the instrumentation left in the hot path costs one method call per stage.
+Every gunicorn worker keeps its own series; `sentiment_model_info` carries
+the pid and host so that scrapes of different workers can be told apart.
+"""
+from __future__ import annotations
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds, from 100 µs (tokenizer) to 5 s (cold forward pass under load)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label values tuple."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[Any]] = {}  # labels -> [bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            s = self._series.get(labels)
+            return sum(s[0]) if s else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1]) for k, v in sorted(self._series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="+Inf"' if bound == float("inf") else 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Current value per label values tuple (in-flight requests...)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str) -> None:
+        self.inc(*labels, amount=-1.0)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in values]
+        return lines
+
+
+class Counter(Gauge):
+    """Monotonic count per label values tuple (only `inc`)."""
+
+    kind = "counter"
+
+
+# Timing state of the HTTP request being served: set by MetricsMiddleware,
+# shared (same dict) with the threadpool thread running a sync route
+_request: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_request", default=None)
+
+
+class Metrics:
+    """The metrics of one serving process."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages = Histogram("sentiment_stage_seconds", "Time spent per prediction stage.", ("stage",))
+        self.batch_rows = Histogram("sentiment_forward_batch_rows", "Rows per model forward pass.", (), BATCH_BUCKETS)
+        self.requests = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"))
+        self.in_flight = Gauge("http_requests_in_flight", "HTTP requests being served.", ("route",))
+        self.admission = Gauge("sentiment_admission_requests",
+                               "Inference requests running or waiting for a slot (admission.py).", ("state",))
+        self.rejected = Counter("sentiment_admission_rejected_total", "Requests shed before inference.", ("reason",))
+        self.coalesced = Counter("sentiment_coalesced_requests_total",
+                                 "Requests that shared the forward pass of an identical request in flight.")
+        self.info: Dict[str, str] = {}
+
+    def now(self) -> float:
+        return time.perf_counter() if self.enabled else 0.0
+
+    def lap(self, stage: str, t0: float) -> float:
+        """Record the time since `t0` under `stage`; returns the new start time."""
+        if not self.enabled:
+            return 0.0
+        t = time.perf_counter()
+        self.stages.observe(t - t0, stage)
+        return t
+
+    def observe_forward(self, rows: int, seconds: float) -> None:
+        if self.enabled:
+            self.stages.observe(seconds, "forward")
+            self.batch_rows.observe(rows)
+
+    def observe_queue_wait(self, seconds: float) -> None:
+        if self.enabled:
+            self.stages.observe(seconds, "queue_wait")
+
+    def observe_admission(self, in_flight: int, queued: int, rejected: Optional[str] = None) -> None:
+        """AdmissionController.on_change: queue depth to autoscale on, and rejections."""
+        if self.enabled:
+            self.admission.set(in_flight, "in_flight")
+            self.admission.set(queued, "queued")
+            if rejected is not None:
+                self.rejected.inc(rejected)
+
+    def observe_coalesced(self) -> None:
+        if self.enabled:
+            self.coalesced.inc()
+
+    def handler_done(self) -> None:
+        """Called by a route when it returns: what follows until the response starts is serialization."""
+        if self.enabled:
+            timing = _request.get()
+            if timing is not None:
+                timing["handler_done"] = time.perf_counter()
+
+    def set_info(self, **labels: Any) -> None:
+        self.info.update({k: str(v) for k, v in labels.items()})
+
+    def render(self) -> str:
+        info = dict(self.info, pid=str(os.getpid()), host=socket.gethostname())
+        names = sorted(info)
+        lines = [
+            "# HELP sentiment_model_info Served model and worker identifiers.",
+            "# TYPE sentiment_model_info gauge",
+            f"sentiment_model_info{_labels(names, [info[n] for n in names])} 1",
+        ]
+        for metric in (self.stages, self.batch_rows, self.requests, self.in_flight, self.admission, self.rejected,
+                       self.coalesced):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: in-flight gauge and latency histogram per route, plus the
+    "serialize" stage (route returned -> response start). Paths that are not
+    routes of the app are counted as "other" to keep the label set bounded.
+    """
+
+    def __init__(self, app: Any, metrics: Metrics, paths: Callable[[], Iterable[str]]):
+        self.app = app
+        self.metrics = metrics
+        self._paths_fn = paths
+        self._paths: Optional[frozenset] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self._paths is None:
+            self._paths = frozenset(self._paths_fn())
+        m = self.metrics
+        route = scope["path"] if scope["path"] in self._paths else "other"
+        timing: Dict[str, float] = {"status": 500}
+        token = _request.set(timing)
+        m.in_flight.inc(route)
+        t0 = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing["status"] = message["status"]
+                done = timing.get("handler_done")
+                if done is not None:
+                    m.stages.observe(time.perf_counter() - done, "serialize")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            m.in_flight.dec(route)
+            m.requests.observe(time.perf_counter() - t0, scope["method"], route, str(int(timing["status"])))
+            _request.reset(token)
+
+
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "1") == "1")
@@ -0,0 +1,316 @@
+"""
+Resident model versions and request routing, for zero-downtime rollouts.
+
+A `ServedModel` bundles everything one version needs to answer a request
+(tokenizer, forward pass, micro-batcher, prediction cache). The
+`ModelRegistry` keeps the active version and at most one candidate:
+
+- swap: a new version is loaded and warmed up in a background thread, then
+  replaces the active one in a single assignment; requests already running
+  finish on the version they started with, which is closed once drained
+- canary: `canary_pct` % of the requests that do not ask for a version go
+  to the candidate
+- shadow: the active version answers, the candidate scores the same texts
+  (encoded with its own tokenizer) in the background and only the agreement
+  is recorded
+
+Every gunicorn worker has its own registry, so rollouts are driven by a
+JSON file (MODEL_REGISTRY_FILE) that each worker polls:
+
+    {"active":    {"version": "v2", "model_path": "...", "tokenizer_path": "..."},
+     "candidate": {"version": "v3", "model_path": "...", "tokenizer_path": "...",
+                   "canary_pct": 10, "shadow": false}}
+"""
+from __future__ import annotations
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+Loader = Callable[[Dict[str, Any]], "ServedModel"]
+
+
+class UnknownVersion(KeyError):
+    """A request asked for a model version that is not resident."""
+
+
+class ServedModel:
+    """One resident model version."""
+
+    def __init__(self, version: str, tok: Any, forward: Callable[[np.ndarray], np.ndarray],
+                 batcher: Any = None, cache: Any = None, info: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.tok = tok
+        self.forward = forward
+        self.batcher = batcher
+        self.cache = cache
+        self.info = info if info is not None else {}
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self.served = 0
+        self.retired = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def serving(self) -> Iterator["ServedModel"]:
+        """Count one request in flight; refused once the version is retired (see drain)."""
+        self._enter()
+        try:
+            yield self
+        finally:
+            self._exit()
+
+    def _enter(self) -> None:
+        with self._lock:
+            if self.retired:
+                raise RuntimeError(f"model version {self.version} is retired")
+            self.in_flight += 1
+            self.served += 1
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def drain(self, timeout_s: float = 60.0) -> None:
+        """Refuse new requests, wait for the running ones, then release the micro-batcher thread."""
+        with self._lock:
+            self.retired = True
+        deadline = time.monotonic() + timeout_s
+        while self.in_flight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+            "served": self.served,
+            **self.info,
+        }
+
+
+class ModelRegistry:
+    """Active version, optional candidate, canary / shadow routing."""
+
+    def __init__(self, active: ServedModel, loader: Optional[Loader] = None,
+                 on_swap: Optional[Callable[[ServedModel], None]] = None,
+                 config_path: str = "", poll_s: float = 5.0, shadow_queue: int = 100, max_len: int = 80):
+        self.active = active
+        self.candidate: Optional[ServedModel] = None
+        self.canary_pct = 0.0
+        self.shadow = False
+        self.loader = loader
+        self.on_swap = on_swap
+        self.config_path = Path(config_path) if config_path else None
+        self.poll_s = max(0.1, float(poll_s))
+        self.max_len = int(max_len)
+        self.loading: Dict[str, str] = {}  # version -> "loading" | "ready" | "failed: ..."
+        self.shadow_stats = self._new_shadow_stats()
+        self._shadow_queue = max(0, int(shadow_queue))
+        self._shadow_pending = 0
+        self._shadow_pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._config_mtime: Optional[float] = None
+
+    @staticmethod
+    def _new_shadow_stats() -> Dict[str, Any]:
+        return {"compared": 0, "agree": 0, "abs_diff_sum": 0.0, "dropped": 0, "errors": 0}
+
+    # --- routing ---
+    @contextmanager
+    def serving(self, version: Optional[str] = None, canary: bool = True) -> Iterator[ServedModel]:
+        """
+        Route a request and count it in flight in one step under the registry
+        lock: a swap cannot retire the version between the two, so a drained
+        version has really finished serving. `canary=False` keeps unpinned
+        requests on the active version.
+        """
+        self._ensure_watching()
+        with self._lock:
+            served = self._pick(version, canary)
+            served._enter()
+        try:
+            yield served
+        finally:
+            served._exit()
+
+    def route(self, version: Optional[str] = None) -> ServedModel:
+        """The version that serves a request (`version` pins it)."""
+        self._ensure_watching()
+        return self._pick(version)
+
+    def _pick(self, version: Optional[str], canary: bool = True) -> ServedModel:
+        active, candidate = self.active, self.candidate
+        if version:
+            for served in (active, candidate):
+                if served is not None and served.version == version:
+                    return served
+            raise UnknownVersion(version)
+        if canary and candidate is not None and not self.shadow and self.canary_pct > 0:
+            if random.random() * 100.0 < self.canary_pct:
+                return candidate
+        return active
+
+    def shadow_score(self, served: ServedModel, texts: Sequence[str], p_pos: np.ndarray) -> None:
+        """Score `texts` on the shadow candidate in the background and record the agreement with `p_pos`."""
+        candidate = self.candidate
+        if not self.shadow or candidate is None or candidate is served:
+            return
+        with self._lock:
+            if self._shadow_pending >= self._shadow_queue:
+                self.shadow_stats["dropped"] += 1
+                return
+            self._shadow_pending += 1
+            if self._shadow_pool is None:
+                self._shadow_pool = ThreadPoolExecutor(1, thread_name_prefix="shadow")
+        self._shadow_pool.submit(self._compare, candidate, list(texts), np.asarray(p_pos, dtype=np.float64))
+
+    def _compare(self, candidate: ServedModel, texts: Sequence[str], p_pos: np.ndarray) -> None:
+        try:
+            with candidate.serving():
+                # The candidate may have been trained with another vocabulary
+                x = candidate.tok.encode_batch(texts, self.max_len)
+                got = np.asarray(candidate.forward(x), dtype=np.float64).reshape(-1)
+            with self._lock:
+                s = self.shadow_stats
+                s["compared"] += len(got)
+                s["agree"] += int(np.sum((got >= 0.5) == (p_pos >= 0.5)))
+                s["abs_diff_sum"] += float(np.abs(got - p_pos).sum())
+        except Exception:
+            with self._lock:
+                self.shadow_stats["errors"] += 1
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    # --- changes ---
+    def swap(self, served: ServedModel) -> None:
+        """Make `served` the active version; the previous one drains in the background."""
+        with self._lock:
+            old, self.active = self.active, served
+            if self.candidate is served:
+                self.candidate = None
+        if self.on_swap is not None:
+            self.on_swap(served)
+        if old is not served:
+            self._retire(old)
+
+    def set_candidate(self, served: Optional[ServedModel], canary_pct: float = 0.0, shadow: bool = False) -> None:
+        with self._lock:
+            old, self.candidate = self.candidate, served
+            self.canary_pct = min(100.0, max(0.0, float(canary_pct)))
+            self.shadow = bool(shadow)
+            self.shadow_stats = self._new_shadow_stats()
+        if old is not None and old is not served and old is not self.active:
+            self._retire(old)
+
+    def promote(self) -> None:
+        """Candidate -> active."""
+        if self.candidate is None:
+            raise UnknownVersion("no candidate")
+        self.swap(self.candidate)
+
+    def load_async(self, spec: Dict[str, Any], role: str = "active") -> threading.Thread:
+        """
+        Load and warm up `spec` (version, model_path, tokenizer_path) in a
+        background thread, then make it the active version or the candidate.
+        """
+        version = spec["version"]
+        self.loading[version] = "loading"
+
+        def run():
+            try:
+                served = self.loader(spec)
+            except Exception as e:
+                self.loading[version] = f"failed: {e}"
+                log.exception("loading model %s failed", version)
+                return
+            if role == "active":
+                self.swap(served)
+            else:
+                self.set_candidate(served, spec.get("canary_pct", 0.0), spec.get("shadow", False))
+            self.loading[version] = "ready"
+
+        t = threading.Thread(target=run, name=f"load-{version}", daemon=True)
+        t.start()
+        return t
+
+    def _retire(self, served: ServedModel) -> None:
+        threading.Thread(target=served.drain, name=f"drain-{served.version}", daemon=True).start()
+
+    # --- control file ---
+    def apply_config(self, config: Dict[str, Any]) -> None:
+        """Bring the resident versions in line with the control file."""
+        active, candidate = config.get("active"), config.get("candidate")
+        if active and active["version"] != self.active.version:
+            if self.candidate is not None and self.candidate.version == active["version"]:
+                self.swap(self.candidate)
+            elif self.loading.get(active["version"]) != "loading":
+                self.load_async(active, "active")
+        if not candidate:
+            if self.candidate is not None:
+                self.set_candidate(None)
+        elif self.candidate is not None and self.candidate.version == candidate["version"]:
+            with self._lock:
+                self.canary_pct = min(100.0, max(0.0, float(candidate.get("canary_pct", 0.0))))
+                self.shadow = bool(candidate.get("shadow", False))
+        elif candidate["version"] != self.active.version and self.loading.get(candidate["version"]) != "loading":
+            self.load_async(candidate, "candidate")
+
+    def poll_config(self) -> bool:
+        """Apply the control file if it changed since the last call."""
+        if self.config_path is None or self.loader is None:
+            return False
+        try:
+            mtime = self.config_path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._config_mtime:
+            return False
+        self._config_mtime = mtime
+        try:
+            self.apply_config(json.loads(self.config_path.read_text(encoding="utf-8")))
+        except (ValueError, KeyError) as e:
+            log.error("invalid model registry file %s: %s", self.config_path, e)
+            return False
+        return True
+
+    def _ensure_watching(self) -> None:
+        # Started lazily from the first request: after the gunicorn fork
+        if self.config_path is None or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+                self._watcher.start()
+
+    def _watch(self) -> None:
+        while True:
+            self.poll_config()
+            time.sleep(self.poll_s)
+
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self.shadow_stats)
+        s["agreement"] = s["agree"] / s["compared"] if s["compared"] else None
+        s["mean_abs_diff"] = s.pop("abs_diff_sum") / s["compared"] if s["compared"] else None
+        return {
+            "active": self.active.stats(),
+            "candidate": self.candidate.stats() if self.candidate is not None else None,
+            "canary_pct": self.canary_pct,
+            "shadow": self.shadow,
+            "shadow_stats": s if self.shadow else None,
+            "loading": dict(self.loading),
+            "config_file": str(self.config_path) if self.config_path else None,
+        }
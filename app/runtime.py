@@ -0,0 +1,61 @@
+"""
+Per-process runtime settings shared by the serving entry points
+(gunicorn workers, bulk scoring processes).
+"""
+from __future__ import annotations
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects cgroup / taskset affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def thread_budget(processes: int, cpus: Optional[int] = None) -> int:
+    """Threads one process may use so that `processes` of them do not oversubscribe the cores."""
+    return max(1, (cpus or available_cpus()) // max(1, int(processes)))
+
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB (0.0 where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def stop_worker(thread: Optional[threading.Thread], q: queue.Queue, timeout: float) -> None:
+    """
+    Stop a background thread draining `q`: queue its None sentinel, then
+    join it. Returns after `timeout` seconds at most, even when the queue
+    stays full (the thread is a daemon; what is still queued is lost).
+    """
+    if thread is None or not thread.is_alive():
+        return
+    deadline = time.monotonic() + max(0.0, timeout)
+    try:
+        q.put(None, timeout=max(0.0, timeout))
+    except queue.Full:
+        return
+    thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def configure_tf_threads(intra_op: int, inter_op: int) -> None:
+    """
+    Must run before TensorFlow executes its first op (i.e. before the model
+    is loaded); later calls are ignored by TF and silently skipped here.
+    """
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(int(intra_op))
+        tf.config.threading.set_inter_op_parallelism_threads(int(inter_op))
+    except RuntimeError:
+        pass
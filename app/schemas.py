@@ -1,14 +1,30 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+import os
+
+from pydantic import BaseModel, Field, constr
+from typing import List, Optional
+
+# Hard cap of texts per /predict_batch request: checked by pydantic while the
+# list is validated, before the texts reach the handler
+PREDICT_BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", 256))
 
 class PredictRequest(BaseModel):
     text: str = Field(..., min_length=1, description="Raw tweet text")
+    model_version: Optional[str] = Field(None, description="Resident model version to use (default: routing)")
 
 class PredictResponse(BaseModel):
     sentiment: str
     proba_neg: float
     proba_pos: float
-    model_version: str
+    model_version: str = Field(..., description='Version that produced the answer ("cascade:<file>" for the first stage)')
+    stage: str = Field("model", description='"cascade" (first-stage model) or "model"')
+
+class PredictBatchRequest(BaseModel):
+    texts: List[constr(min_length=1)] = Field(..., min_length=1, max_length=PREDICT_BATCH_MAX_ITEMS,
+                                              description="Raw tweet texts")
+    model_version: Optional[str] = Field(None, description="Resident model version to use (default: routing)")
+
+class PredictBatchResponse(BaseModel):
+    results: List[PredictResponse]
 
 class FeedbackRequest(BaseModel):
     text: str
@@ -0,0 +1,104 @@
+"""
+In-flight request coalescing ("single flight").
+
+Concurrent calls with the same key share one computation: the first caller
+(leader) runs it, callers arriving while it is pending wait for its result
+(or its exception) instead of running their own. The entry is removed as
+soon as the computation ends, so nothing is kept afterwards: unlike the
+prediction cache this needs no memory budget, and a failed call is retried
+by the next request.
+
+Each caller keeps its own deadline (`do(..., timeout=)`): a follower stops
+waiting when its own time is up, and one that inherits the leader's
+TimeoutError while it still has time computes the result itself.
+
+`do` is for threads, `do_async` for coroutines on an event loop; both use
+the same pending table, so sync and async callers coalesce with each other.
+"""
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Pending computations by key; see the module docstring."""
+
+    def __init__(self, on_coalesced: Optional[Callable[[], None]] = None):
+        self.on_coalesced = on_coalesced
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """(pending future of `key`, True when the caller is the leader and must compute it)."""
+        with self._lock:
+            fut = self._pending.get(key)
+            # A finished entry not removed yet by its leader is not joined
+            leader = fut is None or fut.done()
+            if leader:
+                fut = self._pending[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader and self.on_coalesced is not None:
+            self.on_coalesced()
+        return fut, leader
+
+    def _done(self, key: Hashable, fut: Future) -> None:
+        with self._lock:
+            if self._pending.get(key) is fut:
+                del self._pending[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Result of `fn()`, shared with the concurrent calls made with the same key.
+        `timeout` (seconds) bounds the wait of a follower (TimeoutError); `fn`
+        is expected to honour the same deadline when the caller leads.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            fut, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return fut.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                # The leader's deadline, not ours: compute it ourselves while time is left
+                if not fut.done() or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._done(key, fut)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Same as `do` for a coroutine function; waiting does not block the event loop."""
+        fut, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(fut)
+        try:
+            result = await fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._done(key, fut)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {"in_flight": len(self._pending), "computed": self.leaders, "coalesced": self.coalesced,
+                    "coalesced_rate": self.coalesced / total if total else 0.0}
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .runtime import stop_worker
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+class NullSink:
+    """Discards events (offline runs, tests)."""
+
+    def send(self, events: List[Event]) -> None:
+        pass
+
+
+class FileSink:
+    """Appends events as JSON lines to a local file."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def send(self, events: List[Event]) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            for name, props in events:
+                f.write(json.dumps({"ts": time.time(), "name": name, "properties": props}, ensure_ascii=False) + "\n")
+
+
+class AppInsightsSink:
+    """Forwards a batch to Application Insights with a single network flush."""
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def send(self, events: List[Event]) -> None:
+        for name, props in events:
+            self.client.track_event(name, props)
+        self.client.flush()
+
+
+def build_sink(kind: str, instrumentation_key: Optional[str] = None, path: str = "telemetry.jsonl"):
+    """
+    "appinsights" | "file" | "null". Returns None when nothing should be
+    tracked ("none", or App Insights without key / SDK).
+    """
+    if kind == "appinsights":
+        if not instrumentation_key:
+            return None
+        try:
+            from applicationinsights import TelemetryClient
+            return AppInsightsSink(TelemetryClient(instrumentation_key))
+        except Exception:
+            return None
+    if kind == "file":
+        return FileSink(path)
+    if kind == "null":
+        return NullSink()
+    return None
+
+
+class BackgroundTelemetry:
+    """
+    Non-blocking `track_event`: events go to a bounded in-memory queue drained
+    by a background thread, which sends them to the sink in batches of
+    `batch_size` or every `flush_interval_s`. When the queue is full the event
+    is dropped (and counted) instead of blocking the request thread.
+    """
+
+    def __init__(self, sink: Any, max_queue: int = 1000, batch_size: int = 50, flush_interval_s: float = 2.0):
+        self.sink = sink
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.01, float(flush_interval_s))
+        self._queue: "queue.Queue[Optional[Event]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.send_errors = 0
+
+    def track_event(self, name: str, properties: Optional[Dict[str, Any]] = None) -> None:
+        """Queue one event; dropped (and counted) when the queue is full or after close()."""
+        if not self._ensure_started():
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((name, dict(properties or {})))
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Kept for TelemetryClient compatibility: sending happens in the background."""
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Send what is still queued, then stop the worker (called on shutdown).
+        Returns after `timeout` seconds at most, even with a full queue and a
+        hung sink: the worker is a daemon thread and what is left is lost.
+        Later events are dropped: the worker is not restarted.
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+        stop_worker(thread, self._queue, timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "send_errors": self.send_errors,
+        }
+
+    # --- internals ---
+    def _ensure_started(self) -> bool:
+        """False once closed."""
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        with self._lock:
+            if self._closed:
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        batch: List[Event] = []
+        deadline = time.monotonic() + self.flush_interval_s
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                # Shutdown: drain without waiting, then stop
+                while True:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is not None:
+                        batch.append(nxt)
+                self._send(batch)
+                return
+            if item:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval_s
+
+    def _send(self, batch: List[Event]) -> None:
+        if not batch:
+            return
+        try:
+            self.sink.send(batch)
+            self.sent += len(batch)
+        except Exception:
+            # Telemetry must never take the API down
+            self.send_errors += 1
@@ -0,0 +1,241 @@
+"""
+TensorFlow-free replacements for the two Keras preprocessing helpers used at
+inference time (`tokenizer_from_json` and `pad_sequences`), so that the
+TFLite / ONNX backends can serve without importing TensorFlow.
+They follow the legacy Keras implementation line for line.
+
+`FastTokenizer` is the hot-path variant: same output, but the filters
+translate table and the `num_words` / `oov_token` rules are precompiled,
+and batches are encoded straight into a padded int32 array.
+
+`load_fast_tokenizer` reads `tokenizer.json` through a binary cache (.npz:
+the words as one NUL-separated UTF-8 buffer, their ids as int32 and the
+config), rebuilt whenever the size or mtime of the JSON changes. Worker
+startup then skips the double JSON parse of the nested `word_index`.
+"""
+from __future__ import annotations
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Tokenizer:
+    """Inference-only port of the legacy `keras.preprocessing.text.Tokenizer`."""
+
+    def __init__(
+        self,
+        word_index: Dict[str, int],
+        num_words: Optional[int] = None,
+        filters: str = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n',
+        lower: bool = True,
+        split: str = " ",
+        char_level: bool = False,
+        oov_token: Optional[str] = None,
+    ):
+        self.word_index = word_index
+        self.num_words = num_words
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        self.char_level = char_level
+        self.oov_token = oov_token
+
+    def _words(self, text: str) -> Sequence[str]:
+        if self.char_level:
+            return text.lower() if self.lower else text
+        if self.lower:
+            text = text.lower()
+        text = text.translate(str.maketrans({c: self.split for c in self.filters}))
+        return [w for w in text.split(self.split) if w]
+
+    def texts_to_sequences(self, texts: Sequence[str]) -> List[List[int]]:
+        num_words = self.num_words
+        oov_index = self.word_index.get(self.oov_token)
+        out = []
+        for text in texts:
+            vect = []
+            for w in self._words(text):
+                i = self.word_index.get(w)
+                if i is not None:
+                    if num_words and i >= num_words:
+                        if oov_index is not None:
+                            vect.append(oov_index)
+                    else:
+                        vect.append(i)
+                elif self.oov_token is not None:
+                    vect.append(oov_index)
+            out.append(vect)
+        return out
+
+
+class FastTokenizer(Tokenizer):
+    """
+    Precompiled tokenizer, bit-for-bit identical to Keras `texts_to_sequences`
+    followed by `pad_sequences(..., padding="post", truncating="post")`.
+
+    - one `str.translate` table mapping every filter char to `split`
+    - a frozen vocabulary where ids cut by `num_words` already point to the
+      OOV id (or are removed when there is no OOV token)
+    - `encode_batch` writes ids into a preallocated zero-filled int32 array
+    """
+
+    def __init__(self, word_index: Dict[str, int], **config):
+        super().__init__(word_index, **config)
+        self._table = str.maketrans({c: self.split for c in self.filters})
+        oov = word_index.get(self.oov_token) if self.oov_token is not None else None
+        num_words = self.num_words
+        if not num_words:
+            vocab = word_index  # nothing cut: shared, never mutated
+        else:
+            vocab = {}
+            for w, i in word_index.items():
+                if i >= num_words:
+                    i = oov
+                if i is not None:
+                    vocab[w] = i
+        self._vocab = vocab
+        self._oov = oov
+
+    def _ids(self, text: str) -> List[int]:
+        if self.char_level:
+            words = text.lower() if self.lower else text
+        else:
+            if self.lower:
+                text = text.lower()
+            words = text.translate(self._table).split(self.split)
+        get = self._vocab.get
+        if self._oov is None:
+            return [i for i in map(get, words) if i is not None]
+        oov = self._oov
+        # "" only exists in the vocab if it was fitted on; Keras drops empty words
+        return [get(w, oov) for w in words if w]
+
+    def texts_to_sequences(self, texts: Sequence[str]) -> List[List[int]]:
+        return [self._ids(t) for t in texts]
+
+    def tokenize_batch(self, texts: Sequence[str], maxlen: int) -> List[List[int]]:
+        """Token ids of `texts`, post-truncated to `maxlen` (not padded)."""
+        return [self._ids(t)[:maxlen] for t in texts]
+
+    @staticmethod
+    def pad_batch(rows: Sequence[Sequence[int]], maxlen: int) -> np.ndarray:
+        """Post-pad rows of at most `maxlen` ids into a zero-filled int32 array."""
+        x = np.zeros((len(rows), maxlen), dtype=np.int32)
+        lengths = np.fromiter(map(len, rows), dtype=np.intp, count=len(rows))
+        total = int(lengths.sum())
+        if total:
+            # Row-major boolean mask of the non-padded slots, filled in one assignment
+            flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int32, count=total)
+            x[np.arange(maxlen) < lengths[:, None]] = flat
+        return x
+
+    def encode_batch(self, texts: Sequence[str], maxlen: int) -> np.ndarray:
+        """Token ids of `texts`, post-padded / post-truncated to `maxlen` (int32)."""
+        return self.pad_batch(self.tokenize_batch(texts, maxlen), maxlen)
+
+
+def _config_from_json(json_string: str) -> Dict:
+    config = json.loads(json_string).get("config", {})
+    return dict(
+        word_index=json.loads(config["word_index"]),
+        num_words=config.get("num_words"),
+        filters=config.get("filters", ""),
+        lower=config.get("lower", True),
+        split=config.get("split", " "),
+        char_level=config.get("char_level", False),
+        oov_token=config.get("oov_token"),
+    )
+
+
+def fast_tokenizer_from_json(json_string: str) -> FastTokenizer:
+    return FastTokenizer(**_config_from_json(json_string))
+
+
+def tokenizer_from_json(json_string: str) -> Tokenizer:
+    """Same input as Keras' `tokenizer_from_json` (the `tokenizer.to_json()` output)."""
+    return Tokenizer(**_config_from_json(json_string))
+
+
+CACHE_FORMAT = 1
+
+
+def _cache_stamp(path: Path) -> Dict[str, int]:
+    st = path.stat()
+    return {"format": CACHE_FORMAT, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read_cache(cache_path: Path, stamp: Dict[str, int]) -> Optional[Dict]:
+    try:
+        with np.load(cache_path, allow_pickle=False) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if meta.pop("source") != stamp:
+                return None
+            words = z["words"].tobytes().decode("utf-8").split("\0")
+            ids = z["ids"].tolist()
+    except Exception:  # missing, truncated, corrupt (BadZipFile...) or foreign: only an optimisation
+        return None
+    if len(words) != len(ids):
+        return None
+    return dict(word_index=dict(zip(words, ids)), **meta)
+
+
+def _write_cache(cache_path: Path, stamp: Dict[str, int], config: Dict) -> bool:
+    config = dict(config)
+    word_index = config.pop("word_index")
+    if any("\0" in w for w in word_index):
+        return False
+    meta = json.dumps({"source": stamp, **config}).encode("utf-8")
+    words = "\0".join(word_index).encode("utf-8")
+    # Written next to the target then renamed: concurrent workers never read half a file
+    tmp = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            np.savez(f, meta=np.frombuffer(meta, dtype=np.uint8), words=np.frombuffer(words, dtype=np.uint8),
+                     ids=np.fromiter(word_index.values(), dtype=np.int32, count=len(word_index)))
+        os.replace(tmp, cache_path)
+        return True
+    except OSError:  # read-only image or volume: serve without the cache
+        tmp.unlink(missing_ok=True)
+        return False
+
+
+def load_fast_tokenizer(path: Path, cache_path: Optional[Path] = None) -> Tuple[FastTokenizer, str]:
+    """
+    FastTokenizer of the `tokenizer.json` at `path`, through the binary cache
+    at `cache_path` (None = no cache). The second value tells where it came
+    from: "cache", "json" (cache written) or "json_uncached".
+    """
+    path = Path(path)
+    stamp = _cache_stamp(path)
+    if cache_path is not None:
+        config = _read_cache(Path(cache_path), stamp)
+        if config is not None:
+            return FastTokenizer(**config), "cache"
+    config = _config_from_json(path.read_text(encoding="utf-8"))
+    written = cache_path is not None and _write_cache(Path(cache_path), stamp, config)
+    return FastTokenizer(**config), "json" if written else "json_uncached"
+
+
+def pad_sequences(
+    sequences: Sequence[Sequence[int]],
+    maxlen: int,
+    padding: str = "pre",
+    truncating: str = "pre",
+    value: int = 0,
+    dtype: str = "int32",
+) -> np.ndarray:
+    """NumPy `pad_sequences` for integer ids with a fixed `maxlen`."""
+    x = np.full((len(sequences), maxlen), value, dtype=dtype)
+    for i, s in enumerate(sequences):
+        if not len(s):
+            continue
+        s = s[-maxlen:] if truncating == "pre" else s[:maxlen]
+        if padding == "post":
+            x[i, :len(s)] = s
+        else:
+            x[i, -len(s):] = s
+    return x
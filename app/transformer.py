@@ -0,0 +1,198 @@
+"""
+DistilBERT serving backend for the model written by `azureml/src/train.py`
+(`trainer.save_model(out_dir); tok.save_pretrained(out_dir)`).
+
+    INFERENCE_BACKEND=transformer MODEL_PATH=outputs/model                  # PyTorch
+    python -m app.transformer --model_dir outputs/model --quantize          # -> outputs/model/model.int8.onnx
+    INFERENCE_BACKEND=transformer MODEL_PATH=outputs/model/model.int8.onnx  # ONNX Runtime, no torch
+
+Rows are post-padded to MAX_LEN like the Keras ids (so the micro-batcher
+and the prediction cache work unchanged), then every batch is cut to its
+longest row before the forward pass: a 12-token tweet costs 12 positions,
+not `max_length=128`. The tokenizer is the `tokenizer.json` saved next to
+the model, run by the `tokenizers` library (no transformers / torch needed).
+"""
+from __future__ import annotations
+import argparse
+import inspect
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tokenizer import FastTokenizer
+
+
+class WordPieceTokenizer:
+    """Same ids as the Hugging Face fast tokenizer (lower-casing, [CLS] ... [SEP])."""
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+
+        path = Path(path)
+        if path.is_dir():
+            path = path / "tokenizer.json"
+        self._tok = Tokenizer.from_file(str(path))
+        self._tok.no_padding()
+        self._maxlen: Optional[int] = None
+        pad = self._tok.token_to_id("[PAD]")
+        self.pad_id = 0 if pad is None else int(pad)
+
+    def tokenize_batch(self, texts: Sequence[str], maxlen: int) -> List[List[int]]:
+        """Ids with special tokens, truncated to `maxlen` (the [SEP] is kept)."""
+        if self._maxlen != maxlen:
+            self._tok.enable_truncation(max_length=maxlen)
+            self._maxlen = maxlen
+        return [e.ids for e in self._tok.encode_batch(list(texts))]
+
+    def pad_batch(self, rows: Sequence[Sequence[int]], maxlen: int) -> np.ndarray:
+        x = FastTokenizer.pad_batch(rows, maxlen)
+        if self.pad_id:
+            x[np.arange(maxlen) >= np.fromiter(map(len, rows), dtype=np.intp, count=len(rows))[:, None]] = self.pad_id
+        return x
+
+    def encode_batch(self, texts: Sequence[str], maxlen: int) -> np.ndarray:
+        return self.pad_batch(self.tokenize_batch(texts, maxlen), maxlen)
+
+
+def trim_padding(x: np.ndarray, pad_id: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """(input_ids, attention_mask) of a post-padded batch, cut to its longest row."""
+    mask = x != pad_id
+    length = max(1, int(mask.sum(axis=1).max())) if len(x) else 1
+    return x[:, :length], mask[:, :length]
+
+
+def _softmax_pos(logits: np.ndarray) -> np.ndarray:
+    z = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return (e[:, 1] / e.sum(axis=1)).astype(np.float64)
+
+
+class TransformerBackend:
+    """
+    Sequence-classification model (2 labels) on CPU: the train.py output
+    directory through PyTorch, or an exported `.onnx` through ONNX Runtime.
+    """
+
+    def __init__(self, model_path: str, max_len: int, num_threads: Optional[int] = None, pad_id: int = 0):
+        self.max_len = int(max_len)
+        self.pad_id = int(pad_id)
+        path = Path(model_path)
+        if path.suffix == ".onnx":
+            import onnxruntime as ort
+
+            opts = ort.SessionOptions()
+            if num_threads:
+                opts.intra_op_num_threads = int(num_threads)
+                opts.inter_op_num_threads = 1
+            self._sess = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+            self._inputs = {i.name for i in self._sess.get_inputs()}
+            self._run = self._run_onnx
+        else:
+            import torch
+            from transformers import AutoModelForSequenceClassification
+
+            if num_threads:
+                torch.set_num_threads(int(num_threads))
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:  # already set in this process
+                    pass
+            self._torch = torch
+            self._model = AutoModelForSequenceClassification.from_pretrained(str(path)).eval()
+            self._run = self._run_torch
+
+    def _run_torch(self, ids: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        torch = self._torch
+        with torch.inference_mode():
+            out = self._model(input_ids=torch.from_numpy(ids.astype(np.int64)),
+                              attention_mask=torch.from_numpy(mask.astype(np.int64)))
+        return out.logits.float().numpy()
+
+    def _run_onnx(self, ids: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        feed = {"input_ids": ids.astype(np.int64), "attention_mask": mask.astype(np.int64)}
+        return self._sess.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        if not len(x):
+            return np.zeros((0,), dtype=np.float64)
+        ids, mask = trim_padding(np.asarray(x), self.pad_id)
+        return _softmax_pos(np.asarray(self._run(ids, mask)))
+
+    def warmup(self) -> None:
+        x = np.full((1, self.max_len), self.pad_id, dtype=np.int32)
+        x[0, :8] = self.pad_id + 1
+        self.predict(x)
+
+
+def weights_bytes(path: Path) -> int:
+    """Size of the weight files of a model directory (or of one exported file)."""
+    if not path.is_dir():
+        return path.stat().st_size if path.exists() else 0
+    return sum(f.stat().st_size for f in path.iterdir() if f.suffix in (".safetensors", ".bin"))
+
+
+def export_onnx(model_dir: str, out: Path, quantize: bool = False, opset: int = 17) -> Path:
+    """train.py output directory -> ONNX with dynamic batch / sequence axes; `quantize` = INT8 weights."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    dummy = (torch.ones((1, 16), dtype=torch.long), torch.ones((1, 16), dtype=torch.long))
+    axes = {0: "batch", 1: "sequence"}
+    # torch >= 2.5 defaults to the dynamo exporter (needs onnxscript); keep the TorchScript one
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    def _export(path: Path) -> None:
+        torch.onnx.export(
+            model, dummy, str(path), opset_version=opset,
+            input_names=["input_ids", "attention_mask"], output_names=["logits"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "logits": {0: "batch"}}, **legacy,
+        )
+
+    if not quantize:
+        _export(out)
+        return out
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32 = Path(tmp) / "model.fp32.onnx"
+        _export(fp32)
+        quantize_dynamic(str(fp32), str(out), weight_type=QuantType.QInt8)
+    return out
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model_dir", required=True, help="AZUREML_OUTPUT_MODEL_DIR of train.py")
+    ap.add_argument("--out", default="", help="default: <model_dir>/model[.int8].onnx")
+    ap.add_argument("--quantize", action="store_true", help="dynamic-range INT8 weights")
+    ap.add_argument("--max_len", type=int, default=int(os.getenv("MAX_LEN", 128)))
+    ap.add_argument("--tol", type=float, default=0.02, help="max |p_torch - p_onnx| allowed")
+    args = ap.parse_args(argv)
+
+    out = Path(args.out) if args.out else Path(args.model_dir) / ("model.int8.onnx" if args.quantize else "model.onnx")
+    export_onnx(args.model_dir, out, args.quantize)
+    print(f"exported {out} ({out.stat().st_size / 1e6:.2f} MB)")
+
+    # Parity on a few sentences of different lengths
+    tok = WordPieceTokenizer(args.model_dir)
+    texts = ["I love it", "worst day ever, nothing works", "ok", "not bad at all but I expected more " * 4]
+    x = tok.encode_batch(texts, args.max_len)
+    ref = TransformerBackend(args.model_dir, args.max_len, pad_id=tok.pad_id).predict(x)
+    got = TransformerBackend(str(out), args.max_len, pad_id=tok.pad_id).predict(x)
+    report = {"max_abs_diff": float(np.abs(ref - got).max()),
+              "label_agreement": float(np.mean((ref >= 0.5) == (got >= 0.5)))}
+    print(json.dumps(report, indent=2))
+    ok = report["max_abs_diff"] <= args.tol
+    if not ok:
+        print("parity check FAILED", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
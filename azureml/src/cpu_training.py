@@ -0,0 +1,160 @@
+"""
+CPU-throughput training mode for `train.py` (`--batching length`).
+
+- `LengthGroupedBatchSampler`: each epoch the examples are sorted by length
+  (random order among equal lengths) and packed into batches of at most
+  `max_tokens` padded tokens (`rows x longest row`), then the batch order is
+  shuffled. Batch shapes are the same every epoch, so `len()` is stable for
+  the Trainer's step count. `group_by_length=False` gives the usual random
+  fixed-size batches, with the same padding accounting.
+- `CpuTrainer`: Trainer whose data loaders use that sampler, the padding
+  collator and `dataloader_workers` processes (1 torch thread each).
+- `ThroughputCallback`: samples/s, real tokens/s and padding ratio per epoch,
+  logged to MLflow with `step=epoch`.
+"""
+from __future__ import annotations
+import os, time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from transformers import Trainer, TrainerCallback
+
+
+def configure_torch_threads(num_threads: int = 0) -> int:
+    """Intra-op threads = the CPUs of this process (or `num_threads`), one inter-op thread."""
+    n = num_threads or (len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)
+    torch.set_num_threads(int(n))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # already set (torch allows it once, before any parallel work)
+        pass
+    return int(n)
+
+
+class LengthGroupedBatchSampler:
+    """Batches of example indices; see the module docstring."""
+
+    def __init__(self, lengths: Sequence[int], max_tokens: int = 2048, max_batch: int = 128, batch_size: int = 16,
+                 group_by_length: bool = True, shuffle: bool = True, seed: int = 42):
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.max_tokens = int(max_tokens)
+        self.max_batch = int(max_batch)
+        # None for variable-size batches: accelerate would otherwise cut the
+        # predictions of the last batch to len(dataset) % batch_size
+        self.batch_size = None if group_by_length else int(batch_size)
+        self.group_by_length = group_by_length
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.last_stats: Dict[str, float] = {}
+        # Boundaries of the packed batches over the sorted lengths: they only
+        # depend on the multiset of lengths, not on the tie order
+        self._bounds = self._pack(np.sort(self.lengths)) if group_by_length else None
+
+    def _pack(self, sorted_lengths: np.ndarray) -> List[int]:
+        bounds, start = [0], 0
+        for i, length in enumerate(sorted_lengths):
+            rows = i - start + 1
+            if i > start and (rows * int(length) > self.max_tokens or rows > self.max_batch):
+                bounds.append(i)
+                start = i
+        bounds.append(len(sorted_lengths))
+        return bounds
+
+    def __len__(self) -> int:
+        if self.group_by_length:
+            return len(self._bounds) - 1
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+    def batches(self) -> List[np.ndarray]:
+        """The batches of the next epoch (advances the epoch)."""
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        n = len(self.lengths)
+        if self.group_by_length:
+            order = np.lexsort((rng.random(n) if self.shuffle else np.arange(n), self.lengths))
+            out = [order[a:b] for a, b in zip(self._bounds[:-1], self._bounds[1:])]
+            if self.shuffle:
+                out = [out[i] for i in rng.permutation(len(out))]
+        else:
+            order = rng.permutation(n) if self.shuffle else np.arange(n)
+            out = [order[i:i + self.batch_size] for i in range(0, n, self.batch_size)]
+        real = int(self.lengths.sum())
+        padded = int(sum(len(b) * int(self.lengths[b].max()) for b in out))
+        self.last_stats = {"samples": n, "batches": len(out), "real_tokens": real, "padded_tokens": padded,
+                           "padding_ratio": 1.0 - real / padded if padded else 0.0}
+        return out
+
+    def __iter__(self) -> Iterator[List[int]]:
+        for b in self.batches():
+            yield b.tolist()
+
+
+def _worker_init(_):
+    torch.set_num_threads(1)
+
+
+class CpuTrainer(Trainer):
+    """Trainer with length-grouped / token-budget batches and worker processes for collation."""
+
+    def __init__(self, *args, max_tokens: int = 2048, max_batch: int = 128, group_by_length: bool = True,
+                 dataloader_workers: int = 2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_tokens, self.max_batch = max_tokens, max_batch
+        self.group_by_length = group_by_length
+        self.dataloader_workers = dataloader_workers
+        self.train_sampler: Optional[LengthGroupedBatchSampler] = None
+
+    def _loader(self, dataset, training: bool) -> DataLoader:
+        lengths = [len(ids) for ids in dataset["input_ids"]]
+        # No gradients at evaluation: twice the budget fits in the same memory
+        scale = 1 if training else 2
+        sampler = LengthGroupedBatchSampler(
+            lengths, self.max_tokens * scale, self.max_batch * scale,
+            self.args.train_batch_size if training else self.args.eval_batch_size,
+            group_by_length=self.group_by_length, shuffle=training, seed=self.args.seed,
+        )
+        if training:
+            self.train_sampler = sampler
+        workers = self.dataloader_workers
+        loader = DataLoader(dataset, batch_sampler=sampler, collate_fn=self.data_collator,
+                            num_workers=workers, worker_init_fn=_worker_init if workers else None,
+                            persistent_workers=bool(workers) and training)
+        return self.accelerator.prepare(loader)
+
+    def get_train_dataloader(self):
+        return self._loader(self.train_dataset, training=True)
+
+    def get_eval_dataloader(self, eval_dataset=None):
+        return self._loader(eval_dataset if eval_dataset is not None else self.eval_dataset, training=False)
+
+    def get_test_dataloader(self, test_dataset):
+        return self._loader(test_dataset, training=False)
+
+
+class ThroughputCallback(TrainerCallback):
+    """Times each training epoch and reports it against the sampler's token accounting."""
+
+    def __init__(self, trainer: CpuTrainer, log_metrics: Callable[..., None], log: Callable[[str], None] = print):
+        self.trainer, self.log_metrics, self.log = trainer, log_metrics, log
+        self.t0 = 0.0
+
+    def on_epoch_begin(self, args, state, control, **kw):
+        self.t0 = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kw):
+        seconds = time.perf_counter() - self.t0
+        sampler = self.trainer.train_sampler
+        s = sampler.last_stats if sampler is not None else {}
+        if not s or seconds <= 0:
+            return
+        epoch = int(round(state.epoch or 0))
+        metrics = {"train_epoch_s": seconds,
+                   "train_samples_per_s": s["samples"] / seconds,
+                   "train_tokens_per_s": s["real_tokens"] / seconds,
+                   "train_padded_tokens_per_s": s["padded_tokens"] / seconds,
+                   "train_padding_ratio": s["padding_ratio"],
+                   "train_batches": s["batches"]}
+        self.log_metrics(metrics, step=epoch)
+        self.log(f"[epoch {epoch}] " + " ".join(f"{k}={v:.4g}" for k, v in metrics.items()))
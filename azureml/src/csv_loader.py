@@ -0,0 +1,76 @@
+"""
+Text / label CSV loading shared by `train.py` and `notebooks/scripts/p7kit.py`.
+
+Only the two needed columns are parsed (pyarrow's multithreaded CSV reader,
+pandas' C engine in chunks without pyarrow), rows with a missing value are
+dropped, labels come back as int8, and `sample_n` rows are drawn in the same
+single pass: every row gets a seeded uniform key and the `sample_n` smallest
+keys are kept (bottom-k reservoir), so memory is bounded by the sample plus
+one block and the sample only depends on the file, `sample_n` and `seed`.
+
+    df = load_text_label("data/train.csv", "text", "label", sample_n=40_000)
+"""
+from __future__ import annotations
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+
+BLOCK_BYTES = 4 << 20    # pyarrow read block (several are parsed ahead by the reader threads)
+CHUNK_ROWS  = 200_000    # pandas fallback chunk
+
+
+def _pyarrow():
+    try:
+        import pyarrow, pyarrow.csv, pyarrow.compute  # noqa: F401
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def _blocks(path: str, text_col: str, label_col: str, encoding: str) -> Iterator[pd.DataFrame]:
+    """Non-null (text, label) rows of `path`, one block at a time, labels int8."""
+    pa = _pyarrow()
+    if pa is not None and encoding.lower().replace("-", "") == "utf8":
+        reader = pa.csv.open_csv(
+            path,
+            read_options=pa.csv.ReadOptions(block_size=BLOCK_BYTES),
+            # Empty fields are missing values, as for pd.read_csv
+            convert_options=pa.csv.ConvertOptions(include_columns=[text_col, label_col],
+                                                  column_types={text_col: pa.string()}, strings_can_be_null=True),
+        )
+        for batch in reader:
+            valid = pa.compute.and_(batch.column(0).is_valid(), batch.column(1).is_valid())
+            batch = batch.filter(valid)
+            yield pd.DataFrame({text_col: batch.column(0).to_pandas(),
+                                label_col: batch.column(1).to_numpy(zero_copy_only=False).astype(np.int8)})
+        return
+
+    for chunk in pd.read_csv(path, usecols=[text_col, label_col], dtype={text_col: str},
+                             encoding=encoding, chunksize=CHUNK_ROWS):
+        chunk = chunk[[text_col, label_col]].dropna()
+        yield chunk.astype({label_col: np.int8}).reset_index(drop=True)
+
+
+def load_text_label(path: str, text_col: str = "text", label_col: str = "label",
+                    sample_n: int = 0, seed: int = 42, encoding: str = "utf-8") -> pd.DataFrame:
+    """[text_col, label_col] of `path` (all rows, or a seeded sample of `sample_n` in random order)."""
+    if not sample_n or sample_n <= 0:
+        parts = list(_blocks(path, text_col, label_col, encoding))
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({text_col: [], label_col: []})
+        return df.astype({label_col: np.int8})
+
+    rng = np.random.default_rng(seed)
+    kept: Optional[pd.DataFrame] = None
+    keys = np.empty(0)
+    for block in _blocks(path, text_col, label_col, encoding):
+        # One key per row in file order: the sample does not depend on the block size
+        keys = np.concatenate([keys, rng.random(len(block))])
+        kept = block if kept is None else pd.concat([kept, block], ignore_index=True)
+        if len(kept) > sample_n:
+            top = np.argpartition(keys, sample_n - 1)[:sample_n]
+            kept, keys = kept.iloc[top].reset_index(drop=True), keys[top]
+    if kept is None:
+        return pd.DataFrame({text_col: pd.Series([], dtype=object), label_col: pd.Series([], dtype=np.int8)})
+    order = np.argsort(keys, kind="stable")
+    return kept.iloc[order].reset_index(drop=True)
+
@@ -0,0 +1,78 @@
+"""
+On-disk cache of tokenized `datasets.Dataset` splits, shared between job runs.
+
+The key is a hash of everything the tokenized split depends on: the bytes of
+the input CSV, the column names, `sample_n`, the tokenizer checkpoint and
+`max_length`. A hit loads the Arrow files saved by a previous run
+(`load_from_disk`, memory-mapped) instead of re-reading the CSV and
+re-running the tokenizer; a miss builds the split and saves it under the key.
+
+    cache_dir/<key>/            Dataset.save_to_disk
+    cache_dir/<key>/build.json  settings + build time (for the "time saved" metric)
+"""
+from __future__ import annotations
+import hashlib, json, os, shutil, time, uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+# Bump when the tokenization code changes in a way the settings do not capture
+CACHE_FORMAT = 2  # 2: sample drawn by csv_loader instead of df.sample
+
+
+def file_digest(path: str, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(csv_path: str, **settings: Any) -> Tuple[str, Dict[str, Any]]:
+    """Key of one tokenized split; `settings` are the arguments that change its content."""
+    desc = {"format": CACHE_FORMAT, "csv_sha256": file_digest(csv_path), **settings}
+    raw = json.dumps(desc, sort_keys=True, default=str).encode()
+    return hashlib.sha256(raw).hexdigest()[:24], desc
+
+
+def cached_dataset(cache_dir: str, key: str, desc: Dict[str, Any], build: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    (dataset, info) where info = {"hit", "seconds", "saved_s"}. `saved_s` is
+    the build time recorded by the run that filled the entry minus the load
+    time of this one (0 on a miss). `cache_dir=""` always builds.
+    """
+    from datasets import load_from_disk
+
+    t0 = time.perf_counter()
+    entry = Path(cache_dir) / key if cache_dir else None
+    meta_path = entry / "build.json" if entry else None
+    stale = False
+    if meta_path is not None and meta_path.exists():
+        try:
+            ds = load_from_disk(str(entry))
+            seconds = time.perf_counter() - t0
+            built_s = float(json.loads(meta_path.read_text())["build_s"])
+            return ds, {"hit": True, "seconds": seconds, "saved_s": max(0.0, built_s - seconds)}
+        except Exception as e:  # partial / incompatible entry: rebuild it
+            print(f"[dataset_cache] ignoring {entry}: {e}")
+            stale = True
+
+    ds = build()
+    seconds = time.perf_counter() - t0
+    if entry is not None:
+        # Written next to the entry then renamed: concurrent jobs never see half a dataset
+        tmp = entry.with_name(f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        ds.save_to_disk(str(tmp))
+        (tmp / "build.json").write_text(json.dumps({**desc, "build_s": seconds, "rows": len(ds)}, indent=2, default=str))
+        try:
+            # Only replace what we failed to load (or a directory never published
+            # with its build.json); an entry published meanwhile by a concurrent
+            # job is complete and may already be memory-mapped by it: keep it
+            if stale or (entry.exists() and not meta_path.exists()):
+                shutil.rmtree(entry)
+            if meta_path.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
+            else:
+                os.replace(tmp, entry)
+        except OSError:  # another job won the race
+            shutil.rmtree(tmp, ignore_errors=True)
+    return ds, {"hit": False, "seconds": seconds, "saved_s": 0.0}
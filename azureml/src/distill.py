@@ -0,0 +1,284 @@
+"""
+Knowledge distillation: the fine-tuned DistilBERT of train.py (teacher) into
+the Keras CNN+BiLSTM served by app.inference (student).
+
+    python azureml/src/distill.py --teacher outputs/model --train_csv data/train.csv --val_csv data/val.csv \
+        --test_csv data/test.csv --tokenizer app/artifacts/tokenizer.json --out_dir outputs/student
+
+1. Teacher probabilities over every split, in length-sorted batches with
+   dynamic padding (app.transformer; `--teacher` may be the ONNX export),
+   cached in `--cache_dir` under a key of the CSV bytes, sampling settings
+   and teacher weights: re-running with other student settings skips it.
+2. Student trained on (1 - alpha) * BCE(label, p) + alpha * T^2 * BCE(s(q), s(p))
+   (q = teacher, s(p) = sigmoid(logit(p) / T), temperature T) with the ids
+   the server computes: `FastTokenizer.encode_batch(texts, MAX_LEN)` on the
+   same `tokenizer.json` (`--tokenizer`, or fitted on the training texts).
+3. `out_dir/model.keras` + `tokenizer.json`, ready for app/artifacts, and
+   `distill_report.json`: accuracy and latency (tokenize + forward) of the
+   teacher, the student and the production model on the test split.
+"""
+from __future__ import annotations
+import argparse, hashlib, json, os, sys, time, zipfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[2]  # the job uploads the repository root (jobs/distill_job.yml)
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+from csv_loader import load_text_label
+from dataset_cache import cache_key
+from app.runtime import available_cpus
+from app.tokenizer import FastTokenizer, fast_tokenizer_from_json
+
+
+# --- teacher ---
+def teacher_digest(path: Path) -> str:
+    """Hash of the teacher weights (the .onnx file, or the weight files of the model directory)."""
+    h = hashlib.sha256()
+    files = sorted(f for f in path.iterdir() if f.suffix in (".safetensors", ".bin")) if path.is_dir() else [path]
+    for f in files:
+        with f.open("rb") as fh:
+            while chunk := fh.read(1 << 20):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def teacher_probs(teacher: Path, texts: Sequence[str], max_length: int, batch: int = 64,
+                  threads: int = 0, log: Callable[[str], None] = print) -> np.ndarray:
+    """Teacher p_pos of `texts`; rows are scored shortest first so each batch pads to a similar length."""
+    from app.transformer import TransformerBackend, WordPieceTokenizer
+
+    tok = WordPieceTokenizer(str(teacher if teacher.is_dir() else teacher.parent))
+    be = TransformerBackend(str(teacher), max_length, threads or available_cpus(), pad_id=tok.pad_id)
+    rows = tok.tokenize_batch(texts, max_length)
+    order = np.argsort([len(r) for r in rows], kind="stable")
+    out = np.empty(len(rows), dtype=np.float32)
+    t0 = time.perf_counter()
+    for i, start in enumerate(range(0, len(rows), batch)):
+        idx = order[start:start + batch]
+        out[idx] = be.predict(tok.pad_batch([rows[j] for j in idx], max_length))
+        if i and i % 200 == 0:
+            done = start + len(idx)
+            log(f"[teacher] {done}/{len(rows)} rows, {done / (time.perf_counter() - t0):.0f} rows/s")
+    return out
+
+
+def cached_teacher_probs(args, csv_path: str, texts: Sequence[str], split: str) -> np.ndarray:
+    key, desc = cache_key(csv_path, text_col=args.text_col, label_col=args.label_col,
+                          sample_n=args.sample_n if split == "train" else 0, seed=42,
+                          teacher=teacher_digest(Path(args.teacher)), max_length=args.teacher_max_length)
+    path = Path(args.cache_dir) / f"teacher_{key}.npy" if args.cache_dir else None
+    if path is not None and path.exists():
+        probs = np.load(path)
+        if len(probs) == len(texts):
+            print(f"[teacher] {split}: cache hit {path.name}")
+            return probs
+    t0 = time.perf_counter()
+    probs = teacher_probs(Path(args.teacher), texts, args.teacher_max_length, args.teacher_batch, args.threads)
+    print(f"[teacher] {split}: {len(texts)} rows in {time.perf_counter() - t0:.1f}s")
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + f".{os.getpid()}.tmp.npy")
+        np.save(tmp, probs)
+        os.replace(tmp, path)
+    return probs
+
+
+# --- student ---
+def student_tokenizer_json(path: str, texts: Sequence[str], max_vocab: int) -> str:
+    """The Keras tokenizer.json served with the student: `path`, or one fitted on `texts`."""
+    if path:
+        return Path(path).read_text(encoding="utf-8")
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    tok = Tokenizer(num_words=max_vocab, oov_token="<unk>")
+    tok.fit_on_texts(texts)
+    return tok.to_json()
+
+
+def build_student(vocab_size: int, max_len: int, emb_dim: int = 128):
+    """Same layers as the served CNN+BiLSTM."""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    inp = layers.Input(shape=(max_len,), dtype="int32")
+    x = layers.Embedding(vocab_size, emb_dim)(inp)
+    x = layers.SpatialDropout1D(0.2)(x)
+    x = layers.Conv1D(128, 3, padding="same", activation="relu")(x)
+    x = layers.MaxPool1D(2)(x)
+    x = layers.Bidirectional(layers.LSTM(64))(x)
+    x = layers.Dropout(0.3)(x)
+    out = layers.Dense(1, activation="sigmoid")(x)
+    return keras.Model(inp, out)
+
+
+def distillation_loss(alpha: float, temperature: float):
+    """y = [label, teacher p_pos]; the model outputs a probability (sigmoid)."""
+    import tensorflow as tf
+    bce = tf.keras.losses.binary_crossentropy
+    eps = 1e-6
+
+    def soften(p):
+        p = tf.clip_by_value(p, eps, 1 - eps)
+        return tf.sigmoid((tf.math.log(p) - tf.math.log1p(-p)) / temperature)
+
+    def loss(y, p):
+        hard, soft = y[:, :1], y[:, 1:]
+        return (1 - alpha) * bce(hard, p) + alpha * temperature ** 2 * bce(soften(soft), soften(p))
+
+    return loss
+
+
+def hard_accuracy(y, p):
+    import tensorflow as tf
+    return tf.reduce_mean(tf.cast(tf.equal(y[:, 0] >= 0.5, p[:, 0] >= 0.5), tf.float32))
+
+
+# --- report ---
+def latency_ms(predict: Callable[[List[str]], np.ndarray], texts: Sequence[str], batch: int, calls: int) -> float:
+    """Median ms of one call (tokenization included) on `batch` texts."""
+    predict(list(texts[:batch]))
+    times = []
+    for i in range(calls):
+        start = (i * batch) % max(1, len(texts) - batch)
+        t0 = time.perf_counter()
+        predict(list(texts[start:start + batch]))
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+def keras_pipeline(model, tok: FastTokenizer, max_len: int) -> Callable[[List[str]], np.ndarray]:
+    from app.backends import TFFunctionBackend
+    be = TFFunctionBackend(model, max_len, batch_buckets=(1, 2, 4, 8, 16, 32, 64))
+    be.warmup()
+    return lambda texts: be.predict(tok.encode_batch(texts, max_len))
+
+
+def evaluate(predict, texts: Sequence[str], labels: np.ndarray, args,
+             probs: Optional[np.ndarray] = None) -> Dict[str, float]:
+    if probs is None:
+        probs = np.concatenate([predict(list(texts[i:i + 256])) for i in range(0, len(texts), 256)])
+    return {"accuracy": float(np.mean((probs >= 0.5) == labels)),
+            "p50_ms_b1": latency_ms(predict, texts, 1, args.latency_calls),
+            "p50_ms_b32": latency_ms(predict, texts, 32, max(5, args.latency_calls // 10)),
+            "_probs": probs}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--teacher", required=True, help="train.py output directory, or its .onnx export")
+    ap.add_argument("--train_csv", required=True)
+    ap.add_argument("--val_csv", required=True)
+    ap.add_argument("--test_csv", default="")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--label_col", default="label")
+    ap.add_argument("--sample_n", type=int, default=0)  # 0 = full training CSV
+    ap.add_argument("--tokenizer", default="", help="Keras tokenizer.json to keep (default: fit a new one)")
+    ap.add_argument("--max_vocab", type=int, default=50_000)
+    ap.add_argument("--max_len", type=int, default=int(os.getenv("MAX_LEN", 80)))
+    ap.add_argument("--init_model", default="", help="start from this model.keras (same tokenizer)")
+    ap.add_argument("--production_model", default=str(ROOT / "app" / "artifacts" / "model.keras"))
+    ap.add_argument("--production_tokenizer", default=str(ROOT / "app" / "artifacts" / "tokenizer.json"))
+    ap.add_argument("--alpha", type=float, default=0.7, help="weight of the teacher term")
+    ap.add_argument("--temperature", type=float, default=2.0)
+    ap.add_argument("--epochs", type=int, default=5)
+    ap.add_argument("--batch_size", type=int, default=256)
+    ap.add_argument("--lr", type=float, default=2e-3)
+    ap.add_argument("--teacher_max_length", type=int, default=128)
+    ap.add_argument("--teacher_batch", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--cache_dir", default=os.getenv("TEACHER_CACHE_DIR", "./outputs/teacher_cache"))
+    ap.add_argument("--latency_calls", type=int, default=200)
+    ap.add_argument("--out_dir", default=os.getenv("AZUREML_OUTPUT_MODEL_DIR", "./outputs/student"))
+    args = ap.parse_args()
+
+    import mlflow
+    import tensorflow as tf
+    from tensorflow import keras
+
+    if uri := os.getenv("MLFLOW_TRACKING_URI"):
+        mlflow.set_tracking_uri(uri)
+    mlflow.set_experiment("p7-distillation")
+    keras.utils.set_random_seed(42)
+
+    with mlflow.start_run(run_name="distilbert-to-cnn-bilstm"):
+        mlflow.log_params({k: v for k, v in vars(args).items() if k not in ("production_model", "production_tokenizer")})
+        splits = {"train": args.train_csv, "val": args.val_csv, "test": args.test_csv}
+        data = {}
+        for split, path in splits.items():
+            if not path:
+                continue
+            df = load_text_label(path, args.text_col, args.label_col, sample_n=args.sample_n if split == "train" else 0)
+            texts, labels = df[args.text_col].astype(str).tolist(), df[args.label_col].to_numpy().astype(np.float32)
+            data[split] = (texts, labels, cached_teacher_probs(args, path, texts, split))
+
+        tok_json = student_tokenizer_json(args.tokenizer, data["train"][0], args.max_vocab)
+        tok = fast_tokenizer_from_json(tok_json)
+        vocab_size = tok.num_words or len(tok.word_index) + 1
+
+        def xy(split):
+            texts, labels, soft = data[split]
+            return tok.encode_batch(texts, args.max_len), np.stack([labels, soft], axis=1)
+
+        if args.init_model:
+            student = keras.models.load_model(args.init_model, compile=False)
+            if student.input_shape[1] != args.max_len:
+                raise ValueError(f"{args.init_model} expects {student.input_shape[1]} tokens, --max_len is {args.max_len}")
+        else:
+            student = build_student(vocab_size, args.max_len)
+        student.compile(optimizer=keras.optimizers.Adam(args.lr),
+                        loss=distillation_loss(args.alpha, args.temperature), metrics=[hard_accuracy])
+        x_tr, y_tr = xy("train")
+        ds_tr = tf.data.Dataset.from_tensor_slices((x_tr, y_tr)).shuffle(min(len(x_tr), 50_000), seed=42) \
+            .batch(args.batch_size).prefetch(tf.data.AUTOTUNE)
+        ds_va = tf.data.Dataset.from_tensor_slices(xy("val")).batch(1024)
+        t0 = time.perf_counter()
+        student.fit(ds_tr, validation_data=ds_va, epochs=args.epochs, verbose=2, callbacks=[
+            keras.callbacks.EarlyStopping(monitor="val_hard_accuracy", mode="max", patience=2, restore_best_weights=True),
+            keras.callbacks.ReduceLROnPlateau(monitor="val_loss", patience=1, factor=0.5),
+        ])
+        mlflow.log_metric("student_train_s", time.perf_counter() - t0)
+
+        # Saved with a standard loss: app.inference loads it without custom objects
+        student.compile(optimizer="adam", loss="binary_crossentropy", metrics=["accuracy"])
+        out = Path(args.out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        student.save(out / "model.keras")
+        (out / "tokenizer.json").write_text(tok_json, encoding="utf-8")
+
+        report: Dict[str, Dict[str, float]] = {}
+        if "test" in data:
+            texts, labels, teacher_p = data["test"]
+            from app.transformer import TransformerBackend, WordPieceTokenizer
+            teacher_path = Path(args.teacher)
+            wp = WordPieceTokenizer(str(teacher_path if teacher_path.is_dir() else teacher_path.parent))
+            teacher_be = TransformerBackend(str(teacher_path), args.teacher_max_length,
+                                            args.threads or available_cpus(), pad_id=wp.pad_id)
+            report["teacher"] = evaluate(lambda t: teacher_be.predict(wp.encode_batch(t, args.teacher_max_length)),
+                                         texts, labels, args, probs=teacher_p)
+            served = keras.models.load_model(out / "model.keras")
+            report["student"] = evaluate(keras_pipeline(served, tok, args.max_len), texts, labels, args)
+            prod, prod_tok = Path(args.production_model), Path(args.production_tokenizer)
+            if zipfile.is_zipfile(prod) and prod_tok.exists():  # not a Git LFS pointer
+                prod_model = keras.models.load_model(prod)
+                report["production"] = evaluate(
+                    keras_pipeline(prod_model, fast_tokenizer_from_json(prod_tok.read_text(encoding="utf-8")),
+                                   prod_model.input_shape[1]),
+                    texts, labels, args)
+            student_p = report["student"]["_probs"]
+            agreement = float(np.mean((student_p >= 0.5) == (teacher_p >= 0.5)))
+            for name, r in report.items():
+                r.pop("_probs")
+                mlflow.log_metrics({f"{name}_test_{k}": v for k, v in r.items()})
+            mlflow.log_metric("student_teacher_agreement", agreement)
+            report["student"]["teacher_agreement"] = agreement
+
+        (out / "distill_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(json.dumps(report, indent=2))
+        mlflow.log_artifacts(str(out), artifact_path="student")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 import os, argparse, numpy as np, pandas as pd, mlflow
 from datasets import Dataset
+from csv_loader import load_text_label
+from dataset_cache import cache_key, cached_dataset
+from cpu_training import CpuTrainer, ThroughputCallback, configure_torch_threads
 from sklearn.metrics import accuracy_score, f1_score
 from transformers import (
     AutoTokenizer, AutoModelForSequenceClassification,
-    TrainingArguments, Trainer, DataCollatorWithPadding
+    TrainingArguments, DataCollatorWithPadding
 )
 
 def compute_metrics(eval_pred):
@@ -14,13 +17,9 @@ def compute_metrics(eval_pred):
             "f1_weighted": f1_score(labels, preds, average="weighted")}
 
 def load_split_csv(path: str, text_col: str, label_col: str, sample_n: int = 0) -> pd.DataFrame:
-    df = pd.read_csv(path)
-    df = df[[text_col, label_col]].dropna().copy()
-    df.rename(columns={text_col: "text", label_col: "label"}, inplace=True)
-    df["label"] = df["label"].astype(int)
-    if sample_n and sample_n > 0:
-        df = df.sample(n=min(sample_n, len(df)), random_state=42)
-    return df.reset_index(drop=True)
+    # Two columns only, int8 labels, seeded sample drawn while streaming (csv_loader.py)
+    df = load_text_label(path, text_col, label_col, sample_n=sample_n, seed=42)
+    return df.rename(columns={text_col: "text", label_col: "label"})
 
 def main():
     ap = argparse.ArgumentParser()
@@ -32,6 +31,14 @@ def main():
     ap.add_argument("--epochs",    type=int, default=1)
     ap.add_argument("--max_length", type=int, default=128)
     ap.add_argument("--sample_n",   type=int, default=0)  # 0 = full
+    ap.add_argument("--cache_dir",  default=os.getenv("TOKENIZED_CACHE_DIR", ""))  # "" = no cache
+    ap.add_argument("--num_proc",   type=int, default=os.cpu_count() or 1)  # tokenization processes on a miss
+    # length = length-grouped batches of at most --max_tokens padded tokens; random = fixed 16 / 32
+    ap.add_argument("--batching",   choices=["random", "length"], default="random")
+    ap.add_argument("--max_tokens", type=int, default=2048)
+    ap.add_argument("--max_batch",  type=int, default=128)
+    ap.add_argument("--dataloader_workers", type=int, default=2)
+    ap.add_argument("--torch_threads", type=int, default=0)  # 0 = every CPU of the node
     args = ap.parse_args()
 
     if uri := os.getenv("MLFLOW_TRACKING_URI"):
@@ -39,22 +46,37 @@ def main():
     mlflow.set_experiment("p7-distilbert")
 
     with mlflow.start_run(run_name="distilbert-cpu-splits"):
+        threads = configure_torch_threads(args.torch_threads)
+        mlflow.log_params({"batching": args.batching, "max_tokens": args.max_tokens, "max_batch": args.max_batch,
+                           "dataloader_workers": args.dataloader_workers, "torch_threads": threads})
         ckpt = "distilbert-base-uncased"
         tok = AutoTokenizer.from_pretrained(ckpt)
 
-        tr_df = load_split_csv(args.train_csv, args.text_col, args.label_col, args.sample_n)
-        va_df = load_split_csv(args.val_csv,   args.text_col, args.label_col, args.sample_n)
-        te_df = load_split_csv(args.test_csv,  args.text_col, args.label_col, args.sample_n) if args.test_csv else None
+        def tok_fn(b): return tok(b["text"], truncation=True, max_length=args.max_length)
 
-        ds_train = Dataset.from_pandas(tr_df, preserve_index=False)
-        ds_val   = Dataset.from_pandas(va_df, preserve_index=False)
-        ds_test  = Dataset.from_pandas(te_df, preserve_index=False) if te_df is not None else None
+        def tokenized(path: str, split: str):
+            def build():
+                df = load_split_csv(path, args.text_col, args.label_col, args.sample_n)
+                ds = Dataset.from_pandas(df, preserve_index=False)
+                # Worker processes only pay off above a few thousand rows
+                num_proc = args.num_proc if args.num_proc > 1 and len(ds) >= 10_000 else None
+                return ds.map(tok_fn, batched=True, remove_columns=["text"], num_proc=num_proc)
 
-        def tok_fn(b): return tok(b["text"], truncation=True, max_length=args.max_length)
-        ds_train = ds_train.map(tok_fn, batched=True, remove_columns=["text"])
-        ds_val   = ds_val.map(tok_fn,   batched=True, remove_columns=["text"])
-        if ds_test is not None:
-            ds_test = ds_test.map(tok_fn, batched=True, remove_columns=["text"])
+            key, desc = cache_key(path, text_col=args.text_col, label_col=args.label_col, sample_n=args.sample_n,
+                                  tokenizer=ckpt, max_length=args.max_length)
+            ds, info = cached_dataset(args.cache_dir, key, desc, build)
+            print(f"[{split}] tokenized cache {'hit' if info['hit'] else 'miss'} {key} ({info['seconds']:.1f}s)")
+            mlflow.log_param(f"tok_cache_key_{split}", key)
+            mlflow.log_metrics({f"tok_cache_hit_{split}": float(info["hit"]),
+                                f"tok_time_s_{split}": info["seconds"],
+                                f"tok_time_saved_s_{split}": info["saved_s"]})
+            return ds, info
+
+        splits = {"train": args.train_csv, "val": args.val_csv, "test": args.test_csv}
+        data = {split: tokenized(path, split) for split, path in splits.items() if path}
+        mlflow.log_metric("tok_time_saved_s", sum(info["saved_s"] for _, info in data.values()))
+        ds_train, ds_val = data["train"][0], data["val"][0]
+        ds_test = data["test"][0] if "test" in data else None
 
         collator = DataCollatorWithPadding(tokenizer=tok)
         model = AutoModelForSequenceClassification.from_pretrained(ckpt, num_labels=2)
@@ -71,10 +93,14 @@ def main():
             report_to=[]
         )
 
-        trainer = Trainer(model=model, args=targs,
-                          train_dataset=ds_train, eval_dataset=ds_val,
-                          tokenizer=tok, data_collator=collator,
-                          compute_metrics=compute_metrics)
+        trainer = CpuTrainer(model=model, args=targs,
+                             train_dataset=ds_train, eval_dataset=ds_val,
+                             tokenizer=tok, data_collator=collator,
+                             compute_metrics=compute_metrics,
+                             max_tokens=args.max_tokens, max_batch=args.max_batch,
+                             group_by_length=args.batching == "length",
+                             dataloader_workers=args.dataloader_workers)
+        trainer.add_callback(ThroughputCallback(trainer, mlflow.log_metrics))
         trainer.train()
         val_metrics = trainer.evaluate()
         mlflow.log_metrics({f"val_{k}": float(v) for k, v in val_metrics.items() if isinstance(v, (int, float))})
@@ -95,4 +121,6 @@ def main():
 
 if __name__ == "__main__":
     os.makedirs("./outputs", exist_ok=True)
+    # Fast tokenizer threads + forked map() workers can deadlock
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
     main()
@@ -0,0 +1,53 @@
+"""
+Per-call latency of the forward-pass backends against `model.predict`.
+
+    python benchmarks/bench_backends.py --batch 1 --batch 16 --n 300
+    python benchmarks/bench_backends.py --tflite app/artifacts/model.int8.tflite --onnx app/artifacts/model.onnx
+
+Exported files must come from the same model.keras (`python -m app.export`).
+"""
+from __future__ import annotations
+import argparse
+
+from common import load_model_or_synthetic, print_table, random_batch, time_calls, write_results
+
+from app.backends import OnnxBackend, TFFunctionBackend, TFLiteBackend
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, action="append", help="batch sizes (repeatable)")
+    ap.add_argument("--max_len", type=int, default=80)
+    ap.add_argument("--n", type=int, default=200)
+    ap.add_argument("--tflite", default="", help="exported .tflite to include")
+    ap.add_argument("--onnx", default="", help="exported .onnx to include")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    batches = args.batch or [1, 16]
+
+    model, kind = load_model_or_synthetic(max_len=args.max_len)
+    tf_fn = TFFunctionBackend(model, args.max_len)
+    tf_fn.warmup()
+    exported = {}
+    if args.tflite:
+        exported["tflite"] = TFLiteBackend(args.tflite, args.max_len)
+    if args.onnx:
+        exported["onnx"] = OnnxBackend(args.onnx, args.max_len)
+
+    rows = {}
+    for b in batches:
+        x = random_batch(b, args.max_len)
+        rows[f"keras predict      b={b}"] = time_calls(lambda: model.predict(x, verbose=0), args.n)
+        rows[f"direct model(x)    b={b}"] = time_calls(lambda: model(x, training=False), args.n)
+        rows[f"tf_function bucket b={b}"] = time_calls(lambda: tf_fn.predict(x), args.n)
+        for name, be in exported.items():
+            rows[f"{name:<18} b={b}"] = time_calls(lambda: be.predict(x), args.n)
+
+    print(f"model: {kind}")
+    print_table(rows)
+    if args.out:
+        write_results(args.out, {"model": kind, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
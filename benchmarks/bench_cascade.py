@@ -0,0 +1,97 @@
+"""
+Offline report of the prediction cascade (app/cascade.py): for each threshold,
+share of the traffic the first stage answers, accuracy lost against the served
+model alone, and the latency saved per /predict call.
+
+    python benchmarks/bench_cascade.py --csv data/test.csv                        # artifacts/cascade.npz
+    python benchmarks/bench_cascade.py --csv data/test.csv --train data/train.csv # first stage trained here
+
+Latencies are measured per call (b=1, prediction cache and micro-batching off):
+first stage alone, predict_one on the served model (INFERENCE_BACKEND / MODEL_PATH
+apply) and predict_one through the cascade at the chosen threshold. The expected
+latency of a threshold is first + (1 - offload) x model. Without the real Keras
+artifacts a synthetic model is used and only the latency columns are meaningful.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import ROOT, artifacts_available, time_calls, write_results, write_synthetic_artifacts
+
+os.environ.setdefault("PRED_CACHE_SIZE", "0")
+os.environ.setdefault("BATCH_MAX_SIZE", "1")
+os.environ["CASCADE_PATH"] = ""  # the stages are timed separately below
+
+from app.cascade import ART, THRESHOLDS, FirstStage, calibrate, read_labelled, sweep
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", required=True, help="labelled texts (train.py columns)")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--label_col", default="label")
+    ap.add_argument("--n", type=int, default=20_000)
+    ap.add_argument("--cascade", default=str(ART / "cascade.npz"))
+    ap.add_argument("--train", default="", help="train the first stage on this CSV instead of --cascade")
+    ap.add_argument("--threshold", type=float, default=0.0, help="default: calibrated on --csv with --max_loss")
+    ap.add_argument("--max_loss", type=float, default=0.005)
+    ap.add_argument("--calls", type=int, default=300)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    kind = os.getenv("MODEL_PATH", "artifacts")
+    if "MODEL_PATH" not in os.environ and not artifacts_available():
+        paths = write_synthetic_artifacts(Path(tmp.name))
+        os.environ["MODEL_PATH"], os.environ["TOKENIZER_PATH"] = str(paths["model"]), str(paths["tokenizer"])
+        kind = "synthetic"
+    from app import inference
+    inference.load_model()
+
+    texts, y = read_labelled(args.csv, args.text_col, args.label_col, args.n)
+    if args.train:
+        train_texts, train_y = read_labelled(args.train, args.text_col, args.label_col)
+        first = FirstStage.train(train_texts, train_y)
+    else:
+        first = FirstStage.load(Path(args.cascade))
+    p_first = first.predict_proba(texts)
+    p_model = inference.predict_proba(texts)
+    rows = sweep(p_first, p_model, y)
+    chosen = next(r for r in rows if r["threshold"] == args.threshold) if args.threshold \
+        else calibrate(rows, args.max_loss)
+
+    cycle = itertools.cycle(texts)
+    lat = {"first_stage": time_calls(lambda: first.predict_proba([next(cycle)]), args.calls),
+           "model": time_calls(lambda: inference.predict_one(next(cycle)), args.calls)}
+    first.threshold = chosen["threshold"]
+    inference.first_stage = first
+    lat[f"cascade@{first.threshold}"] = time_calls(lambda: inference.predict_one(next(cycle)), args.calls)
+    t1, tm = lat["first_stage"]["mean_ms"], lat["model"]["mean_ms"]
+    for r in rows:
+        r["expected_ms"] = t1 + (1.0 - r["offload"]) * tm
+        r["saved_ms"] = tm - r["expected_ms"]
+
+    print(f"model: {kind} ({inference.INFERENCE_BACKEND}), {len(texts)} texts, "
+          f"model accuracy {rows[0]['model_accuracy']:.4f}, first stage alone {rows[0]['accuracy']:.4f}")
+    print(f"{'threshold':>10}{'offload':>10}{'accuracy':>10}{'loss':>9}{'expected_ms':>13}{'saved_ms':>10}")
+    shown = set(np.round(THRESHOLDS[::10], 3)) | {chosen["threshold"]}
+    for r in rows:
+        if r["threshold"] in shown:
+            mark = "  <- chosen" if r["threshold"] == chosen["threshold"] else ""
+            print(f"{r['threshold']:>10.3f}{r['offload']:>10.3f}{r['accuracy']:>10.4f}{r['accuracy_loss']:>9.4f}"
+                  f"{r['expected_ms']:>13.3f}{r['saved_ms']:>10.3f}{mark}")
+    for name, r in lat.items():
+        print(f"{name:<20} mean {r['mean_ms']:.3f} ms  p50 {r['p50_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms")
+    if args.out:
+        write_results(args.out, {"benchmark": "cascade", "model": kind, "n": len(texts), "chosen": chosen,
+                                 "latency": lat, "sweep": rows})
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
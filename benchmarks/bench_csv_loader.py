@@ -0,0 +1,112 @@
+"""
+Load time and peak memory of the training CSV loaders: the previous
+`pd.read_csv` + column selection (+ `df.sample` in train.py) against
+`azureml/src/csv_loader.py`.
+
+    python benchmarks/bench_csv_loader.py --csv data/train.csv --sample_n 40000 --out results/csv_loader.json
+
+Without --csv a sentiment140-like file (6 columns, --rows rows) is written
+to a temporary directory. Every case runs in a fresh interpreter so that
+the peak RSS (ru_maxrss) of one does not hide the next; "peak_delta_mb" is
+the peak minus the RSS after the imports.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from common import ROOT, write_results
+
+CASES = ("pandas_full", "pandas_sample", "loader_full", "loader_sample", "loader_sample_no_pyarrow")
+WORDS = "the a good bad movie day love hate really not so very great awful tweet lol work today".split()
+
+
+def write_synthetic_csv(path: Path, rows: int, seed: int = 0) -> None:
+    rnd = random.Random(seed)
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["target", "ids", "date", "flag", "user", "text", "label"])
+        for i in range(rows):
+            text = " ".join(rnd.choices(WORDS, k=rnd.randint(3, 25)))
+            label = rnd.randint(0, 1)
+            w.writerow([label * 4, 1_467_810_369 + i, "Mon Apr 06 22:19:45 PDT 2009", "NO_QUERY", f"user{i % 5000}",
+                        text, label])
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def run_case(case: str, path: str, text_col: str, label_col: str, sample_n: int) -> Dict[str, float]:
+    """Runs in the child interpreter."""
+    import pandas as pd
+    sys.path.insert(0, str(ROOT / "azureml" / "src"))
+    import csv_loader
+
+    if case.endswith("no_pyarrow"):
+        csv_loader._pyarrow = lambda: None
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    if case.startswith("pandas"):
+        df = pd.read_csv(path)
+        df = df[[text_col, label_col]].dropna().copy()
+        df[label_col] = df[label_col].astype(int)
+        if case == "pandas_sample":
+            df = df.sample(n=min(sample_n, len(df)), random_state=42)
+    else:
+        df = csv_loader.load_text_label(path, text_col, label_col, sample_n=sample_n if "sample" in case else 0)
+    seconds = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"seconds": seconds, "rows": len(df), "peak_mb": peak, "peak_delta_mb": peak - base,
+            "df_mb": float(df.memory_usage(deep=True).sum()) / 2**20}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default="")
+    ap.add_argument("--rows", type=int, default=1_600_000, help="synthetic file size")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--label_col", default="label")
+    ap.add_argument("--sample_n", type=int, default=40_000)
+    ap.add_argument("--case", action="append", choices=CASES)
+    ap.add_argument("--_child", default="", help=argparse.SUPPRESS)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    if args._child:
+        print(json.dumps(run_case(args._child, args.csv, args.text_col, args.label_col, args.sample_n)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if not path:
+            path = str(Path(tmp) / "synthetic.csv")
+            write_synthetic_csv(Path(path), args.rows)
+        size_mb = Path(path).stat().st_size / 2**20
+        rows = {}
+        for case in args.case or CASES:
+            cmd = [sys.executable, __file__, "--_child", case, "--csv", path, "--text_col", args.text_col,
+                   "--label_col", args.label_col, "--sample_n", str(args.sample_n)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            rows[case] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{path if args.csv else 'synthetic'}: {size_mb:.0f} MB, sample_n={args.sample_n}")
+    print(f"{'case':<28}{'seconds':>10}{'rows':>10}{'peak_mb':>10}{'peak_delta_mb':>15}{'df_mb':>8}")
+    for case, r in rows.items():
+        print(f"{case:<28}{r['seconds']:>10.2f}{r['rows']:>10}{r['peak_mb']:>10.0f}{r['peak_delta_mb']:>15.0f}{r['df_mb']:>8.1f}")
+    if args.out:
+        write_results(args.out, {"benchmark": "csv_loader", "csv": args.csv or "synthetic", "size_mb": size_mb,
+                                 "sample_n": args.sample_n, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
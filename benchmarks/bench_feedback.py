@@ -0,0 +1,133 @@
+"""
+Sustained /feedback writes per second on the local disk: app/feedback_store.py
+(group commit by a background writer) against one write + fsync per record on
+the request thread.
+
+    python benchmarks/bench_feedback.py --threads 8 --duration 10 --rate 2000 --rate 20000 --dir /home/feedback_bench
+
+`--threads` producers append records for `--duration` seconds, back to back
+or paced to `--rate` records/s in total (the sustainable rate is the highest
+one without drops). "written_per_s" counts the records that reached the disk,
+fsync included (the store is closed and drained before it is read);
+"append_p99_ms" is what a request thread pays.
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+
+from common import write_results
+
+from app.feedback_store import FeedbackStore, feedback_label
+
+CASES = ("fsync_per_record", "group_commit", "group_commit_no_fsync")
+
+
+def record(i: int) -> Dict:
+    predicted, correct = ("pos", "neg")[i % 2], i % 3 != 0
+    return {"ts": time.time(), "text": f"tweet number {i} about the product, really {'good' if i % 2 else 'bad'}",
+            "predicted": predicted, "correct": correct, "label": feedback_label(predicted, correct), "note": None}
+
+
+def drive(append: Callable[[Dict], object], threads: int, duration_s: float, rate: float = 0) -> Dict[str, float]:
+    """Producers (closed loop, or `rate` records/s in total); returns per-call latency percentiles."""
+    start = time.perf_counter()
+    stop = start + duration_s
+    lat = [[] for _ in range(threads)]
+    period = threads / rate if rate else 0.0
+
+    def producer(k: int):
+        i, n = k, 0
+        while time.perf_counter() < stop:
+            if period:
+                wait = start + n * period - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                n += 1
+            t0 = time.perf_counter()
+            append(record(i))
+            lat[k].append((time.perf_counter() - t0) * 1000.0)
+            i += threads
+
+    workers = [threading.Thread(target=producer, args=(k,)) for k in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    all_lat = np.concatenate([np.asarray(v) for v in lat])
+    return {"appends": int(len(all_lat)), "seconds": elapsed, "append_p50_ms": float(np.percentile(all_lat, 50)),
+            "append_p99_ms": float(np.percentile(all_lat, 99))}
+
+
+def run_case(case: str, root: Path, args) -> Dict[str, float]:
+    if case == "fsync_per_record":
+        import json
+        lock = threading.Lock()
+        f = (root / "feedback-sync.jsonl").open("ab")
+
+        def append(r):
+            line = (json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")
+            with lock:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+        out = drive(append, args.threads, args.duration, args.rate)
+        f.close()
+        out["written"] = out["appends"]
+        out["written_per_s"] = out["written"] / out["seconds"]
+        return out
+
+    store = FeedbackStore(str(root), max_segment_bytes=args.segment_mb << 20, max_queue=args.queue,
+                          commit_interval_ms=args.commit_interval_ms, fsync=case == "group_commit")
+    out = drive(store.append, args.threads, args.duration, args.rate)
+    t0 = time.perf_counter()
+    store.close(timeout=60)
+    out["drain_s"] = time.perf_counter() - t0
+    s = store.stats()
+    out.update(written=s["written"], dropped=s["dropped"], commits=s["commits"],
+               records_per_commit=s["records_per_commit"], segments=s["segments"])
+    out["written_per_s"] = s["written"] / (out["seconds"] + out["drain_s"])
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--rate", type=float, action="append", help="offered records/s in total (default: closed loop)")
+    ap.add_argument("--dir", default="", help="disk to measure (default: a temporary directory)")
+    ap.add_argument("--segment_mb", type=int, default=64)
+    ap.add_argument("--queue", type=int, default=10_000)
+    ap.add_argument("--commit_interval_ms", type=float, default=20)
+    ap.add_argument("--case", action="append", choices=CASES)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    rows = {}
+    for rate in args.rate or [0]:
+        for case in args.case or CASES:
+            with tempfile.TemporaryDirectory(dir=args.dir or None) as tmp:
+                rows[f"{case}@{rate:.0f}/s" if rate else case] = run_case(case, Path(tmp), argparse.Namespace(
+                    **{**vars(args), "rate": rate}))
+
+    print(f"{args.threads} threads x {args.duration:.0f}s, {args.dir or tempfile.gettempdir()}")
+    cols = ("written_per_s", "append_p50_ms", "append_p99_ms", "dropped", "records_per_commit")
+    print(f"{'case':<32}" + "".join(f"{c:>20}" for c in cols))
+    for case, r in rows.items():
+        print(f"{case:<32}" + "".join(f"{r.get(c, 0):>20.3f}" for c in cols))
+    if args.out:
+        write_results(args.out, {"benchmark": "feedback", "threads": args.threads, "duration_s": args.duration,
+                                 "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Latency by input length of the tf_function backend at full MAX_LEN against
+length buckets (LENGTH_BUCKETS), plus the probability gap between both paths.
+
+    python benchmarks/bench_length_buckets.py --buckets 16,32,48,80 --batch 1 --batch 16
+
+The gap is 0 for a model that masks padding; the CNN+BiLSTM trained with
+padding="post" and no mask sees the trailing zeros, so check the reported
+max |diff| / label agreement on the real model before enabling buckets.
+"""
+from __future__ import annotations
+import argparse
+
+import numpy as np
+
+from common import load_model_or_synthetic, print_table, random_batch, time_calls, write_results
+
+from app.backends import LengthBucketedForward, TFFunctionBackend, parse_buckets
+
+
+def batch_of_length(n: int, length: int, max_len: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = np.zeros((n, max_len), dtype=np.int32)
+    x[:, :length] = rng.integers(1, 20000, size=(n, length))
+    return x
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--buckets", default="16,32,48,80")
+    ap.add_argument("--batch", type=int, action="append")
+    ap.add_argument("--lengths", default="5,10,15,20,30,45,80")
+    ap.add_argument("--max_len", type=int, default=80)
+    ap.add_argument("--n", type=int, default=100)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    buckets = parse_buckets(args.buckets)
+    batches = args.batch or [1, 16]
+
+    model, kind = load_model_or_synthetic(max_len=args.max_len)
+    full = TFFunctionBackend(model, args.max_len, batch_buckets=batches)
+    full.warmup()
+    multi = TFFunctionBackend(model, args.max_len, batch_buckets=batches, length_buckets=buckets)
+    multi.warmup()
+    bucketed = LengthBucketedForward(multi.predict, buckets, args.max_len)
+
+    rows = {}
+    for b in batches:
+        for length in parse_buckets(args.lengths):
+            x = batch_of_length(b, length, args.max_len)
+            rows[f"full     b={b:<3} len={length}"] = time_calls(lambda: full.predict(x), args.n)
+            rows[f"bucketed b={b:<3} len={length}"] = time_calls(lambda: bucketed(x), args.n)
+
+    # Parity on tweet-like lengths, one row at a time (what /predict sees)
+    x = random_batch(500, args.max_len)
+    ref = full.predict(x)
+    got = np.concatenate([bucketed(x[i:i + 1]) for i in range(len(x))])
+    parity = {
+        "max_abs_diff": float(np.abs(ref - got).max()),
+        "mean_abs_diff": float(np.abs(ref - got).mean()),
+        "label_agreement": float(np.mean((ref >= 0.5) == (got >= 0.5))),
+    }
+
+    print(f"model: {kind}, buckets: {buckets}")
+    print_table(rows)
+    print("parity vs full length:", parity)
+    if args.out:
+        write_results(args.out, {"model": kind, "buckets": buckets, "results": rows, "parity": parity})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmarks of each stage of `predict_one` (and of `predict_many`),
+on the configured backend (INFERENCE_BACKEND, LENGTH_BUCKETS...).
+
+    python benchmarks/bench_stages.py --n 500 --out results/stages.json
+    python benchmarks/compare.py results/stages_main.json results/stages.json
+
+The prediction cache and the micro-batcher are off unless PRED_CACHE_SIZE /
+BATCH_MAX_SIZE are set, so that `predict_one` measures the uncached path.
+Without the real LFS artifacts a synthetic model of the same size is used.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+from common import artifacts_available, print_table, sample_texts, time_calls, write_results, write_synthetic_artifacts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=300)
+    ap.add_argument("--batch", type=int, default=64, help="texts per predict_many call")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    os.environ.setdefault("PRED_CACHE_SIZE", "0")
+    os.environ.setdefault("BATCH_MAX_SIZE", "1")
+    kind = "real"
+    if not artifacts_available():
+        tmp = tempfile.mkdtemp()
+        paths = write_synthetic_artifacts(Path(tmp))
+        os.environ.update(MODEL_PATH=str(paths["model"]), TOKENIZER_PATH=str(paths["tokenizer"]))
+        kind = "synthetic"
+
+    from app import inference
+    from app.cache import PredictionCache
+    from app.tokenizer import pad_sequences
+    inference.load_model()
+    forward = inference.registry.active.forward
+
+    texts = sample_texts(1000, inference.TOK_PATH)
+    one = itertools.cycle(texts)
+    many = itertools.cycle([texts[i:i + args.batch] for i in range(0, len(texts) - args.batch + 1, args.batch)])
+    x = inference.tok.encode_batch([texts[0]], inference.MAX_LEN)
+    seqs = inference.tok.texts_to_sequences([texts[0]])
+    p_pos = float(forward(x)[0])
+
+    rows = {
+        "tokenize": time_calls(lambda: inference.tok.texts_to_sequences([next(one)]), args.n),
+        "pad": time_calls(lambda: pad_sequences(seqs, inference.MAX_LEN, padding="post", truncating="post"), args.n),
+        "tokenize+pad (encode_batch)": time_calls(lambda: inference.tok.encode_batch([next(one)], inference.MAX_LEN), args.n),
+        "cache key": time_calls(lambda: PredictionCache.key(x[0]), args.n),
+        "forward b=1": time_calls(lambda: forward(x), args.n),
+        "response build": time_calls(lambda: inference._to_response(p_pos, inference.MODEL_VERSION), args.n),
+        "predict_one": time_calls(lambda: inference.predict_one(next(one)), args.n),
+        f"predict_many b={args.batch}": time_calls(lambda: inference.predict_many(next(many)), max(10, args.n // 10)),
+    }
+
+    print(f"model: {kind}, backend: {inference.INFERENCE_BACKEND}")
+    print_table(rows)
+    if args.out:
+        write_results(args.out, {"benchmark": "stages", "model": kind, "backend": inference.INFERENCE_BACKEND,
+                                 "results": rows})
+
+
+if __name__ == "__main__":
+    main()
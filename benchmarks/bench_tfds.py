@@ -0,0 +1,113 @@
+"""
+Training input pipelines of the notebooks: `p7kit.make_tfds` (in-memory
+arrays + from_tensor_slices) against `p7kit.make_sharded_tfds` (memory-mapped
+.npy shards written once by `write_shards`).
+
+    python benchmarks/bench_tfds.py --rows 1600000 --max_len 80 --out results/tfds.json
+
+Each pipeline runs in a fresh interpreter: examples/s per epoch (one pass,
+batches of --batch_size, training mode) and peak RSS (ru_maxrss, and its
+growth over the RSS once TensorFlow is imported). The in-memory case builds
+its X / y arrays in the child, as the notebooks do.
+"""
+from __future__ import annotations
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+from common import ROOT, write_results
+
+CASES = ("make_tfds", "sharded", "sharded_cache")
+
+
+def synthetic_chunks(rows: int, max_len: int, chunk: int = 100_000, seed: int = 0) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Padded ids (tweet-like lengths) and labels, `chunk` rows at a time."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        x = rng.integers(1, 50_000, size=(n, max_len), dtype=np.int32)
+        x[np.arange(max_len) >= rng.integers(3, 40, size=n)[:, None]] = 0
+        yield x, rng.integers(0, 2, size=n)
+
+
+def run_case(case: str, args) -> Dict[str, float]:
+    """Runs in the child interpreter."""
+    import os
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    sys.path.insert(0, str(ROOT / "notebooks"))
+    import tensorflow as tf  # noqa: F401  (baseline below includes TensorFlow)
+    from scripts import p7kit
+
+    with open("/proc/self/statm") as f:
+        base = int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    if case == "make_tfds":
+        parts = list(synthetic_chunks(args.rows, args.max_len))
+        X, y = np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+        del parts
+        ds = p7kit.make_tfds(X, y, args.batch_size, seed=42, training=True)
+    else:
+        ds = p7kit.make_sharded_tfds(args.shards, args.batch_size, seed=42, training=True,
+                                     cache=case == "sharded_cache")
+    out: Dict[str, float] = {}
+    for epoch in range(1, args.epochs + 1):
+        t0, n = time.perf_counter(), 0
+        for xb, _ in ds:
+            n += int(xb.shape[0])
+        out[f"epoch{epoch}_examples_per_s"] = n / (time.perf_counter() - t0)
+    out["rows"] = n
+    out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    out["peak_over_baseline_mb"] = out["peak_rss_mb"] - base
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_600_000)
+    ap.add_argument("--max_len", type=int, default=80)
+    ap.add_argument("--batch_size", type=int, default=256)
+    ap.add_argument("--epochs", type=int, default=2)
+    ap.add_argument("--shard_rows", type=int, default=100_000)
+    ap.add_argument("--case", action="append", choices=CASES)
+    ap.add_argument("--shards", default="", help=argparse.SUPPRESS)
+    ap.add_argument("--_child", default="", help=argparse.SUPPRESS)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    if args._child:
+        print(json.dumps(run_case(args._child, args)))
+        return
+
+    sys.path.insert(0, str(ROOT / "notebooks"))
+    from scripts import p7kit
+
+    rows = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        manifest = p7kit.write_shards(Path(tmp), synthetic_chunks(args.rows, args.max_len), args.shard_rows)
+        write_s = time.perf_counter() - t0
+        for case in args.case or CASES:
+            cmd = [sys.executable, __file__, "--_child", case, "--shards", tmp] + \
+                  [f"--{k}={getattr(args, k)}" for k in ("rows", "max_len", "batch_size", "epochs")]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            rows[case] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{args.rows} rows x {args.max_len}, {len(manifest['shards'])} shards written in {write_s:.1f}s")
+    cols = [f"epoch{e}_examples_per_s" for e in range(1, args.epochs + 1)] + ["peak_rss_mb", "peak_over_baseline_mb"]
+    print(f"{'case':<16}" + "".join(f"{c:>24}" for c in cols))
+    for case, r in rows.items():
+        print(f"{case:<16}" + "".join(f"{r[c]:>24.0f}" for c in cols))
+    if args.out:
+        write_results(args.out, {"benchmark": "tfds", "rows": args.rows, "max_len": args.max_len,
+                                 "shards": len(manifest["shards"]), "write_s": write_s, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Keras `texts_to_sequences` + `pad_sequences` against `FastTokenizer.encode_batch`
+on batches of 1, 64 and 1024 tweet-like texts.
+
+    python benchmarks/bench_tokenizer.py [--tokenizer app/artifacts/tokenizer.json]
+"""
+from __future__ import annotations
+import argparse
+import random
+
+from common import ROOT, print_table, synthetic_tokenizer_json, time_calls, write_results
+
+from app.tokenizer import fast_tokenizer_from_json
+
+
+def tweets(n: int, tok_json: str, seed: int = 0):
+    import json
+    rnd = random.Random(seed)
+    words = list(json.loads(json.loads(tok_json)["config"]["word_index"]))[:5000] + ["unknownword"] * 50
+    punct = ["!", "...", "?", ",", " @user", " #tag", " http://t.co/abc"]
+    return [" ".join(rnd.choice(words).capitalize() + rnd.choice(punct) for _ in range(rnd.randint(5, 30)))
+            for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tokenizer", default=str(ROOT / "app" / "artifacts" / "tokenizer.json"))
+    ap.add_argument("--max_len", type=int, default=80)
+    ap.add_argument("--n", type=int, default=50)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    from tensorflow.keras.preprocessing.text import tokenizer_from_json
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+    with open(args.tokenizer, encoding="utf-8") as f:
+        tok_json = f.read()
+    kind = "real"
+    if not tok_json.lstrip().startswith("{"):
+        tok_json, kind = synthetic_tokenizer_json(), "synthetic"
+    keras_tok = tokenizer_from_json(tok_json)
+    fast = fast_tokenizer_from_json(tok_json)
+
+    rows = {}
+    for b in (1, 64, 1024):
+        texts = tweets(b, tok_json)
+        n = max(5, args.n if b < 1024 else args.n // 5)
+        rows[f"keras tokenize+pad b={b}"] = time_calls(
+            lambda: pad_sequences(keras_tok.texts_to_sequences(texts), maxlen=args.max_len,
+                                  padding="post", truncating="post"), n)
+        rows[f"fast encode_batch  b={b}"] = time_calls(lambda: fast.encode_batch(texts, args.max_len), n)
+
+    print(f"tokenizer: {kind}")
+    print_table(rows)
+    if args.out:
+        write_results(args.out, {"tokenizer": kind, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
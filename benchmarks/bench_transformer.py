@@ -0,0 +1,104 @@
+"""
+Keras CNN+BiLSTM against the DistilBERT of azureml/src/train.py: latency per
+call (tokenization included) and accuracy on the same labelled texts.
+
+    python benchmarks/bench_transformer.py --model_dir outputs/model --csv data/test.csv --label_col label
+    python benchmarks/bench_transformer.py --model_dir outputs/model/model.int8.onnx --csv data/test.csv
+
+`--model_dir` is the train.py output directory (PyTorch) or an export of it
+(`python -m app.transformer --quantize`). Accuracy needs --csv; without the
+real Keras artifacts a synthetic model is used and only latency is meaningful.
+"""
+from __future__ import annotations
+import argparse
+import csv
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from common import ROOT, artifacts_available, load_model_or_synthetic, print_table, synthetic_tokenizer_json, \
+    time_calls, write_results
+
+from app.backends import TFFunctionBackend
+from app.runtime import available_cpus
+from app.tokenizer import fast_tokenizer_from_json
+from app.transformer import TransformerBackend, WordPieceTokenizer
+
+
+def read_labelled(path: str, text_col: str, label_col: str, n: int) -> Tuple[List[str], np.ndarray]:
+    texts, labels = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get(text_col) and row.get(label_col) not in (None, ""):
+                texts.append(row[text_col])
+                labels.append(int(float(row[label_col])))
+            if len(texts) >= n:
+                break
+    y = np.array(labels)
+    return texts, (y > 0).astype(int) if set(np.unique(y)) <= {0, 4} else y  # sentiment140 uses 0 / 4
+
+
+def pipeline(tok, max_len: int, forward) -> Callable[[List[str]], np.ndarray]:
+    return lambda texts: forward(tok.encode_batch(texts, max_len))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model_dir", required=True)
+    ap.add_argument("--tokenizer", default="", help="default: next to --model_dir")
+    ap.add_argument("--csv", default="")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--label_col", default="label")
+    ap.add_argument("--n", type=int, default=2000, help="labelled rows for accuracy")
+    ap.add_argument("--batch", type=int, action="append")
+    ap.add_argument("--calls", type=int, default=100)
+    ap.add_argument("--keras_max_len", type=int, default=80)
+    ap.add_argument("--bert_max_len", type=int, default=128)
+    ap.add_argument("--threads", type=int, default=available_cpus())
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    batches = args.batch or [1, 16]
+
+    model, kind = load_model_or_synthetic(max_len=args.keras_max_len)
+    tok_json = (ROOT / "app" / "artifacts" / "tokenizer.json").read_text(encoding="utf-8") \
+        if artifacts_available() else synthetic_tokenizer_json()
+    tf_fn = TFFunctionBackend(model, args.keras_max_len)
+    tf_fn.warmup()
+    keras = pipeline(fast_tokenizer_from_json(tok_json), args.keras_max_len, tf_fn.predict)
+
+    path = Path(args.model_dir)
+    wp = WordPieceTokenizer(args.tokenizer or str(path if path.is_dir() else path.parent))
+    bert_be = TransformerBackend(str(path), args.bert_max_len, args.threads, pad_id=wp.pad_id)
+    bert_be.warmup()
+    bert = pipeline(wp, args.bert_max_len, bert_be.predict)
+
+    if args.csv:
+        texts, labels = read_labelled(args.csv, args.text_col, args.label_col, args.n)
+    else:
+        texts, labels = ["I love this, best day ever", "worst service, never again", "meh", "not bad at all"] * 64, None
+
+    rows = {}
+    for b in batches:
+        batch = texts[:b]
+        rows[f"keras tf_function b={b}"] = time_calls(lambda: keras(batch), args.calls)
+        rows[f"distilbert        b={b}"] = time_calls(lambda: bert(batch), args.calls)
+
+    lengths = [len(r) for r in wp.tokenize_batch(texts, args.bert_max_len)]
+    summary = {"bert_mean_tokens": float(np.mean(lengths)), "bert_max_len": args.bert_max_len}
+    if labels is not None:
+        for name, fn in (("keras", keras), ("distilbert", bert)):
+            probs = np.concatenate([fn(texts[i:i + 64]) for i in range(0, len(texts), 64)])
+            summary[f"{name}_accuracy"] = float(np.mean((probs >= 0.5).astype(int) == labels))
+        summary["n"] = len(texts)
+
+    print(f"keras model: {kind}, distilbert: {path}, threads: {args.threads}")
+    print_table(rows)
+    print(summary)
+    if args.out:
+        write_results(args.out, {"benchmark": "transformer", "keras_model": kind, "distilbert": str(path),
+                                 "results": rows, "summary": summary})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Startup time and memory of the gunicorn stack for 1, 2, 4 and 8 workers,
+with and without PRELOAD_APP, per inference backend.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --mode both --out results/workers.json
+    python benchmarks/bench_workers.py --workers 4 --backend keras tflite onnx
+
+Each run starts `gunicorn -c gunicorn.conf.py app.main:app`, waits for the
+"model ready" log line of every worker (model loaded and warmed up by the
+startup hook), then reads RSS and PSS (RSS with shared pages split
+between the processes that map them) from /proc/<pid>/smaps_rollup.
+Only the memory-mapped TFLite file is shared between workers: compare the
+PSS per worker of each backend. Without the real LFS artifacts a synthetic
+model of the same size is used (exported to TFLite / ONNX on the fly).
+"""
+from __future__ import annotations
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from common import ROOT, artifacts_available, write_results, write_synthetic_artifacts
+
+EXPORTED = {"tflite": "model.tflite", "onnx": "model.onnx"}
+
+BOOTED = re.compile(r"worker booted pid=(\d+) boot_s=([\d.]+)")
+READY = re.compile(r"model ready pid=(\d+) startup_s=([\d.]+)")
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                out[key.lower()] = int(rest.split()[0])
+    return out
+
+
+def served_model(backend: str, model_path: Path, tmp_dir: Optional[Path]) -> Optional[Path]:
+    """
+    Exported file served by a TF-free backend: the one next to the real model,
+    else the synthetic model exported to `tmp_dir`; None when unavailable.
+    """
+    name = EXPORTED[backend]
+    if tmp_dir is None:
+        path = ROOT / "app" / "artifacts" / name
+        return path if path.exists() else None
+    path = tmp_dir / name
+    if not path.exists():
+        from tensorflow import keras
+        from app.export import export_onnx, export_tflite
+        try:
+            (export_tflite if backend == "tflite" else export_onnx)(keras.models.load_model(model_path), path, 80)
+        except ImportError as e:
+            print(f"{backend}: cannot export the synthetic model ({e})")
+            return None
+    return path
+
+
+def run_once(workers: int, preload: bool, env: Dict[str, str], port: int, timeout_s: float) -> Dict:
+    env = dict(env, WORKERS=str(workers), PRELOAD_APP="1" if preload else "0", BIND=f"127.0.0.1:{port}")
+    t0 = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    booted: Dict[int, float] = {}
+    ready: Dict[int, float] = {}
+    all_ready = threading.Event()
+
+    def read_logs():
+        for line in proc.stderr:
+            m = BOOTED.search(line)
+            if m:
+                booted[int(m.group(1))] = float(m.group(2))
+            m = READY.search(line)
+            if m:
+                ready[int(m.group(1))] = float(m.group(2))
+                if len(ready) >= workers:
+                    all_ready.set()
+
+    threading.Thread(target=read_logs, daemon=True).start()
+    try:
+        if not all_ready.wait(timeout_s):
+            raise RuntimeError(f"only {len(ready)}/{workers} workers ready after {timeout_s}s")
+        startup_s = time.monotonic() - t0
+        time.sleep(1.0)  # let allocations settle
+        mem = {pid: memory_kb(pid) for pid in ready}
+        master = memory_kb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(30)
+
+    rss = [m["rss"] / 1024 for m in mem.values()]
+    pss = [m["pss"] / 1024 for m in mem.values()]
+    return {
+        "backend": env["INFERENCE_BACKEND"],
+        "workers": workers,
+        "preload": preload,
+        "startup_s": startup_s,
+        # fork -> app imported, then model load + warm-up in the startup hook
+        "worker_boot_s_mean": sum(booted.get(pid, 0.0) + s for pid, s in ready.items()) / len(ready),
+        "worker_rss_mb_mean": sum(rss) / len(rss),
+        "worker_pss_mb_mean": sum(pss) / len(pss),
+        "master_rss_mb": master["rss"] / 1024,
+        "total_pss_mb": sum(pss) + master["pss"] / 1024,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--mode", choices=["standard", "preload", "both"], default="both")
+    ap.add_argument("--backend", nargs="+", default=[os.getenv("INFERENCE_BACKEND", "keras")],
+                    help="keras | tf_function | tflite | onnx (one run per backend)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    base = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="2")
+    tmp = None
+    model_path = ROOT / "app" / "artifacts" / "model.keras"
+    if not artifacts_available():
+        tmp = tempfile.TemporaryDirectory()
+        paths = write_synthetic_artifacts(Path(tmp.name))
+        model_path = paths["model"]
+        base.update(MODEL_PATH=str(model_path), TOKENIZER_PATH=str(paths["tokenizer"]))
+        print("artifacts: synthetic")
+
+    modes = {"standard": [False], "preload": [True], "both": [False, True]}[args.mode]
+    results: List[Dict] = []
+    print(f"{'backend':<12} {'preload':<8} {'workers':>7} {'startup_s':>10} {'boot_s':>8} "
+          f"{'rss_MB':>8} {'pss_MB':>8} {'total_pss_MB':>13}")
+    for backend in args.backend:
+        env = dict(base, INFERENCE_BACKEND=backend)
+        if backend in EXPORTED:
+            served = served_model(backend, model_path, Path(tmp.name) if tmp else None)
+            if served is None:
+                print(f"{backend}: no exported model, skipped (python -m app.export --format {backend})")
+                continue
+            env["SERVED_MODEL_PATH"] = str(served)
+        for preload in modes:
+            for n in args.workers:
+                r = run_once(n, preload, env, args.port, args.timeout)
+                results.append(r)
+                print(f"{backend:<12} {str(preload):<8} {n:>7} {r['startup_s']:>10.2f} {r['worker_boot_s_mean']:>8.2f} "
+                      f"{r['worker_rss_mb_mean']:>8.1f} {r['worker_pss_mb_mean']:>8.1f} {r['total_pss_mb']:>13.1f}")
+    if args.out:
+        write_results(args.out, {"backends": args.backend, "results": results})
+
+
+if __name__ == "__main__":
+    main()
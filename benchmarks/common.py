@@ -0,0 +1,144 @@
+"""
+Shared helpers for the benchmark scripts (run them from the repo root,
+e.g. `python benchmarks/bench_backends.py`).
+"""
+from __future__ import annotations
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+MODEL_PATH = ROOT / "app" / "artifacts" / "model.keras"
+
+
+def build_synthetic_model(vocab_size: int = 20000, max_len: int = 80, seed: int = 0):
+    """Random-weight CNN+BiLSTM with the same shape as the served model."""
+    from tensorflow import keras
+    keras.utils.set_random_seed(seed)
+    inp = keras.Input(shape=(max_len,), dtype="int32")
+    x = keras.layers.Embedding(vocab_size, 128)(inp)
+    x = keras.layers.Conv1D(128, 5, padding="same", activation="relu")(x)
+    x = keras.layers.MaxPooling1D(2)(x)
+    x = keras.layers.Bidirectional(keras.layers.LSTM(64))(x)
+    x = keras.layers.Dropout(0.3)(x)
+    out = keras.layers.Dense(1, activation="sigmoid")(x)
+    return keras.Model(inp, out)
+
+
+def load_model_or_synthetic(path: Path = MODEL_PATH, max_len: int = 80):
+    """The real artifact when it is present (not a Git LFS pointer), else a stand-in."""
+    from tensorflow import keras
+    if path.exists() and zipfile.is_zipfile(path):
+        return keras.models.load_model(path), "real"
+    return build_synthetic_model(max_len=max_len), "synthetic"
+
+
+def synthetic_tokenizer_json(vocab_size: int = 20000, seed: int = 0) -> str:
+    """Keras tokenizer fitted on random words, used when tokenizer.json is an LFS pointer."""
+    import random
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    rnd = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    tok = Tokenizer(num_words=vocab_size, oov_token="<OOV>")
+    tok.fit_on_texts([" ".join(rnd.choices(vocab, k=30)) for _ in range(5000)])
+    return tok.to_json()
+
+
+def write_synthetic_artifacts(out_dir: Path, max_len: int = 80) -> Dict[str, Path]:
+    """Synthetic model.keras + tokenizer.json, for runs without the LFS artifacts."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model_path, tok_path = out_dir / "model.keras", out_dir / "tokenizer.json"
+    build_synthetic_model(max_len=max_len).save(model_path)
+    tok_path.write_text(synthetic_tokenizer_json(), encoding="utf-8")
+    return {"model": model_path, "tokenizer": tok_path}
+
+
+def artifacts_available() -> bool:
+    tok = ROOT / "app" / "artifacts" / "tokenizer.json"
+    return zipfile.is_zipfile(MODEL_PATH) and tok.exists() and tok.read_text(encoding="utf-8").lstrip().startswith("{")
+
+
+def sample_texts(n: int, tokenizer_path: Path, seed: int = 0, top_k: int = 5000) -> List[str]:
+    """Tweet-like texts (5..40 words) drawn from the tokenizer's most frequent words."""
+    rng = np.random.default_rng(seed)
+    config = json.loads(Path(tokenizer_path).read_text(encoding="utf-8"))["config"]
+    word_index = json.loads(config["word_index"])
+    words = sorted(word_index, key=word_index.get)[:top_k]
+    return [" ".join(rng.choice(words, size=length)) for length in rng.integers(5, 41, size=n)]
+
+
+def random_batch(n: int, max_len: int = 80, vocab_size: int = 20000, seed: int = 0) -> np.ndarray:
+    """Post-padded int32 ids with tweet-like lengths (5..40 tokens)."""
+    rng = np.random.default_rng(seed)
+    x = np.zeros((n, max_len), dtype=np.int32)
+    for i, length in enumerate(rng.integers(5, 41, size=n)):
+        x[i, :length] = rng.integers(1, vocab_size, size=length)
+    return x
+
+
+def time_calls(fn: Callable[[], Any], n: int = 200, warmup: int = 10) -> Dict[str, float]:
+    """Per-call latency stats in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(n)
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - t0) * 1000.0
+    return {
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "n": n,
+    }
+
+
+def print_table(rows: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'case':<40} {'mean_ms':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for name, r in rows.items():
+        print(f"{name:<40} {r['mean_ms']:>9.3f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+
+def run_metadata() -> Dict[str, Any]:
+    """Where a result comes from, so that files from two commits can be compared."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "env": {k: v for k, v in os.environ.items() if k in TUNING_ENV},
+    }
+
+
+# Serving settings recorded with every result file
+TUNING_ENV = (
+    "INFERENCE_BACKEND", "SERVED_MODEL_PATH", "TF_BATCH_BUCKETS", "LENGTH_BUCKETS", "INFERENCE_THREADS",
+    "BATCH_MAX_SIZE", "BATCH_MAX_WAIT_MS", "PRED_CACHE_SIZE", "WORKERS", "PRELOAD_APP", "MAX_LEN",
+    "ADMISSION_MAX_CONCURRENT", "ADMISSION_MAX_QUEUE", "REQUEST_DEADLINE_MS",
+)
+
+
+def write_results(path: str, payload: Dict[str, Any]) -> None:
+    """JSON result file: `payload` plus run metadata (see compare.py)."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps({"meta": run_metadata(), **payload}, indent=2), encoding="utf-8")
@@ -0,0 +1,64 @@
+"""
+Compare two result files written by the benchmark scripts (`--out`), e.g.
+the same benchmark on main and on a branch:
+
+    python benchmarks/compare.py results/base.json results/head.json --threshold 10
+
+Prints the relative change of every metric shared by both files and exits
+with code 1 when one gets worse by more than `--threshold` percent
+(latencies up, throughput down), so it can gate a deployment.
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Metric -> True when higher is better
+METRICS = {"rps": True, "mean_ms": False, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+
+
+def compare(base: Dict, head: Dict, threshold_pct: float) -> Tuple[List[Tuple[str, str, float, float, float]], bool]:
+    """Rows (case, metric, base, head, change %) and whether any metric regressed past the threshold."""
+    rows, regressed = [], False
+    for case, b in base.get("results", {}).items():
+        h = head.get("results", {}).get(case)
+        if not isinstance(b, dict) or not isinstance(h, dict):
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in b or metric not in h or not b[metric]:
+                continue
+            change = (h[metric] - b[metric]) / b[metric] * 100.0
+            worse = -change if higher_is_better else change
+            regressed |= worse > threshold_pct
+            rows.append((case, metric, b[metric], h[metric], change))
+    return rows, regressed
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base")
+    ap.add_argument("head")
+    ap.add_argument("--threshold", type=float, default=10.0, help="allowed regression, percent")
+    args = ap.parse_args(argv)
+
+    base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+    head = json.loads(Path(args.head).read_text(encoding="utf-8"))
+    for label, r in (("base", base), ("head", head)):
+        meta = r.get("meta", {})
+        print(f"{label}: commit={meta.get('commit', '?')} cpus={meta.get('cpus', '?')} env={meta.get('env', {})}")
+
+    rows, regressed = compare(base, head, args.threshold)
+    print(f"{'case':<32} {'metric':<8} {'base':>10} {'head':>10} {'change':>8}")
+    for case, metric, b, h, change in rows:
+        higher_is_better = METRICS[metric]
+        flag = " !" if (-change if higher_is_better else change) > args.threshold else ""
+        print(f"{case:<32} {metric:<8} {b:>10.3f} {h:>10.3f} {change:>+7.1f}%{flag}")
+    if regressed:
+        print(f"regression above {args.threshold}%", file=sys.stderr)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+End-to-end load test of POST /predict at fixed concurrency levels:
+throughput and p50 / p95 / p99 latency per level.
+
+    python benchmarks/loadgen.py --server uvicorn --concurrency 1 4 16 --duration 20 --out results/load.json
+    python benchmarks/loadgen.py --server gunicorn --concurrency 8 32          # WORKERS, PRELOAD_APP... from env
+    python benchmarks/loadgen.py --url http://127.0.0.1:8000 --concurrency 8   # server already running
+
+Each of the `c` clients sends requests back to back on one keep-alive
+connection (closed loop). A server started here gets PRED_CACHE_SIZE=0
+unless set, so repeated texts do not turn into cache hits.
+Without the real LFS artifacts a synthetic model of the same size is used.
+"""
+from __future__ import annotations
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from common import ROOT, artifacts_available, sample_texts, write_results, write_synthetic_artifacts
+
+
+def start_server(kind: str, port: int, env: Dict[str, str], timeout_s: float) -> subprocess.Popen:
+    if kind == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"]
+        env = dict(env, BIND=f"127.0.0.1:{port}")
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{kind} exited with code {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/ready")  # model loaded and warmed up
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"{kind} not ready after {timeout_s}s")
+
+
+def run_level(host: str, port: int, texts: List[str], concurrency: int, duration_s: float,
+              warmup_s: float) -> Dict[str, float]:
+    """`concurrency` closed-loop clients for warmup + duration seconds; only the measured window counts."""
+    start = time.perf_counter() + warmup_s
+    stop = start + duration_s
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    shed = [0] * concurrency  # 429 / 503 from admission control
+
+    def client(k: int):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        headers = {"Content-Type": "application/json"}
+        i = k
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= stop:
+                break
+            body = json.dumps({"text": texts[i % len(texts)]})
+            i += concurrency
+            try:
+                conn.request("POST", "/predict", body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                status = resp.status
+                retry_after = float(resp.getheader("Retry-After") or 0)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                status = 0
+            if t0 >= start:
+                if status == 200:
+                    latencies[k].append((time.perf_counter() - t0) * 1000.0)
+                elif status in (429, 503):
+                    shed[k] += 1
+                else:
+                    errors[k] += 1
+            if status in (429, 503):
+                # Back off as told, like a well-behaved client (no busy retry loop)
+                time.sleep(max(0.0, min(retry_after, stop - time.perf_counter())))
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(k,), daemon=True) for k in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    lat = np.array([v for per_client in latencies for v in per_client])
+    if not len(lat):
+        return {"requests": 0, "errors": int(sum(errors)), "shed": int(sum(shed)), "rps": 0.0}
+    return {
+        "requests": int(len(lat)),
+        "errors": int(sum(errors)),
+        "shed": int(sum(shed)),
+        "rps": float(len(lat) / duration_s),
+        "mean_ms": float(lat.mean()),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="", help="target an already running server")
+    ap.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--duration", type=float, default=15, help="measured seconds per level")
+    ap.add_argument("--warmup", type=float, default=3, help="unmeasured seconds per level")
+    ap.add_argument("--texts", type=int, default=20000, help="distinct request texts")
+    ap.add_argument("--timeout", type=float, default=300, help="server startup timeout")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="2")
+    env.setdefault("PRED_CACHE_SIZE", "0")
+    kind = "real"
+    tok_path: Optional[Path] = ROOT / "app" / "artifacts" / "tokenizer.json"
+    if not artifacts_available():
+        tmp = tempfile.mkdtemp()
+        paths = write_synthetic_artifacts(Path(tmp))
+        env.update(MODEL_PATH=str(paths["model"]), TOKENIZER_PATH=str(paths["tokenizer"]))
+        tok_path, kind = paths["tokenizer"], "synthetic"
+    texts = sample_texts(args.texts, tok_path)
+
+    proc = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port, kind = parts.hostname, parts.port or 80, "external"
+    else:
+        host, port = "127.0.0.1", args.port
+        proc = start_server(args.server, port, env, args.timeout)
+
+    rows: Dict[str, Dict[str, float]] = {}
+    try:
+        print(f"{'concurrency':>11} {'rps':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'errors':>7} {'shed':>7}")
+        for c in args.concurrency:
+            r = run_level(host, port, texts, c, args.duration, args.warmup)
+            rows[f"c={c}"] = r
+            print(f"{c:>11} {r['rps']:>8.1f} {r.get('p50_ms', 0):>9.2f} {r.get('p95_ms', 0):>9.2f} "
+                  f"{r.get('p99_ms', 0):>9.2f} {r['errors']:>7} {r['shed']:>7}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(30)
+
+    if args.out:
+        write_results(args.out, {"benchmark": "load", "model": kind,
+                                 "server": "external" if args.url else args.server, "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,37 @@
-workers = 2
+import gc
+import os
+import time
+
+workers = int(os.getenv("WORKERS", 2))
 worker_class = "uvicorn.workers.UvicornWorker"
-timeout = 90
-bind = "0.0.0.0:8000"
+# Kept above REQUEST_DEADLINE_MS: overloaded workers shed requests (429 / 503,
+# app/admission.py) long before gunicorn would kill them
+timeout = int(os.getenv("TIMEOUT", 90))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Workers split the cores between them (see app.inference.INFERENCE_THREADS)
+os.environ.setdefault("GUNICORN_WORKERS", str(workers))
+
+# PRELOAD_APP=1: the master imports the app once (Python modules, tokenizer
+# vocabulary) and workers inherit it copy-on-write. TensorFlow / ONNX Runtime
+# are not fork-safe: importing app.main never loads the model, each worker
+# loads and warms it up in the app's startup hook (GET /ready turns 200).
+preload_app = os.getenv("PRELOAD_APP", "0") == "1"
+
+
+def pre_fork(server, worker):
+    # Objects created before fork are moved out of GC tracking so that the
+    # collector does not touch (and copy) the shared pages in every worker
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.boot_t0 = time.monotonic()
+
+
+def post_worker_init(worker):
+    # Parsed by benchmarks/bench_workers.py, with the app's "model ready" line
+    boot_s = time.monotonic() - getattr(worker, "boot_t0", time.monotonic())
+    worker.log.info("worker booted pid=%s boot_s=%.3f", worker.pid, boot_s)
@@ -2,7 +2,7 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import Iterable, Optional, Dict, Tuple
-import os, logging, json
+import os, sys, logging, json
 import numpy as np
 import pandas as pd
 import mlflow
@@ -32,14 +32,26 @@ def silent_transformers():
         pass
 
 # ---------------- Data I/O ----------------
-def pick_or_csv(maybe_df: Optional[pd.DataFrame], csv_path: Path) -> pd.DataFrame:
-    return maybe_df.copy() if isinstance(maybe_df, pd.DataFrame) else pd.read_csv(csv_path)
+def _csv_loader():
+    # Shared with azureml/src/train.py (the job only uploads azureml/src)
+    src = str(Path(__file__).resolve().parents[2] / "azureml" / "src")
+    if src not in sys.path: sys.path.append(src)
+    import csv_loader
+    return csv_loader
+
+def pick_or_csv(maybe_df: Optional[pd.DataFrame], csv_path: Path, text_col="text", label_col="label",
+                sample_n: int = 0, seed: int = 42) -> pd.DataFrame:
+    """df_* défini dans le notebook, sinon les 2 colonnes du CSV (labels int8, échantillon optionnel)."""
+    if isinstance(maybe_df, pd.DataFrame): return maybe_df.copy()
+    return _csv_loader().load_text_label(str(csv_path), text_col, label_col, sample_n=sample_n, seed=seed)
 
 def ensure_cols(df: pd.DataFrame, text_col="text", label_col="label") -> pd.DataFrame:
     return df[[text_col, label_col]].rename(columns={text_col: "text"}).dropna().copy()
 
 def ensure_int_labels(df: pd.DataFrame, label_col="label") -> pd.DataFrame:
-    out = df.copy(); out[label_col] = out[label_col].astype(int); return out
+    out = df.copy()
+    if not pd.api.types.is_integer_dtype(out[label_col]): out[label_col] = out[label_col].astype(int)
+    return out
 
 # ---------------- MLflow (unifiés) ----------------
 def mlflow_setup(mlruns_dir: Path, experiment: str) -> None:
@@ -60,7 +72,7 @@ def log_metrics(d: Dict[str, float]) -> None:
 
 def make_mlflow_safe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
-    int_cols = df.select_dtypes(include=["int", "int32", "int64"]).columns
+    int_cols = df.select_dtypes(include=["int", "int8", "int32", "int64"]).columns
     if len(int_cols) > 0: df[int_cols] = df[int_cols].astype("float64")
     return df
 
@@ -111,3 +123,188 @@ def make_tfds(X, y, batch_size: int, seed: int, training: bool = False):
     ds = tf.data.Dataset.from_tensor_slices((X, y))
     if training: ds = ds.shuffle(min(len(X), 50_000), seed=seed, reshuffle_each_iteration=True)
     return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+# ---------------- Shards sur disque (données > RAM) ----------------
+def iter_encoded(texts, labels, encode, chunk: int = 50_000):
+    """(X, y) par blocs de `chunk` lignes : encode(textes) -> ids paddés (ex. to_seq du notebook)."""
+    texts, labels = list(texts), np.asarray(labels)
+    for i in range(0, len(texts), chunk):
+        yield np.asarray(encode(texts[i:i + chunk]), dtype=np.int32), labels[i:i + chunk]
+
+def write_shards(out_dir: Path, chunks, shard_rows: int = 100_000) -> Dict:
+    """
+    Écrit des blocs (X, y) en shards `.npy` (X int32, y int8) + manifest.json,
+    sans jamais tenir plus d'un shard en mémoire. À faire une fois par split.
+    """
+    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    shards, buf_x, buf_y, n_buf, width = [], [], [], 0, None
+
+    def flush():
+        nonlocal buf_x, buf_y, n_buf
+        if not n_buf: return
+        name = f"shard-{len(shards):05d}"
+        np.save(out_dir / f"{name}.x.npy", np.concatenate(buf_x))
+        np.save(out_dir / f"{name}.y.npy", np.concatenate(buf_y).astype(np.int8))
+        shards.append({"name": name, "rows": n_buf})
+        buf_x, buf_y, n_buf = [], [], 0
+
+    for X, y in chunks:
+        X = np.asarray(X, dtype=np.int32); y = np.asarray(y)
+        width = width or X.shape[1]
+        if X.shape[1] != width: raise ValueError(f"longueur {X.shape[1]} != {width}")
+        start = 0
+        while start < len(X):
+            take = min(shard_rows - n_buf, len(X) - start)
+            buf_x.append(X[start:start + take]); buf_y.append(y[start:start + take])
+            n_buf += take; start += take
+            if n_buf == shard_rows: flush()
+    flush()
+    manifest = {"max_len": width, "rows": sum(s["rows"] for s in shards), "shards": shards}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+def make_sharded_tfds(shard_dir: Path, batch_size: int, seed: int, training: bool = False,
+                      cache=False, block_rows: int = 1024, shuffle_buffer: int = 20_000, cycle_length: int = 4):
+    """
+    tf.data sur les shards de `write_shards`, lus en memory-map (seules les pages
+    touchées sont en RAM). En entraînement : ordre des shards mélangé à chaque epoch,
+    `cycle_length` shards lus en parallèle (interleave), shuffle sur les lignes
+    entrelacées. Prefetch dans tous les cas.
+    `cache=True` garde le tout en RAM après la 1re epoch, `cache="chemin"` sur disque.
+    """
+    import tensorflow as tf
+    shard_dir = Path(shard_dir)
+    manifest = json.loads((shard_dir / "manifest.json").read_text())
+    names = [s["name"] for s in manifest["shards"]]
+    width = manifest["max_len"]
+
+    def blocks(i):
+        name = names[int(i)]
+        X = np.load(shard_dir / f"{name}.x.npy", mmap_mode="r")
+        y = np.load(shard_dir / f"{name}.y.npy", mmap_mode="r")
+        for a in range(0, len(X), block_rows):
+            yield np.array(X[a:a + block_rows]), np.array(y[a:a + block_rows])
+
+    sig = (tf.TensorSpec([None, width], tf.int32), tf.TensorSpec([None], tf.int8))
+    ds = tf.data.Dataset.range(len(names))
+    if training: ds = ds.shuffle(len(names), seed=seed, reshuffle_each_iteration=True)
+    # Évaluation : shards lus un par un, les lignes restent dans l'ordre des fichiers (alignées sur y)
+    ds = ds.interleave(lambda i: tf.data.Dataset.from_generator(blocks, output_signature=sig, args=(i,)),
+                       cycle_length=min(cycle_length, len(names)) if training else 1, block_length=1,
+                       num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    ds = ds.unbatch().apply(tf.data.experimental.assert_cardinality(manifest["rows"]))
+    if cache: ds = ds.cache() if cache is True else ds.cache(str(cache))
+    if training: ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+# ---------------- Embeddings (store memory-mappé) ----------------
+def text_keys(texts: Iterable[str]) -> np.ndarray:
+    """Clé uint64 par texte (blake2b 8 octets du texte exact)."""
+    import hashlib
+    return np.fromiter((int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+                        for t in texts), dtype=np.uint64)
+
+class EmbeddingStore:
+    """
+    Embeddings d'un modèle (`model_id`) persistés dans `root/<model_id>/` :
+    vectors.bin (matrice float16/float32, memory-mappée), keys.bin (hash du texte
+    de chaque ligne), meta.json (lignes validées). Ajouts seulement, un seul
+    écrivain à la fois ; une ligne n'est visible qu'une fois meta.json réécrit,
+    donc un ajout interrompu est ignoré (et tronqué) à la réouverture.
+
+        store = EmbeddingStore(EMB_DIR, "glove-twitter-200:mean", dim=200)
+        idx = store.ensure(train_df["text"], encode)   # encode seulement les textes absents
+        X = store.get(idx)                             # vue sans copie si les lignes se suivent
+    """
+    def __init__(self, root: Path, model_id: str, dim: Optional[int] = None, dtype: Optional[str] = None):
+        import hashlib, re
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)[:60]
+        self.dir = Path(root) / f"{slug}-{hashlib.sha1(model_id.encode()).hexdigest()[:8]}"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.model_id = model_id
+        meta_path = self.dir / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if meta["model_id"] != model_id or (dim and meta["dim"] != dim) or (dtype and meta["dtype"] != np.dtype(dtype).name):
+                raise ValueError(f"{self.dir} contient {meta['model_id']} dim={meta['dim']} {meta['dtype']}")
+            self.dim, self.dtype, self.rows = meta["dim"], np.dtype(meta["dtype"]), meta["rows"]
+        else:
+            if not dim: raise ValueError("dim requis pour créer le store")
+            self.dim, self.dtype, self.rows = int(dim), np.dtype(dtype or "float16"), 0
+            self._write_meta()
+        self._open()
+
+    def _write_meta(self) -> None:
+        tmp = self.dir / "meta.json.tmp"
+        tmp.write_text(json.dumps({"model_id": self.model_id, "dim": self.dim, "dtype": self.dtype.name, "rows": self.rows}))
+        os.replace(tmp, self.dir / "meta.json")
+
+    def _open(self) -> None:
+        """(Re)mappe les lignes validées et reconstruit l'index trié des clés."""
+        if self.rows:
+            self.vectors = np.memmap(self.dir / "vectors.bin", dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+            self.keys = np.fromfile(self.dir / "keys.bin", dtype=np.uint64, count=self.rows)
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=self.dtype)
+            self.keys = np.empty(0, dtype=np.uint64)
+        self._order = np.argsort(self.keys, kind="stable")
+        self._sorted = self.keys[self._order]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def lookup(self, texts: Iterable[str]) -> np.ndarray:
+        """Ligne de chaque texte (-1 si absent)."""
+        keys = text_keys(texts)
+        if not self.rows:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted, keys), self.rows - 1)
+        return np.where(self._sorted[pos] == keys, self._order[pos], -1).astype(np.int64)
+
+    def append(self, texts: Iterable[str], vectors: np.ndarray) -> np.ndarray:
+        """Ajoute les textes absents (doublons du lot compris) ; renvoie la ligne de chaque texte."""
+        texts = list(texts); vectors = np.asarray(vectors)
+        if vectors.shape != (len(texts), self.dim):
+            raise ValueError(f"vecteurs {vectors.shape}, attendu ({len(texts)}, {self.dim})")
+        keys = text_keys(texts)
+        idx = self.lookup(texts)
+        new = np.flatnonzero(idx < 0)
+        _, first = np.unique(keys[new], return_index=True)
+        new = new[np.sort(first)]
+        if len(new):
+            itemsize = self.dtype.itemsize * self.dim
+            for name, data, size in (("vectors.bin", vectors[new].astype(self.dtype), itemsize), ("keys.bin", keys[new], 8)):
+                with open(self.dir / name, "ab") as f:
+                    f.truncate(self.rows * size)  # reste d'un ajout interrompu
+                    f.write(np.ascontiguousarray(data).tobytes()); f.flush(); os.fsync(f.fileno())
+            self.rows += len(new)
+            self._write_meta()
+            self._open()
+        return self.lookup(texts)
+
+    def ensure(self, texts: Iterable[str], encode, batch_size: int = 1024) -> np.ndarray:
+        """Lignes de `texts` ; `encode(liste de textes) -> (n, dim)` n'est appelé que sur les textes absents."""
+        texts = [str(t) for t in texts]
+        idx = self.lookup(texts)
+        missing = list(dict.fromkeys(texts[i] for i in np.flatnonzero(idx < 0)))
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            self.append(batch, encode(batch))
+        return self.lookup(texts) if missing else idx
+
+    def get(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Vecteurs des lignes `idx` : vue sur le memmap si elles se suivent, sinon copie des seules lignes lues.
+        KeyError si `idx` contient -1 (texte absent selon `lookup`) : jamais le vecteur d'un autre texte.
+        """
+        idx = np.asarray(idx)
+        if len(idx) and idx.min() < 0:
+            raise KeyError(f"{int(np.sum(idx < 0))} ligne(s) absente(s) (-1 de lookup) : appeler ensure() d'abord")
+        if len(idx) and idx[0] >= 0 and np.array_equal(idx, np.arange(idx[0], idx[0] + len(idx))):
+            return self.vectors[idx[0]:idx[0] + len(idx)]
+        return self.vectors[idx]
+
+    def iter_batches(self, idx: np.ndarray, batch_size: int = 1024):
+        """Vecteurs par lots (chargement paresseux d'un jeu plus grand que la RAM)."""
+        for i in range(0, len(idx), batch_size):
+            yield self.get(idx[i:i + batch_size])
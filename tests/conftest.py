@@ -78,8 +78,8 @@ def fake_model_class():
         def __init__(self, value=0.8):
             self.value = value
         def predict(self, x, verbose=0):
-            # IMPORTANT: return a NumPy array, not a list
-            return np.array([[self.value]], dtype=float)
+            # IMPORTANT: return a NumPy array, not a list (one row per input)
+            return np.full((len(x), 1), self.value, dtype=float)
     return FakeModel
 
 
@@ -96,4 +96,5 @@ def import_inference_with_mocks(monkeypatch, project_root, ensure_artifacts, fak
         sys.path.insert(0, str(root))
     import app.inference as inference
     inference = importlib.reload(inference)
+    inference.load_model()  # never loaded at import (see startup())
     return inference
@@ -0,0 +1,61 @@
+# test_admission.py
+import asyncio
+import time
+
+import pytest
+
+from app.admission import AdmissionController, Rejected
+
+
+def test_cap_queue_and_fifo_handover():
+    events = []
+
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=2,
+                                  on_change=lambda running, queued, rejected: events.append((running, queued, rejected)))
+        far = time.monotonic() + 5
+        await ctl.acquire(far)
+        order = []
+
+        async def waiter(name):
+            await ctl.acquire(far)
+            order.append(name)
+            ctl.release()
+
+        tasks = [asyncio.create_task(waiter(n)) for n in ("a", "b")]
+        await asyncio.sleep(0)
+        assert ctl.stats()["queued"] == 2
+        with pytest.raises(Rejected) as e:
+            await ctl.acquire(far)
+        assert e.value.status == 429 and e.value.retry_after_s == 1
+
+        ctl.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b"]
+        return ctl.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+    assert stats["admitted"] == 3 and stats["admitted_after_wait"] == 2 and stats["rejected_queue_full"] == 1
+    assert (1, 2, "queue_full") in events and events[-1] == (0, 0, None)
+
+
+def test_expired_waiter_leaves_the_queue():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=4, retry_after_s=3)
+        await ctl.acquire(time.monotonic() + 5)
+        with pytest.raises(Rejected) as e:
+            await ctl.acquire(time.monotonic() + 0.02)
+        assert e.value.status == 503 and e.value.retry_after_s == 3
+        with pytest.raises(Rejected):
+            await ctl.acquire(time.monotonic() - 1)  # already expired: not queued at all
+        assert ctl.stats()["queued"] == 0
+
+        # The slot is not handed to the abandoned waiter
+        ctl.release()
+        assert ctl.in_flight == 0
+        await ctl.acquire(time.monotonic() + 5)
+        return ctl.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected_deadline"] == 2 and stats["in_flight"] == 1
@@ -0,0 +1,92 @@
+# test_backends.py
+import numpy as np
+import pytest
+
+from app.backends import (
+    LengthBucketedForward, TFFunctionBackend, make_backend, parse_buckets, pick_length_bucket,
+    variable_length_model,
+)
+
+
+@pytest.fixture
+def tiny_model():
+    from tensorflow import keras
+    keras.utils.set_random_seed(0)
+    inp = keras.Input(shape=(8,), dtype="int32")
+    x = keras.layers.Embedding(20, 4)(inp)
+    x = keras.layers.GlobalAveragePooling1D()(x)
+    out = keras.layers.Dense(1, activation="sigmoid")(x)
+    return keras.Model(inp, out)
+
+
+def test_parse_buckets():
+    assert parse_buckets("16, 1,4,4") == (1, 4, 16)
+
+
+def test_keras_backend_is_plain_predict(tiny_model):
+    assert make_backend("keras", tiny_model, 8) is None
+    with pytest.raises(ValueError):
+        make_backend("nope", tiny_model, 8)
+
+
+def test_tf_function_matches_model_predict(tiny_model):
+    backend = TFFunctionBackend(tiny_model, 8, batch_buckets=(1, 4))
+    backend.warmup()
+    x = np.random.default_rng(0).integers(0, 20, size=(11, 8)).astype(np.int32)
+
+    expected = tiny_model.predict(x, verbose=0).reshape(-1)
+    got = backend.predict(x)
+    assert got.shape == (11,)
+    np.testing.assert_allclose(got, expected, rtol=1e-5, atol=1e-6)
+    # Single row uses the 1-bucket, never a retrace
+    np.testing.assert_allclose(backend.predict(x[:1]), expected[:1], rtol=1e-5, atol=1e-6)
+
+
+@pytest.fixture
+def masked_lstm_model():
+    from tensorflow import keras
+    keras.utils.set_random_seed(0)
+    inp = keras.Input(shape=(12,), dtype="int32")
+    x = keras.layers.Embedding(20, 4, mask_zero=True)(inp)
+    x = keras.layers.LSTM(3)(x)
+    out = keras.layers.Dense(1, activation="sigmoid")(x)
+    return keras.Model(inp, out)
+
+
+def _post_padded(lengths, width=12, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.zeros((len(lengths), width), dtype=np.int32)
+    for i, n in enumerate(lengths):
+        x[i, :n] = rng.integers(1, 20, size=n)
+    return x
+
+
+def test_pick_length_bucket():
+    x = _post_padded([2, 5])
+    assert pick_length_bucket(x, (4, 8, 12)) == 8
+    assert pick_length_bucket(x[:1], (4, 8, 12)) == 4
+    assert pick_length_bucket(np.zeros((1, 12), dtype=np.int32), (4, 8, 12)) == 4
+
+
+def test_variable_length_model_shares_weights(masked_lstm_model):
+    twin = variable_length_model(masked_lstm_model)
+    assert twin.weights[0] is masked_lstm_model.weights[0]
+    assert twin(np.ones((1, 3), dtype=np.int32)).shape == (1, 1)
+
+
+def test_length_buckets_match_full_length_on_masked_model(masked_lstm_model):
+    x = _post_padded([1, 3, 4, 7, 12, 0])
+    expected = masked_lstm_model.predict(x, verbose=0).reshape(-1)
+
+    backend = TFFunctionBackend(masked_lstm_model, 12, batch_buckets=(1, 8), length_buckets=(4, 8))
+    backend.warmup()
+    bucketed = LengthBucketedForward(backend.predict, (4, 8), 12)
+
+    np.testing.assert_allclose(bucketed(x), expected, rtol=1e-5, atol=1e-6)
+    for row in range(len(x)):  # batches of one row use their own (short) bucket
+        np.testing.assert_allclose(bucketed(x[row:row + 1]), expected[row:row + 1], rtol=1e-5, atol=1e-6)
+
+
+def test_exported_backends_reject_length_buckets():
+    with pytest.raises(ValueError, match="LENGTH_BUCKETS"):
+        make_backend("onnx", None, 8, model_path="unused.onnx", length_buckets=(4,))
@@ -0,0 +1,120 @@
+# test_batching.py
+import threading
+
+import numpy as np
+import pytest
+
+from app.batching import MicroBatcher
+
+
+def _row_sum(x):
+    # One output per row so each caller can check it got its own result
+    return x.sum(axis=1).astype(float)
+
+
+def test_single_submit_flushes_after_max_wait():
+    b = MicroBatcher(_row_sum, max_batch_size=8, max_wait_ms=1)
+    try:
+        assert b.submit(np.array([1, 2, 3])).result(timeout=5) == 6.0
+        assert b.batches == 1 and b.items == 1
+    finally:
+        b.close()
+
+
+def test_concurrent_submits_are_grouped_and_routed_back():
+    calls = []
+
+    def forward(x):
+        calls.append(len(x))
+        return _row_sum(x)
+
+    b = MicroBatcher(forward, max_batch_size=4, max_wait_ms=200)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = b.submit(np.array([i, i])).result(timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    b.close()
+
+    assert results == {i: 2.0 * i for i in range(8)}
+    assert max(calls) <= 4
+    assert len(calls) < 8
+
+
+def test_forward_error_is_propagated_to_callers():
+    def boom(x):
+        raise RuntimeError("model down")
+
+    b = MicroBatcher(boom, max_batch_size=2, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError, match="model down"):
+            b.submit(np.zeros(3)).result(timeout=5)
+    finally:
+        b.close()
+
+
+def test_predict_one_goes_through_batcher(import_inference_with_mocks):
+    inference = import_inference_with_mocks
+    batcher = inference.registry.active.batcher
+    assert batcher is not None
+
+    res = inference.predict_one("hello")
+    assert np.isclose(res["proba_pos"], 0.8, atol=1e-6)
+    assert batcher.items >= 1
+
+
+def test_on_wait_receives_queue_time_per_row():
+    waits = []
+    b = MicroBatcher(_row_sum, max_batch_size=8, max_wait_ms=20, on_wait=waits.append)
+    try:
+        b.submit(np.array([1])).result(timeout=5)
+        assert len(waits) == 1 and waits[0] >= 0.0
+    finally:
+        b.close()
+
+
+def test_failing_on_wait_does_not_kill_the_worker():
+    def on_wait(seconds):
+        raise ValueError("metrics backend down")
+
+    b = MicroBatcher(_row_sum, max_batch_size=4, max_wait_ms=1, on_wait=on_wait)
+    try:
+        assert b.submit(np.array([1, 2])).result(timeout=5) == 3.0
+        assert b.submit(np.array([3, 4])).result(timeout=5) == 7.0
+    finally:
+        b.close()
+
+
+def test_timed_out_row_is_skipped(import_inference_with_mocks):
+    import time
+    inference = import_inference_with_mocks
+    gate = threading.Event()
+    seen = []
+
+    def forward(x):
+        gate.wait(5)
+        seen.append(len(x))
+        return _row_sum(x)
+
+    b = MicroBatcher(forward, max_batch_size=1, max_wait_ms=0)
+    try:
+        b.submit(np.array([1]))  # holds the worker in forward
+        served = inference.registry.active
+        served_batcher, served.batcher = served.batcher, b
+        try:
+            with pytest.raises(TimeoutError):
+                inference._score_row(served, np.array([[2]]), None, time.monotonic() + 0.05)
+        finally:
+            served.batcher = served_batcher
+        gate.set()
+        assert b.submit(np.array([5])).result(timeout=5) == 5.0
+        assert seen == [1, 1]  # the cancelled row never reached the model
+    finally:
+        b.close()
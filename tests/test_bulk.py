@@ -0,0 +1,125 @@
+# test_bulk.py
+import csv
+import json
+
+import pytest
+
+
+def _write_csv(path, rows):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text", "label"])
+        w.writerows(rows)
+
+
+def _read_parts(out):
+    rows = []
+    for part in sorted(out.glob("part-*.csv")):
+        with part.open(newline="", encoding="utf-8") as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+
+@pytest.fixture
+def hello_model(import_inference_with_mocks):
+    inference = import_inference_with_mocks
+
+    class HelloModel:
+        calls = 0
+        def predict(self, x, verbose=0):
+            HelloModel.calls += 1
+            # "hello" is token 1 in the test tokenizer -> positive
+            return (x[:, :1] == 1).astype(float) * 0.9 + 0.05
+
+    inference.install_model(HelloModel())
+    return HelloModel
+
+
+def test_score_file_in_chunks(tmp_path, hello_model):
+    from app import bulk
+
+    src = tmp_path / "in.csv"
+    _write_csv(src, [(i, "hello" if i % 2 else "bye", 0) for i in range(5)])
+    out = tmp_path / "scores"
+
+    summary = bulk.score_file(str(src), str(out), keep_cols=["id"], chunk_size=2, processes=0, log=lambda m: None)
+
+    assert summary["rows"] == 5 and summary["chunks"] == 3
+    rows = _read_parts(out)
+    assert [r["id"] for r in rows] == ["0", "1", "2", "3", "4"]
+    assert [r["sentiment"] for r in rows] == ["neg", "pos", "neg", "pos", "neg"]
+    assert set(rows[0]) == {"id", "sentiment", "proba_pos"}
+    manifest = json.loads((out / "manifest.json").read_text())
+    assert manifest["complete"] and manifest["done"] == {"0": 2, "1": 2, "2": 1}
+
+
+def test_score_file_resumes_missing_chunks(tmp_path, hello_model):
+    from app import bulk
+
+    src = tmp_path / "in.csv"
+    _write_csv(src, [(i, "hello", 1) for i in range(6)])
+    out = tmp_path / "scores"
+    bulk.score_file(str(src), str(out), chunk_size=2, processes=0, log=lambda m: None)
+
+    # Simulate a run interrupted before chunk 1 was written
+    manifest = json.loads((out / "manifest.json").read_text())
+    del manifest["done"]["1"]
+    manifest["rows"] -= 2
+    (out / "manifest.json").write_text(json.dumps(manifest))
+    (out / "part-000001.csv").unlink()
+    hello_model.calls = 0
+
+    summary = bulk.score_file(str(src), str(out), chunk_size=2, processes=0, log=lambda m: None)
+
+    assert hello_model.calls == 1
+    assert summary["rows_this_run"] == 2 and summary["rows"] == 6
+    assert len(_read_parts(out)) == 6
+
+
+def test_score_file_rejects_other_settings(tmp_path, hello_model):
+    from app import bulk
+
+    src = tmp_path / "in.csv"
+    _write_csv(src, [(0, "hello", 1)])
+    out = tmp_path / "scores"
+    bulk.score_file(str(src), str(out), chunk_size=2, processes=0, log=lambda m: None)
+
+    with pytest.raises(ValueError, match="chunk_size"):
+        bulk.score_file(str(src), str(out), chunk_size=3, processes=0, log=lambda m: None)
+    with pytest.raises(ValueError, match="not in"):
+        bulk.score_file(str(src), str(tmp_path / "other"), text_col="tweet", processes=0, log=lambda m: None)
+
+
+def test_score_file_rejects_another_model(tmp_path, hello_model, monkeypatch):
+    from app import bulk, inference
+
+    model_file = tmp_path / "model.keras"
+    model_file.write_bytes(b"v1")
+    monkeypatch.setattr(inference, "MODEL_PATH", model_file)
+    src = tmp_path / "in.csv"
+    _write_csv(src, [(0, "hello", 1), (1, "bye", 0), (2, "hello", 1)])
+    out = tmp_path / "scores"
+    bulk.score_file(str(src), str(out), chunk_size=2, processes=0, log=lambda m: None)
+    manifest = json.loads((out / "manifest.json").read_text())
+    assert manifest["model_version"] == inference.registry.active.version
+    assert manifest["model"]["bytes"] == 2
+
+    model_file.write_bytes(b"v2 retrained")  # same MODEL_VERSION label, other weights
+    with pytest.raises(ValueError, match="model"):
+        bulk.score_file(str(src), str(out), chunk_size=2, processes=0, log=lambda m: None)
+
+
+def test_parquet_roundtrip(tmp_path, hello_model):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    from app import bulk
+
+    src = tmp_path / "in.parquet"
+    pq.write_table(pa.table({"id": [1, 2, 3], "text": ["hello", None, "bye"]}), src)
+    out = tmp_path / "scores"
+
+    bulk.score_file(str(src), str(out), keep_cols=["id"], chunk_size=2, processes=0, fmt="parquet", log=lambda m: None)
+
+    table = pq.read_table(sorted(out.glob("part-*.parquet"))[0])
+    assert table.column("id").to_pylist() == [1, 2]
+    assert table.column("sentiment").to_pylist() == ["pos", "neg"]
@@ -0,0 +1,40 @@
+# test_cache.py
+import numpy as np
+
+from app.cache import PredictionCache
+
+
+def test_lru_eviction_and_counters():
+    c = PredictionCache(max_size=2)
+    k1, k2, k3 = (PredictionCache.key(np.array([i, 0, 0])) for i in (1, 2, 3))
+    c.put(k1, 0.1, "v1")
+    c.put(k2, 0.2, "v1")
+    assert c.get(k1, "v1") == 0.1      # k1 becomes most recent
+    c.put(k3, 0.3, "v1")               # evicts k2
+    assert c.get(k2, "v1") is None
+    assert c.get(k3, "v1") == 0.3
+
+    st = c.stats()
+    assert (st["hits"], st["misses"], st["evictions"], st["size"]) == (2, 1, 1, 2)
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    c = PredictionCache(max_size=10, ttl_s=5)
+    k = PredictionCache.key(np.array([1, 2]))
+    c.put(k, 0.9, "v1")
+    now[0] += 4
+    assert c.get(k, "v1") == 0.9
+    now[0] += 2
+    assert c.get(k, "v1") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_model_version_change_invalidates():
+    c = PredictionCache(max_size=10)
+    k = PredictionCache.key(np.array([1, 2]))
+    c.put(k, 0.9, "v1")
+    assert c.get(k, "v2") is None
+    assert c.stats()["invalidations"] == 1
+    assert c.stats()["size"] == 0
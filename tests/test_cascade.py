@@ -0,0 +1,47 @@
+# test_cascade.py
+import numpy as np
+
+from app.cascade import FirstStage, calibrate, hashed_features, sweep
+
+POS = ["love it", "great day", "so happy", "best ever", "awesome fun"]
+NEG = ["hate it", "awful day", "so sad", "worst ever", "terrible pain"]
+
+
+def corpus(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, size=n)
+    texts = [f"{(POS if label else NEG)[rng.integers(5)]} {rng.choice(['today', 'really', 'lol'])}" for label in y]
+    return texts, y
+
+
+def test_hashed_features_are_stable_and_in_range():
+    a = hashed_features("Love it love IT!", 1024)
+    assert set(a.tolist()) == set(hashed_features("love it love it !", 1024).tolist())
+    assert a.min() >= 0 and a.max() < 1024 and len(a) == len(set(a.tolist()))
+    assert len(hashed_features("", 1024)) == 0
+
+
+def test_first_stage_learns_and_round_trips(tmp_path):
+    texts, y = corpus()
+    first = FirstStage.train(texts, y, n_features=1 << 12, epochs=5, batch_size=32, log=lambda _: None)
+    assert np.mean((first.predict_proba(texts) >= 0.5) == y) > 0.95
+    first.threshold = 0.8
+    again = FirstStage.load(first.save(tmp_path / "cascade.npz"))
+    assert again.version == "cascade:cascade" and again.stats()["version"] == "cascade:cascade"
+    np.testing.assert_allclose(again.predict_proba(texts[:20]), first.predict_proba(texts[:20]), rtol=1e-6)
+    assert again.threshold == 0.8 and FirstStage.load(tmp_path / "cascade.npz", threshold=0.9).threshold == 0.9
+
+    p, ok = again.split(["love it today", "zzz unknown"])
+    assert ok.tolist() == [True, False] and p[0] > 0.8
+    assert again.stats()["answered"] == 1 and again.stats()["offload_rate"] == 0.5
+
+
+def test_sweep_and_calibrate():
+    y = np.array([1, 0, 1, 0])
+    p_first = np.array([0.99, 0.02, 0.6, 0.7])  # confident rows right, unsure ones wrong
+    p_model = np.array([0.9, 0.1, 0.8, 0.2])
+    rows = sweep(p_first, p_model, y, thresholds=[0.5, 0.7, 0.95])
+    assert [r["offload"] for r in rows] == [1.0, 0.75, 0.5]
+    assert [r["accuracy_loss"] for r in rows] == [0.25, 0.25, 0.0]
+    assert calibrate(rows, max_loss=0.0)["threshold"] == 0.95
+    assert calibrate(rows, max_loss=0.3)["threshold"] == 0.5
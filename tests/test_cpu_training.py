@@ -0,0 +1,46 @@
+# test_cpu_training.py
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "azureml" / "src"))
+from cpu_training import LengthGroupedBatchSampler  # noqa: E402
+
+
+@pytest.fixture
+def lengths():
+    return np.random.default_rng(0).choice([4, 7, 12, 30, 128], size=1000)
+
+
+def test_length_batches_respect_token_budget_and_cover_every_row(lengths):
+    s = LengthGroupedBatchSampler(lengths, max_tokens=512, max_batch=64)
+    batches = s.batches()
+    assert len(batches) == len(s)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(1000))
+    for b in batches:
+        assert len(b) <= 64
+        assert len(b) * lengths[b].max() <= 512 or len(b) == 1
+    assert s.batch_size is None  # variable-size batches
+    assert s.last_stats["padding_ratio"] < 0.05
+
+
+def test_epochs_reshuffle_with_stable_length(lengths):
+    s = LengthGroupedBatchSampler(lengths, max_tokens=512)
+    first, second = list(s), list(s)
+    assert len(first) == len(second) == len(s)
+    assert first != second
+    again = LengthGroupedBatchSampler(lengths, max_tokens=512)
+    assert list(again) == first  # seeded
+
+
+def test_random_batches_report_padding(lengths):
+    s = LengthGroupedBatchSampler(lengths, batch_size=16, group_by_length=False)
+    batches = list(s)
+    assert len(batches) == len(s) == 63
+    assert all(len(b) == 16 for b in batches[:-1])
+    assert s.last_stats["padding_ratio"] > 0.3
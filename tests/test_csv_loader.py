@@ -0,0 +1,51 @@
+# test_csv_loader.py
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "azureml" / "src"))
+import csv_loader  # noqa: E402
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    rows = ["id,text,label,extra"]
+    rows += [f"{i},tweet number {i},{i % 2},x" for i in range(500)]
+    rows += ["500,,1,x", "501,no label,,x"]  # dropped
+    path = tmp_path / "split.csv"
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def engine(request, monkeypatch):
+    if request.param == "pandas":
+        monkeypatch.setattr(csv_loader, "_pyarrow", lambda: None)
+    elif csv_loader._pyarrow() is None:
+        pytest.skip("pyarrow not installed")
+    return request.param
+
+
+def test_reads_two_columns_with_int8_labels(csv_path, engine):
+    df = csv_loader.load_text_label(csv_path, "text", "label")
+    assert list(df.columns) == ["text", "label"]
+    assert len(df) == 500
+    assert df["label"].dtype == np.int8
+    assert df["text"].iloc[3] == "tweet number 3"
+
+
+def test_sample_is_seeded_and_independent_of_block_size(csv_path, engine, monkeypatch):
+    a = csv_loader.load_text_label(csv_path, sample_n=50, seed=7)
+    monkeypatch.setattr(csv_loader, "BLOCK_BYTES", 256)
+    monkeypatch.setattr(csv_loader, "CHUNK_ROWS", 16)
+    b = csv_loader.load_text_label(csv_path, sample_n=50, seed=7)
+    c = csv_loader.load_text_label(csv_path, sample_n=50, seed=8)
+    assert len(a) == 50 and a["text"].is_unique
+    assert a["text"].tolist() == b["text"].tolist()
+    assert a["text"].tolist() != c["text"].tolist()
+    # Larger than the file: every row
+    assert len(csv_loader.load_text_label(csv_path, sample_n=10_000)) == 500
@@ -0,0 +1,44 @@
+# test_dataset_cache.py
+import sys
+from pathlib import Path
+
+import pytest
+
+datasets = pytest.importorskip("datasets")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "azureml" / "src"))
+from dataset_cache import cached_dataset  # noqa: E402
+
+
+def _build(rows):
+    return lambda: datasets.Dataset.from_dict({"x": rows})
+
+
+def test_miss_then_hit(tmp_path):
+    ds, info = cached_dataset(str(tmp_path), "k", {}, _build([1, 2]))
+    assert not info["hit"] and ds["x"] == [1, 2]
+    ds, info = cached_dataset(str(tmp_path), "k", {}, _build([9]))
+    assert info["hit"] and ds["x"] == [1, 2]
+
+
+def test_concurrent_miss_keeps_the_published_entry(tmp_path):
+    published = []
+
+    def slow_build():
+        # Another job publishes the same key while this one is building
+        published.append(cached_dataset(str(tmp_path), "k", {}, _build([1, 2]))[0])
+        return datasets.Dataset.from_dict({"x": [3]})
+
+    ds, info = cached_dataset(str(tmp_path), "k", {}, slow_build)
+    assert not info["hit"] and ds["x"] == [3]
+    assert published[0]["x"] == [1, 2]  # still readable: its files were not removed
+    assert cached_dataset(str(tmp_path), "k", {}, _build([9]))[0]["x"] == [1, 2]
+    assert [p.name for p in tmp_path.iterdir()] == ["k"]  # the loser's tmp copy is gone
+
+
+def test_entry_that_fails_to_load_is_rebuilt(tmp_path):
+    (tmp_path / "k").mkdir()
+    (tmp_path / "k" / "build.json").write_text("{}")  # no Arrow files
+    ds, info = cached_dataset(str(tmp_path), "k", {}, _build([5]))
+    assert not info["hit"] and ds["x"] == [5]
+    assert cached_dataset(str(tmp_path), "k", {}, _build([9]))[0]["x"] == [5]
@@ -0,0 +1,42 @@
+# test_distill.py
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("pandas")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "azureml" / "src"))
+import distill  # noqa: E402
+
+
+def _bce(y, p):
+    return -(y * np.log(p) + (1 - y) * np.log(1 - p))
+
+
+def test_distillation_loss_blends_hard_and_soft_targets():
+    y = tf.constant([[1.0, 0.9], [0.0, 0.2]])
+    p = tf.constant([[0.8], [0.3]])
+    hard_only = distill.distillation_loss(alpha=0.0, temperature=2.0)(y, p).numpy()
+    np.testing.assert_allclose(hard_only, _bce(np.array([1.0, 0.0]), np.array([0.8, 0.3])), rtol=1e-5)
+    # T = 1: the soft term is the plain BCE against the teacher probability
+    soft_only = distill.distillation_loss(alpha=1.0, temperature=1.0)(y, p).numpy()
+    np.testing.assert_allclose(soft_only, _bce(np.array([0.9, 0.2]), np.array([0.8, 0.3])), rtol=1e-4)
+
+
+def test_student_matches_the_serving_contract():
+    m = distill.build_student(vocab_size=100, max_len=80)
+    assert m.input_shape == (None, 80)
+    assert m.output_shape == (None, 1)
+
+
+def test_teacher_digest_changes_with_the_weights(tmp_path):
+    (tmp_path / "model.safetensors").write_bytes(b"a")
+    (tmp_path / "config.json").write_text("{}")
+    before = distill.teacher_digest(tmp_path)
+    (tmp_path / "config.json").write_text('{"x": 1}')
+    assert distill.teacher_digest(tmp_path) == before
+    (tmp_path / "model.safetensors").write_bytes(b"b")
+    assert distill.teacher_digest(tmp_path) != before
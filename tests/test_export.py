@@ -0,0 +1,41 @@
+# test_export.py
+import numpy as np
+import pytest
+
+from app.backends import OnnxBackend, TFLiteBackend
+from app.export import export_onnx, export_tflite, parity_report
+
+
+@pytest.fixture(scope="module")
+def lstm_model():
+    from tensorflow import keras
+    keras.utils.set_random_seed(0)
+    inp = keras.Input(shape=(12,), dtype="int32")
+    x = keras.layers.Embedding(50, 8)(inp)
+    x = keras.layers.Bidirectional(keras.layers.LSTM(4))(x)
+    out = keras.layers.Dense(1, activation="sigmoid")(x)
+    return keras.Model(inp, out)
+
+
+@pytest.fixture(scope="module")
+def reference_x():
+    return np.random.default_rng(0).integers(0, 50, size=(40, 12)).astype(np.int32)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_tflite_export_parity(tmp_path, lstm_model, reference_x, quantize):
+    pytest.importorskip("ai_edge_litert")
+    out = export_tflite(lstm_model, tmp_path / "m.tflite", 12, quantize=quantize)
+    report = parity_report(lstm_model, TFLiteBackend(str(out), 12), reference_x, batch_size=16)
+    assert report["max_abs_diff"] < (0.02 if quantize else 1e-5)
+    assert report["label_agreement"] >= 0.95
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_onnx_export_parity(tmp_path, lstm_model, reference_x, quantize):
+    pytest.importorskip("tf2onnx")
+    pytest.importorskip("onnxruntime")
+    out = export_onnx(lstm_model, tmp_path / "m.onnx", 12, quantize=quantize)
+    report = parity_report(lstm_model, OnnxBackend(str(out), 12), reference_x, batch_size=16)
+    assert report["max_abs_diff"] < (0.02 if quantize else 1e-5)
+    assert report["label_agreement"] >= 0.95
@@ -0,0 +1,81 @@
+# test_feedback_store.py
+import csv
+import time
+
+from app.feedback_store import FeedbackStore, export_csv, feedback_label, iter_records
+
+
+def rec(text, predicted, correct):
+    return {"text": text, "predicted": predicted, "correct": correct, "label": feedback_label(predicted, correct)}
+
+
+def test_feedback_label():
+    assert feedback_label("pos", True) == 1 and feedback_label("pos", False) == 0
+    assert feedback_label("neg", True) == 0 and feedback_label("neg", False) == 1
+    assert feedback_label("maybe", True) is None
+
+
+def test_group_commit_rotates_segments(tmp_path):
+    store = FeedbackStore(str(tmp_path), max_segment_bytes=400, commit_interval_ms=5)
+    for group in range(5):
+        for i in range(10):
+            assert store.append(rec(f"tweet {group * 10 + i}", "pos", True))
+        while store.stats()["written"] < (group + 1) * 10:
+            time.sleep(0.001)
+    store.close()
+    stats = store.stats()
+    assert stats["written"] == 50 and stats["dropped"] == 0 and stats["queue_depth"] == 0
+    assert 5 <= stats["commits"] < 50  # one fsync per group, not per record
+    # Each group (> 400 bytes) goes to a new segment
+    segments = sorted(tmp_path.glob("feedback-*.jsonl"))
+    assert len(segments) == stats["segments"] == stats["commits"]
+    assert [r["text"] for r in iter_records(str(tmp_path))] == [f"tweet {i}" for i in range(50)]
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path, monkeypatch):
+    store = FeedbackStore(str(tmp_path), max_queue=2)
+    monkeypatch.setattr(store, "_ensure_started", lambda: True)  # writer never drains
+    assert [store.append(rec("t", "pos", True)) for _ in range(3)] == [True, True, False]
+    assert store.stats()["dropped"] == 1
+
+
+def test_close_returns_with_full_queue_on_a_stalled_disk(tmp_path, monkeypatch):
+    import threading
+    release = threading.Event()
+    store = FeedbackStore(str(tmp_path), max_queue=2, batch_size=1, commit_interval_ms=0)
+    monkeypatch.setattr(store, "_commit", lambda batch: release.wait(10))
+    for _ in range(5):
+        store.append(rec("t", "pos", True))
+    t0 = time.monotonic()
+    store.close(timeout=0.2)
+    assert time.monotonic() - t0 < 2
+    release.set()
+
+
+def test_append_after_close_is_refused(tmp_path):
+    store = FeedbackStore(str(tmp_path), commit_interval_ms=0)
+    assert store.append(rec("before", "pos", True))
+    store.close()
+    assert not store.append(rec("after", "pos", True))
+    store.close()
+    assert store._thread is None  # no writer restarted
+    assert [r["text"] for r in iter_records(str(tmp_path))] == ["before"]
+    assert store.stats()["dropped"] == 1
+
+
+def test_export_dedupes_with_majority_label(tmp_path):
+    store = FeedbackStore(str(tmp_path), fsync=False)
+    for r in [rec("love it", "pos", True), rec(" love it ", "neg", False), rec("love it", "pos", False),
+              rec("meh", "pos", True), rec("meh", "pos", False),  # tie -> dropped
+              rec("awful", "pos", False)]:
+        store.append(r)
+    store.close()
+    with open(next(tmp_path.glob("feedback-*.jsonl")), "ab") as f:
+        f.write(b'{"text": "torn by a cra')  # crash in the middle of a line
+
+    out = tmp_path / "export" / "feedback_train.csv"
+    stats = export_csv(str(tmp_path), str(out))
+    with open(out, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [{"text": "love it", "label": "1"}, {"text": "awful", "label": "0"}]
+    assert stats == {"records": 6, "texts": 3, "rows": 2, "ties_dropped": 1, "positive": 1}
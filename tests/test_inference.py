@@ -1,6 +1,7 @@
 # test_inference.py
 import importlib
 import numpy as np
+import pytest
 
 
 def test_predict_one_positive(import_inference_with_mocks, fake_model_class):
@@ -18,10 +19,151 @@ def test_predict_one_positive(import_inference_with_mocks, fake_model_class):
 def test_predict_one_negative(import_inference_with_mocks, fake_model_class, monkeypatch):
     inference = import_inference_with_mocks
 
-    # Swap the global model for a negative case (0.2 -> "neg")
-    inference.model = fake_model_class(value=0.2)
+    # Serve another model for a negative case (0.2 -> "neg")
+    inference.install_model(fake_model_class(value=0.2))
 
     res = inference.predict_one("Terrible experience.")
     assert res["sentiment"] == "neg"
     assert np.isclose(res["proba_pos"], 0.2, atol=1e-6)
     assert np.isclose(res["proba_neg"], 0.8, atol=1e-6)
+
+
+def test_predict_many_chunks_and_keeps_order(import_inference_with_mocks, monkeypatch):
+    inference = import_inference_with_mocks
+    monkeypatch.setattr(inference, "PREDICT_BATCH_CHUNK", 2)
+
+    class RecordingModel:
+        def __init__(self):
+            self.batch_sizes = []
+        def predict(self, x, verbose=0):
+            self.batch_sizes.append(len(x))
+            # "hello" is token 1 in the test tokenizer -> positive
+            return (x[:, :1] == 1).astype(float) * 0.9 + 0.05
+
+    model = RecordingModel()
+    inference.install_model(model)
+    res = inference.predict_many(["hello", "nothing known", "hello there", "bye", "hello"])
+
+    assert [r["sentiment"] for r in res] == ["pos", "neg", "pos", "neg", "pos"]
+    assert model.batch_sizes == [2, 2, 1]
+    assert inference.predict_many([]) == []
+
+
+def test_cache_hit_skips_model(import_inference_with_mocks, fake_model_class):
+    inference = import_inference_with_mocks
+
+    class CountingModel(fake_model_class):
+        calls = 0
+        def predict(self, x, verbose=0):
+            CountingModel.calls += 1
+            return super().predict(x, verbose)
+
+    inference.install_model(CountingModel(value=0.7))
+    # Both texts normalize to the same token ids (case and punctuation are dropped)
+    first = inference.predict_one("Hello!")
+    second = inference.predict_one("hello ???")
+    assert first == second
+    assert CountingModel.calls == 1
+
+    stats = inference.cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+    # predict_many only runs the rows that are not cached yet
+    inference.predict_many(["HELLO", "hello unknown"])
+    assert CountingModel.calls == 1
+
+
+def test_import_loads_only_the_tokenizer(import_inference_with_mocks):
+    import importlib
+    inference = importlib.reload(import_inference_with_mocks)
+    # Master process: tokenizer only, no model before the fork
+    assert inference.tok.encode_batch(["hello"], 4).tolist() == [[1, 0, 0, 0]]
+
+    assert not inference.model_loaded() and not inference.ready.is_set()
+    with pytest.raises(RuntimeError):
+        inference.predict_one("hello")
+
+    # What the API's startup hook does in each worker: load, then warm up
+    info = inference.startup()
+    assert inference.ready.is_set()
+    assert set(info["phases_s"]) == {"tokenizer", "model_load", "warmup"}
+    assert info["warmup_shapes"] == len(inference.warmup_shapes())
+    assert (1, inference.MAX_LEN) in inference.warmup_shapes()
+    assert inference.predict_one("hello")["sentiment"] == "pos"
+
+
+def test_cascade_answers_confident_texts(import_inference_with_mocks, monkeypatch):
+    inference = import_inference_with_mocks
+    from app.cascade import FirstStage
+
+    class Stub(FirstStage):
+        def predict_proba(self, texts):
+            return np.array([0.97 if "hello" in t else 0.6 for t in texts])
+
+    monkeypatch.setattr(inference, "first_stage", Stub(np.zeros(8), 0.0, threshold=0.9))
+    res = inference.predict_one("hello")
+    assert res["stage"] == "cascade" and np.isclose(res["proba_pos"], 0.97)
+    assert res["model_version"] == "cascade"  # the served model never ran
+    bye = inference.predict_one("bye")
+    assert bye["stage"] == "model" and bye["model_version"] == inference.MODEL_VERSION
+    # A pinned version skips the first stage
+    pinned = inference.predict_one("hello", version=inference.MODEL_VERSION)
+    assert pinned["stage"] == "model" and np.isclose(pinned["proba_pos"], 0.8)
+
+    res = inference.predict_many(["bye", "hello", "other"])
+    assert [r["stage"] for r in res] == ["model", "cascade", "model"]
+    assert [r["model_version"] for r in res] == [inference.MODEL_VERSION, "cascade", inference.MODEL_VERSION]
+    assert np.allclose([r["proba_pos"] for r in res], [0.8, 0.97, 0.8])
+    assert inference.cascade_stats()["answered"] == 2
+
+
+def test_identical_concurrent_requests_share_one_forward(import_inference_with_mocks, monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    inference = import_inference_with_mocks
+
+    class SlowModel:
+        rows = 0
+        def predict(self, x, verbose=0):
+            SlowModel.rows += len(x)
+            time.sleep(0.2)
+            return np.full((len(x), 1), 0.9)
+
+    served = inference.install_model(SlowModel())
+    served.cache = None  # coalescing works without the cache
+    start = threading.Barrier(6)
+
+    def call(text):
+        start.wait()
+        return inference.predict_one(text)
+
+    with ThreadPoolExecutor(6) as pool:
+        res = list(pool.map(call, ["Hello!"] * 5 + ["HELLO"]))  # same ids after normalization
+    assert all(np.isclose(r["proba_pos"], 0.9) for r in res)
+    assert SlowModel.rows == 1
+    assert inference.cache_stats()["coalescing"]["coalesced"] == 5
+
+
+def test_swap_releases_the_boot_model(import_inference_with_mocks, fake_model_class):
+    import gc
+    import time
+    import weakref
+    from app.registry import ServedModel
+    inference = import_inference_with_mocks
+
+    boot = fake_model_class()
+    ref = weakref.ref(boot)
+    served = inference.install_model(boot)
+    del boot
+    assert inference.predict_one("hello")["model_version"] == inference.MODEL_VERSION
+
+    inference.registry.swap(ServedModel("v2", inference.tok, lambda x: np.full(len(x), 0.3)))
+    deadline = time.monotonic() + 5
+    while not (served.retired and (served.batcher is None or served.batcher._thread is None)):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    del served
+    gc.collect()
+    assert ref() is None  # only its ServedModel referenced the boot model
+    assert inference.predict_one("hello")["model_version"] == "v2"
@@ -23,15 +23,17 @@ def import_app(monkeypatch):
     import app.main as main
 
     # Stub predict_one (avoid touching real TF)
-    def fake_predict_one(text: str):
+    def fake_predict_one(text: str, version=None, deadline=None):
         return {
             "sentiment": "pos",
             "proba_neg": 0.1,
             "proba_pos": 0.9,
             "model_version": "test:v0",
+            "stage": "model",
         }
 
     main.predict_one = fake_predict_one
+    main.predict_many = lambda texts, version=None: [fake_predict_one(t) for t in texts]
 
     # Stub telemetry client with a tiny spy object
     class FakeTC:
@@ -74,6 +76,48 @@ def test_predict_endpoint(client, import_app):
     assert any(evt[0] == "prediction" for evt in tc.events)
 
 
+def test_predict_batch_endpoint(client, import_app):
+    res = client.post("/predict_batch", json={"texts": ["I love it", "meh", "great"]})
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert len(results) == 3
+    assert all(r["sentiment"] == "pos" for r in results)
+
+    tc = import_app.telemetry_client
+    assert any(evt[0] == "prediction_batch" for evt in tc.events)
+
+
+def test_predict_batch_rejects_too_many_items(client, import_app):
+    from app.schemas import PREDICT_BATCH_MAX_ITEMS
+    res = client.post("/predict_batch", json={"texts": ["a"] * (PREDICT_BATCH_MAX_ITEMS + 1)})
+    assert res.status_code == 422 and res.json()["detail"][0]["type"] == "too_long"
+    assert client.post("/predict_batch", json={"texts": ["a"] * PREDICT_BATCH_MAX_ITEMS}).status_code == 200
+
+
+def test_predict_batch_rejects_empty_list(client):
+    res = client.post("/predict_batch", json={"texts": []})
+    assert res.status_code == 422
+
+
+def test_cache_stats_endpoint(client, import_app, monkeypatch):
+    monkeypatch.setattr(import_app, "cache_stats", lambda: {"enabled": True, "hits": 3, "misses": 1})
+    res = client.get("/cache/stats")
+    assert res.status_code == 200
+    assert res.json()["hits"] == 3
+
+
+def test_telemetry_stats_endpoint(client, import_app, monkeypatch):
+    from app.telemetry import BackgroundTelemetry, NullSink
+    tc = BackgroundTelemetry(NullSink(), max_queue=10)
+    monkeypatch.setattr(import_app, "telemetry_client", tc)
+
+    client.post("/predict", json={"text": "I love it"})
+    tc.close()
+    body = client.get("/telemetry/stats").json()
+    assert body["enabled"] is True
+    assert body["sent"] == 1 and body["dropped"] == 0
+
+
 def test_feedback_ok(client, import_app):
     payload = {
         "text": "Nice",
@@ -135,3 +179,97 @@ def test_home_serves_ui(import_app, client):
         # Cleanup
         if index.exists():
             index.unlink()
+
+
+def test_metrics_endpoint(client, import_app):
+    assert client.post("/predict", json={"text": "I love it"}).status_code == 200
+
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    body = res.text
+    assert "sentiment_model_info{" in body
+    assert 'sentiment_stage_seconds_count{stage="serialize"}' in body
+    assert 'sentiment_stage_seconds_count{stage="telemetry"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/predict",status="200"}' in body
+    assert 'http_requests_in_flight{route="/predict"} 0' in body
+
+
+def test_unknown_model_version_is_404(client, import_app, monkeypatch):
+    from app.registry import UnknownVersion
+
+    def missing(text, version=None, deadline=None):
+        raise UnknownVersion(version)
+
+    monkeypatch.setattr(import_app, "predict_one", missing)
+    res = client.post("/predict", json={"text": "I love it", "model_version": "v9"})
+    assert res.status_code == 404
+
+
+def test_saturated_worker_sheds_with_retry_after(client, import_app, monkeypatch):
+    from app.admission import AdmissionController
+    ctl = AdmissionController(max_concurrent=1, max_queue=0, retry_after_s=2,
+                              on_change=import_app.metrics.observe_admission)
+    ctl.in_flight = 1  # a long inference holds the only slot
+    monkeypatch.setattr(import_app, "admission", ctl)
+
+    res = client.post("/predict", json={"text": "I love it"})
+    assert res.status_code == 429 and res.headers["Retry-After"] == "2"
+    assert client.post("/predict_batch", json={"texts": ["a"]}).status_code == 429
+
+    ctl.max_queue = 4
+    res = client.post("/predict", json={"text": "I love it"}, headers={"X-Deadline-Ms": "20"})
+    assert res.status_code == 503 and res.headers["Retry-After"] == "2"
+    stats = client.get("/admission/stats").json()
+    assert stats["rejected_queue_full"] == 2 and stats["rejected_deadline"] == 1 and stats["queued"] == 0
+
+    ctl.in_flight = 0
+    assert client.post("/predict", json={"text": "I love it"}).status_code == 200
+    assert ctl.in_flight == 0
+    assert 'sentiment_admission_rejected_total{reason="queue_full"}' in client.get("/metrics").text
+
+    def stuck(text, version=None, deadline=None):
+        raise TimeoutError  # micro-batcher result not back before the deadline
+
+    monkeypatch.setattr(import_app, "predict_one", stuck)
+    res = client.post("/predict", json={"text": "I love it"})
+    assert res.status_code == 503 and "Retry-After" in res.headers
+    assert ctl.in_flight == 0
+
+
+def test_feedback_is_stored_for_retraining(client, import_app, monkeypatch, tmp_path):
+    from app.feedback_store import FeedbackStore, iter_records
+    store = FeedbackStore(str(tmp_path), commit_interval_ms=1)
+    monkeypatch.setattr(import_app, "feedback_store", store)
+    res = client.post("/feedback", json={"text": "not bad at all", "predicted": "neg", "correct": False})
+    assert res.status_code == 200
+    store.close()
+    assert client.get("/feedback/stats").json()["written"] == 1
+    [record] = iter_records(str(tmp_path))
+    assert record["text"] == "not bad at all" and record["label"] == 1
+
+
+def test_ready_only_once_the_model_is_warm(import_app, monkeypatch, fake_model_class):
+    import threading
+    import time
+    from app import inference
+    # Fresh worker: tokenizer loaded at import, model left to the startup hook
+    monkeypatch.setattr(inference, "loaded", threading.Event())
+    monkeypatch.setattr(inference, "ready", threading.Event())
+    monkeypatch.setattr(inference, "startup_info", {"phases_s": {}})
+    monkeypatch.setattr(inference, "load_model", lambda: inference.install_model(fake_model_class()))
+
+    client = TestClient(import_app.app)  # lifespan not run: nothing loaded
+    assert client.get("/health").status_code == 200
+    res = client.get("/ready")
+    assert res.status_code == 503 and res.json()["ready"] is False
+    res = client.post("/predict", json={"text": "hello"})
+    assert res.status_code == 503 and "Retry-After" in res.headers
+
+    with TestClient(import_app.app) as client:  # runs the startup hook
+        deadline = time.monotonic() + 10
+        while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        body = client.get("/ready").json()
+        assert body["ready"] is True and {"model_load", "warmup"} <= set(body["phases_s"])
+        assert client.post("/predict", json={"text": "hello"}).status_code == 200
@@ -0,0 +1,45 @@
+# test_metrics.py
+from app.metrics import Histogram, Metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("lat_seconds", "Latency.", ("stage",), buckets=(0.01, 0.1))
+    for v in (0.005, 0.05, 0.05, 3.0):
+        h.observe(v, "forward")
+
+    text = "\n".join(h.render())
+    assert '# TYPE lat_seconds histogram' in text
+    assert 'lat_seconds_bucket{stage="forward",le="0.01"} 1' in text
+    assert 'lat_seconds_bucket{stage="forward",le="0.1"} 3' in text
+    assert 'lat_seconds_bucket{stage="forward",le="+Inf"} 4' in text
+    assert 'lat_seconds_count{stage="forward"} 4' in text
+    assert h.count("forward") == 4
+
+
+def test_lap_records_stage_and_returns_new_start():
+    m = Metrics(enabled=True)
+    t = m.now()
+    t2 = m.lap("tokenize", t)
+    assert t2 >= t
+    m.observe_forward(8, 0.002)
+    assert m.stages.count("tokenize") == 1
+    assert m.stages.count("forward") == 1
+    assert m.batch_rows.count() == 1
+
+
+def test_disabled_metrics_record_nothing():
+    m = Metrics(enabled=False)
+    assert m.now() == 0.0
+    assert m.lap("tokenize", m.now()) == 0.0
+    m.observe_forward(8, 0.002)
+    m.observe_queue_wait(0.001)
+    m.handler_done()
+    assert m.stages.count("tokenize") == 0 and m.stages.count("forward") == 0
+
+
+def test_render_has_identifiers():
+    m = Metrics(enabled=True)
+    m.set_info(model_version="v1", backend="tflite")
+    text = m.render()
+    assert 'sentiment_model_info{backend="tflite",host=' in text
+    assert 'model_version="v1"' in text and ',pid="' in text
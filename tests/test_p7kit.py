@@ -0,0 +1,85 @@
+# test_p7kit.py
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("mlflow")
+tf = pytest.importorskip("tensorflow")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "notebooks"))
+from scripts import p7kit  # noqa: E402
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 100, size=(250, 6), dtype=np.int32), rng.integers(0, 2, size=250)
+
+
+def test_write_shards_splits_across_chunks(tmp_path, data):
+    X, y = data
+    chunks = p7kit.iter_encoded(list(range(250)), y, lambda idx: X[idx], chunk=70)
+    manifest = p7kit.write_shards(tmp_path, chunks, shard_rows=100)
+    assert [s["rows"] for s in manifest["shards"]] == [100, 100, 50]
+    assert manifest["rows"] == 250 and manifest["max_len"] == 6
+    np.testing.assert_array_equal(np.load(tmp_path / "shard-00001.x.npy"), X[100:200])
+    assert np.load(tmp_path / "shard-00000.y.npy").dtype == np.int8
+
+
+def test_sharded_tfds_reads_every_row(tmp_path, data):
+    X, y = data
+    p7kit.write_shards(tmp_path, [(X, y)], shard_rows=64)
+    ds = p7kit.make_sharded_tfds(tmp_path, batch_size=32, seed=1, training=False, block_rows=16)
+    xs, ys = zip(*[(xb.numpy(), yb.numpy()) for xb, yb in ds])
+    np.testing.assert_array_equal(np.concatenate(xs), X)
+    np.testing.assert_array_equal(np.concatenate(ys), y)
+
+    train = p7kit.make_sharded_tfds(tmp_path, batch_size=32, seed=1, training=True, block_rows=16)
+    assert int(train.cardinality()) == 8
+    rows = np.concatenate([xb.numpy() for xb, _ in train])
+    assert sorted(map(tuple, rows)) == sorted(map(tuple, X))
+    assert not np.array_equal(rows, X)  # shuffled
+
+
+def test_embedding_store_encodes_missing_rows_once(tmp_path):
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+    store = p7kit.EmbeddingStore(tmp_path, "glove:mean", dim=2)
+    idx = store.ensure(["a", "bb", "a", "ccc"], encode, batch_size=2)
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert idx.tolist() == [0, 1, 0, 2] and len(store) == 3
+    assert store.vectors.dtype == np.float16
+
+    again = p7kit.EmbeddingStore(tmp_path, "glove:mean")
+    idx = again.ensure(["ccc", "dddd", "bb"], encode)
+    assert calls[-1] == ["dddd"]
+    assert idx.tolist() == [2, 3, 1]
+    view = again.get(np.arange(1, 4))
+    assert np.shares_memory(view, again.vectors) and view[:, 0].tolist() == [2, 3, 4]
+    assert again.get(idx)[:, 0].tolist() == [3, 4, 2]
+    # A miss (-1) must not silently read the last stored vector
+    with pytest.raises(KeyError):
+        again.get(again.lookup(["bb", "never seen"]))
+
+    with pytest.raises(ValueError):
+        p7kit.EmbeddingStore(tmp_path, "glove:mean", dtype="float32")
+    assert len(p7kit.EmbeddingStore(tmp_path, "other", dim=2)) == 0
+
+
+def test_embedding_store_ignores_interrupted_append(tmp_path):
+    store = p7kit.EmbeddingStore(tmp_path, "m", dim=3, dtype="float32")
+    store.append(["x", "y"], np.ones((2, 3)))
+    with open(store.dir / "vectors.bin", "ab") as f:  # ajout interrompu avant meta.json
+        f.write(b"\0" * 7)
+    store = p7kit.EmbeddingStore(tmp_path, "m")
+    assert len(store) == 2 and store.lookup(["z", "y"]).tolist() == [-1, 1]
+    store.append(["z"], np.full((1, 3), 2.0))
+    assert store.get([2]).tolist() == [[2.0, 2.0, 2.0]]
+    assert (store.dir / "vectors.bin").stat().st_size == 3 * 3 * 4
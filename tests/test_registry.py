@@ -0,0 +1,153 @@
+# test_registry.py
+import json
+import time
+
+import numpy as np
+import pytest
+
+from app.registry import ModelRegistry, ServedModel, UnknownVersion
+
+
+def _served(version, value):
+    return ServedModel(version, tok=None, forward=lambda x: np.full(len(x), value))
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cond()
+
+
+def test_route_pins_version_and_rejects_unknown():
+    reg = ModelRegistry(_served("v1", 0.8))
+    reg.set_candidate(_served("v2", 0.2))
+    assert reg.route().version == "v1"
+    assert reg.route("v2").version == "v2"
+    with pytest.raises(UnknownVersion):
+        reg.route("v9")
+
+
+def test_canary_percentage():
+    reg = ModelRegistry(_served("v1", 0.8))
+    reg.set_candidate(_served("v2", 0.2), canary_pct=100)
+    assert reg.route().version == "v2"
+    reg.set_candidate(reg.candidate, canary_pct=0)
+    assert reg.route().version == "v1"
+
+
+def test_swap_keeps_in_flight_requests_on_old_version():
+    closed = []
+
+    class Batcher:
+        def close(self):
+            closed.append(True)
+
+    old = ServedModel("v1", None, lambda x: x, batcher=Batcher())
+    reg = ModelRegistry(old)
+    with reg.route().serving() as served:
+        reg.swap(_served("v2", 0.2))
+        assert reg.route().version == "v2"
+        assert served.version == "v1"
+        time.sleep(0.1)
+        assert not closed  # still serving a request
+    _wait(lambda: closed)
+
+
+class _Tok:
+    def encode_batch(self, texts, maxlen):
+        return np.zeros((len(texts), maxlen), dtype=np.int32)
+
+
+def test_retired_version_is_never_served_again():
+    from app.batching import MicroBatcher
+    old = ServedModel("v1", None, lambda x: np.full(len(x), 0.8))
+    old.batcher = MicroBatcher(old.forward, max_batch_size=4, max_wait_ms=1)
+    reg = ModelRegistry(old)
+    stale = reg.route()  # routed just before the swap...
+    reg.swap(_served("v2", 0.2))
+    _wait(lambda: old.retired and old.batcher._thread is None)
+
+    with pytest.raises(RuntimeError):  # ...and arriving after the drain
+        with stale.serving():
+            pass
+    with pytest.raises(RuntimeError):  # the closed batcher is not restarted
+        old.batcher.submit(np.zeros(3))
+    with reg.serving() as served:
+        assert served.version == "v2" and served.in_flight == 1
+    assert reg.active.in_flight == 0
+
+
+def test_shadow_records_agreement_without_serving_candidate():
+    reg = ModelRegistry(_served("v1", 0.8))
+    candidate = _served("v2", 0.3)
+    candidate.tok = _Tok()
+    reg.set_candidate(candidate, canary_pct=100, shadow=True)
+    served = reg.route()
+    assert served.version == "v1"
+
+    reg.shadow_score(served, ["a", "b", "c", "d"], np.full(4, 0.8))
+    _wait(lambda: reg.stats()["shadow_stats"]["compared"] == 4)
+    s = reg.stats()["shadow_stats"]
+    assert s["agreement"] == 0.0
+    assert s["mean_abs_diff"] == pytest.approx(0.5)
+
+
+def test_shadow_candidate_encodes_with_its_own_vocabulary(tmp_path):
+    from app.tokenizer import load_fast_tokenizer
+
+    def tokenizer(name, word_index):
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps({"config": {"word_index": json.dumps(word_index)}}), encoding="utf-8")
+        return load_fast_tokenizer(path)[0]
+
+    # Same words, retrained vocabulary: "great" is id 1 for v1 and id 7 for v2
+    v1 = ServedModel("v1", tokenizer("v1", {"great": 1, "bad": 2}), lambda x: (x[:, 0] == 1).astype(float))
+    v2 = ServedModel("v2", tokenizer("v2", {"bad": 3, "great": 7}), lambda x: (x[:, 0] == 7).astype(float))
+    reg = ModelRegistry(v1, max_len=4)
+    reg.set_candidate(v2, shadow=True)
+
+    texts = ["great", "bad", "great stuff"]
+    p_pos = v1.forward(v1.tok.encode_batch(texts, 4))
+    reg.shadow_score(v1, texts, p_pos)
+    _wait(lambda: reg.stats()["shadow_stats"]["compared"] == 3)
+    s = reg.stats()["shadow_stats"]
+    assert s["agreement"] == 1.0 and s["mean_abs_diff"] == 0.0
+
+
+def test_control_file_loads_then_swaps(tmp_path):
+    loaded = []
+
+    def loader(spec):
+        loaded.append(spec["version"])
+        return _served(spec["version"], 0.5)
+
+    cfg = tmp_path / "models.json"
+    reg = ModelRegistry(_served("v1", 0.8), loader=loader, config_path=str(cfg))
+    cfg.write_text(json.dumps({"candidate": {"version": "v2", "model_path": "m2", "canary_pct": 25}}))
+    assert reg.poll_config()
+    _wait(lambda: reg.candidate is not None)
+    assert reg.canary_pct == 25 and reg.active.version == "v1"
+    assert not reg.poll_config()  # unchanged file
+
+    # Promote: the resident candidate becomes active without reloading
+    cfg.write_text(json.dumps({"active": {"version": "v2", "model_path": "m2"}}))
+    cfg.touch()
+    reg._config_mtime = None
+    assert reg.poll_config()
+    assert reg.active.version == "v2" and reg.candidate is None
+    assert loaded == ["v2"]
+
+
+def test_inference_serves_a_loaded_version(import_inference_with_mocks, fake_model_class, tmp_path):
+    inference = import_inference_with_mocks
+    served = inference.load_version({"version": "v2", "model_path": str(tmp_path / "m2.keras")})
+    inference.registry.set_candidate(served)
+
+    assert inference.predict_one("hello")["model_version"] == inference.MODEL_VERSION
+    res = inference.predict_one("hello", version="v2")
+    assert res["model_version"] == "v2" and res["sentiment"] == "pos"
+    assert inference.predict_many(["a", "b"], version="v2")[1]["model_version"] == "v2"
+    stats = inference.model_stats()
+    assert stats["candidate"]["version"] == "v2" and stats["candidate"]["served"] == 2
+    served.drain()
@@ -0,0 +1,34 @@
+# test_runtime.py
+import queue
+import threading
+import time
+
+from app.runtime import stop_worker, thread_budget
+
+
+def test_thread_budget_splits_cores_between_workers():
+    assert thread_budget(2, cpus=8) == 4
+    assert thread_budget(3, cpus=8) == 2
+    assert thread_budget(8, cpus=4) == 1
+    assert thread_budget(0, cpus=4) == 4
+
+
+def test_stop_worker_is_bounded_with_a_full_queue():
+    q = queue.Queue(maxsize=1)
+    release = threading.Event()
+    stuck = threading.Thread(target=release.wait, args=(10,), daemon=True)
+    stuck.start()
+    q.put("pending")  # full, and nobody drains it
+    t0 = time.monotonic()
+    stop_worker(stuck, q, timeout=0.1)
+    assert time.monotonic() - t0 < 1
+    release.set()
+
+    def drain():
+        while q.get() is not None:
+            pass
+
+    worker = threading.Thread(target=drain, daemon=True)
+    worker.start()
+    stop_worker(worker, q, timeout=5)
+    assert not worker.is_alive()
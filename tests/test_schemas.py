@@ -2,7 +2,7 @@
 import pytest
 from pydantic import ValidationError
 
-from app.schemas import PredictRequest, FeedbackRequest, PredictResponse
+from app.schemas import PredictRequest, FeedbackRequest, PredictResponse, PredictBatchRequest
 
 
 def test_predict_request_min_length():
@@ -31,4 +31,9 @@ def test_predict_response_shape():
     )
     assert pr.sentiment in {"pos", "neg"}
     assert 0.0 <= pr.proba_pos <= 1.0
-    assert 0.0 <= pr.proba_neg <= 1.0
\ No newline at end of file
+    assert 0.0 <= pr.proba_neg <= 1.0
+
+def test_predict_batch_request_rejects_empty_items():
+    with pytest.raises(ValidationError):
+        PredictBatchRequest(texts=["ok", ""])
+    assert PredictBatchRequest(texts=["a", "b"]).texts == ["a", "b"]
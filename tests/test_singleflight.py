@@ -0,0 +1,99 @@
+# test_singleflight.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    sf = SingleFlight()
+    release, calls = threading.Event(), []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    with ThreadPoolExecutor(6) as pool:
+        futs = [pool.submit(sf.do, "k", compute) for _ in range(6)]
+        while sf.stats()["coalesced"] < 5:
+            time.sleep(0.001)
+        assert sf.do("other", lambda: 7) == 7  # other keys are not held up
+        release.set()
+        assert [f.result() for f in futs] == [42] * 6
+    assert len(calls) == 1
+    assert sf.stats() == {"in_flight": 0, "computed": 2, "coalesced": 5, "coalesced_rate": 5 / 7}
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    sf = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(sf.do, "k", fail)
+        started.wait(5)
+        follower = pool.submit(sf.do, "k", lambda: "never called")
+        while sf.stats()["coalesced"] < 1:
+            time.sleep(0.001)
+        release.set()
+        for f in (leader, follower):
+            with pytest.raises(ValueError):
+                f.result()
+    assert sf.do("k", lambda: "retried") == "retried"
+
+
+def test_async_callers_coalesce_with_each_other_and_with_threads():
+    sf = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "p"
+
+    async def scenario():
+        tasks = [asyncio.create_task(sf.do_async("k", compute)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        # A thread asking for the same key waits for the coroutine's result
+        from_thread = await asyncio.to_thread(sf.do, "k", lambda: "not shared")
+        return await asyncio.gather(*tasks), from_thread
+
+    results, from_thread = asyncio.run(scenario())
+    assert results == ["p"] * 4 and from_thread == "p" and len(calls) == 1
+
+
+def test_followers_keep_their_own_deadline():
+    sf = SingleFlight()
+    started = threading.Event()
+
+    def leader_times_out():
+        started.set()
+        time.sleep(0.3)
+        raise TimeoutError  # the leader's deadline
+
+    with ThreadPoolExecutor(3) as pool:
+        leader = pool.submit(sf.do, "k", leader_times_out, 0.3)
+        started.wait(5)
+        short = pool.submit(sf.do, "k", lambda: "never called", 0.05)
+        long = pool.submit(sf.do, "k", lambda: "own result", 5)
+        while sf.stats()["coalesced"] < 2:
+            time.sleep(0.001)
+
+        t = time.monotonic()
+        with pytest.raises(TimeoutError):
+            short.result()
+        assert time.monotonic() - t < 0.2  # gave up at its own deadline, not the leader's
+        with pytest.raises(TimeoutError):
+            leader.result()
+        # Time left when the leader timed out: computed again, as leader
+        assert long.result() == "own result"
+    assert sf.stats()["in_flight"] == 0
@@ -0,0 +1,112 @@
+# test_telemetry.py
+import json
+import threading
+
+from app.telemetry import BackgroundTelemetry, NullSink, build_sink
+
+
+class ListSink:
+    def __init__(self):
+        self.batches = []
+    def send(self, events):
+        self.batches.append(list(events))
+
+
+def test_batches_by_size_and_flushes_on_close():
+    sink = ListSink()
+    tc = BackgroundTelemetry(sink, max_queue=100, batch_size=3, flush_interval_s=60)
+    for i in range(7):
+        tc.track_event("prediction", {"i": i})
+    tc.close()
+
+    assert [len(b) for b in sink.batches] == [3, 3, 1]
+    assert tc.stats()["sent"] == 7
+    assert tc.stats()["dropped"] == 0
+
+
+def test_flushes_on_interval():
+    sent = threading.Event()
+
+    class Sink(ListSink):
+        def send(self, events):
+            super().send(events)
+            sent.set()
+
+    sink = Sink()
+    tc = BackgroundTelemetry(sink, batch_size=100, flush_interval_s=0.05)
+    tc.track_event("prediction", {})
+    assert sent.wait(5)
+    assert sink.batches == [[("prediction", {})]]
+    tc.close()
+
+
+def test_drops_instead_of_blocking_when_full():
+    release = threading.Event()
+
+    class SlowSink(ListSink):
+        def send(self, events):
+            release.wait(5)
+            super().send(events)
+
+    tc = BackgroundTelemetry(SlowSink(), max_queue=2, batch_size=1, flush_interval_s=60)
+    for _ in range(20):
+        tc.track_event("prediction", {})
+    assert tc.stats()["dropped"] > 0
+    assert tc.stats()["queue_depth"] <= 2
+    release.set()
+    tc.close()
+
+
+def test_close_returns_with_full_queue_and_hung_sink():
+    import time
+    release = threading.Event()
+
+    class HungSink(ListSink):
+        def send(self, events):
+            release.wait(10)
+
+    tc = BackgroundTelemetry(HungSink(), max_queue=2, batch_size=1, flush_interval_s=60)
+    for _ in range(5):
+        tc.track_event("prediction", {})
+    t0 = time.monotonic()
+    tc.close(timeout=0.2)
+    assert time.monotonic() - t0 < 2
+    release.set()
+
+
+def test_events_after_close_are_dropped():
+    sink = ListSink()
+    tc = BackgroundTelemetry(sink, batch_size=1, flush_interval_s=60)
+    tc.track_event("prediction", {})
+    tc.close()
+    tc.track_event("late", {})
+    tc.close()
+    assert sink.batches == [[("prediction", {})]]
+    assert tc.stats()["dropped"] == 1 and tc._thread is None  # no writer restarted
+
+
+def test_sink_errors_are_counted_not_raised():
+    class Broken:
+        def send(self, events):
+            raise ConnectionError("offline")
+
+    tc = BackgroundTelemetry(Broken(), batch_size=1)
+    tc.track_event("prediction", {})
+    tc.close()
+    assert tc.stats()["send_errors"] == 1
+
+
+def test_file_sink_writes_jsonl(tmp_path):
+    path = tmp_path / "events.jsonl"
+    tc = BackgroundTelemetry(build_sink("file", path=str(path)), batch_size=10)
+    tc.track_event("feedback_ok", {"predicted": "pos"})
+    tc.close()
+    line = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    assert line["name"] == "feedback_ok"
+    assert line["properties"] == {"predicted": "pos"}
+
+
+def test_build_sink_without_key_is_disabled():
+    assert build_sink("appinsights", None) is None
+    assert build_sink("none") is None
+    assert isinstance(build_sink("null"), NullSink)
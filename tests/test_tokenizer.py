@@ -0,0 +1,121 @@
+# test_tokenizer.py
+import json
+
+import numpy as np
+import pytest
+
+from app import tokenizer as lite
+
+CORPUS = [
+    "I love it!!",
+    "Hello, WORLD... hello again",
+    "@user check http://t.co/xyz #great :)",
+    "   ",
+    "tabs\tand\nnewlines",
+    "unknown words only",
+    "Ça c'est génial",
+    "hello " * 100,
+]
+
+
+@pytest.fixture(params=[(None, None), (5, "<OOV>")], ids=["plain", "num_words+oov"])
+def keras_tokenizer(request):
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    num_words, oov = request.param
+    tok = Tokenizer(num_words=num_words, oov_token=oov)
+    tok.fit_on_texts(["hello world hello love it great", "c'est génial world check"])
+    return tok
+
+
+def test_texts_to_sequences_matches_keras(keras_tokenizer):
+    ours = lite.tokenizer_from_json(keras_tokenizer.to_json())
+    assert ours.texts_to_sequences(CORPUS) == keras_tokenizer.texts_to_sequences(CORPUS)
+
+
+@pytest.mark.parametrize("padding,truncating", [("post", "post"), ("pre", "pre"), ("post", "pre")])
+def test_pad_sequences_matches_keras(padding, truncating):
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+    seqs = [[], [1], [1, 2, 3, 4, 5, 6], list(range(1, 12))]
+    expected = pad_sequences(seqs, maxlen=8, padding=padding, truncating=truncating)
+    got = lite.pad_sequences(seqs, maxlen=8, padding=padding, truncating=truncating)
+    assert got.dtype == expected.dtype
+    np.testing.assert_array_equal(got, expected)
+
+
+def _random_corpus(n=300, seed=0):
+    import random
+    rnd = random.Random(seed)
+    words = ["hello", "World", "love", "it", "great", "c'est", "génial", "check", "#tag", "@user",
+             "http://t.co/x", "!!", "...", "ÉTÉ", "tab\tbed", "new\nline", "", "  ", "zzz", "lol"]
+    return [" ".join(rnd.choice(words) for _ in range(rnd.randint(0, 120))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("config", [
+    {},
+    {"num_words": 5},
+    {"num_words": 5, "oov_token": "<OOV>"},
+    {"oov_token": "<OOV>"},
+    {"lower": False},
+    {"char_level": True, "oov_token": "?"},
+    {"filters": "#@", "split": "-"},
+], ids=repr)
+def test_fast_tokenizer_bit_identical_to_keras(config):
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+    corpus = CORPUS + _random_corpus()
+    keras_tok = Tokenizer(**config)
+    keras_tok.fit_on_texts(_random_corpus(50, seed=1))
+    expected = pad_sequences(keras_tok.texts_to_sequences(corpus), maxlen=80, padding="post", truncating="post")
+
+    fast = lite.fast_tokenizer_from_json(keras_tok.to_json())
+    got = fast.encode_batch(corpus, 80)
+    assert got.dtype == expected.dtype == np.int32
+    np.testing.assert_array_equal(got, expected)
+    assert fast.texts_to_sequences(corpus) == keras_tok.texts_to_sequences(corpus)
+
+
+def test_pad_batch_handles_empty_rows():
+    x = lite.FastTokenizer.pad_batch([[3, 1], [], [2]], 4)
+    np.testing.assert_array_equal(x, [[3, 1, 0, 0], [0, 0, 0, 0], [2, 0, 0, 0]])
+    assert lite.FastTokenizer.pad_batch([], 4).shape == (0, 4)
+
+
+def test_binary_cache_round_trip(tmp_path):
+    word_index = {"hello": 1, "world": 2, "génial": 3, "c'est": 4, "<OOV>": 5}
+    src = tmp_path / "tokenizer.json"
+    src.write_text(json.dumps({"config": {"word_index": json.dumps(word_index), "num_words": 4,
+                                          "oov_token": "<OOV>", "filters": "!,"}}), encoding="utf-8")
+    cache = tmp_path / "tokenizer.cache.npz"
+
+    first, source = lite.load_fast_tokenizer(src, cache)
+    assert source == "json" and cache.exists()
+    second, source = lite.load_fast_tokenizer(src, cache)
+    assert source == "cache"
+    assert second.word_index == word_index
+    assert (second.num_words, second.oov_token, second.filters) == (4, "<OOV>", "!,")
+    texts = ["Hello, world!", "c'est génial", "unknown"]
+    np.testing.assert_array_equal(second.encode_batch(texts, 6), first.encode_batch(texts, 6))
+
+    # A new tokenizer.json invalidates the cache
+    src.write_text(json.dumps({"config": {"word_index": json.dumps({"hello": 1})}}), encoding="utf-8")
+    third, source = lite.load_fast_tokenizer(src, cache)
+    assert source == "json" and third.word_index == {"hello": 1}
+
+
+def test_binary_cache_skipped_when_not_writable(tmp_path):
+    src = tmp_path / "tokenizer.json"
+    src.write_text(json.dumps({"config": {"word_index": json.dumps({"hello": 1})}}), encoding="utf-8")
+    tok, source = lite.load_fast_tokenizer(src, tmp_path / "missing" / "tokenizer.cache.npz")
+    assert source == "json_uncached"
+    assert tok.encode_batch(["hello"], 2).tolist() == [[1, 0]]
+
+
+def test_corrupt_binary_cache_falls_back_to_json(tmp_path):
+    src = tmp_path / "tokenizer.json"
+    src.write_text(json.dumps({"config": {"word_index": json.dumps({"hello": 1})}}), encoding="utf-8")
+    cache = tmp_path / "tokenizer.cache.npz"
+    cache.write_bytes(b"PK\x03\x04garbage")
+    tok, source = lite.load_fast_tokenizer(src, cache)
+    assert source == "json" and tok.word_index == {"hello": 1}
+    assert lite.load_fast_tokenizer(src, cache)[1] == "cache"  # rebuilt
@@ -0,0 +1,45 @@
+# test_transformer.py
+import numpy as np
+import pytest
+
+from app.backends import make_backend
+from app.transformer import trim_padding, weights_bytes
+
+
+def test_trim_padding_cuts_batch_to_longest_row():
+    x = np.array([[101, 7, 102, 0, 0, 0], [101, 102, 0, 0, 0, 0]], dtype=np.int32)
+    ids, mask = trim_padding(x)
+    assert ids.tolist() == [[101, 7, 102], [101, 102, 0]]
+    assert mask.tolist() == [[True, True, True], [True, True, False]]
+    # An all-padding batch keeps one position
+    assert trim_padding(np.zeros((2, 6), dtype=np.int32))[0].shape == (2, 1)
+
+
+def test_transformer_rejects_length_buckets():
+    with pytest.raises(ValueError, match="LENGTH_BUCKETS"):
+        make_backend("transformer", None, 128, model_path="unused", length_buckets=(32,))
+
+
+def test_weights_bytes_counts_weight_files(tmp_path):
+    (tmp_path / "model.safetensors").write_bytes(b"x" * 10)
+    (tmp_path / "config.json").write_text("{}")
+    assert weights_bytes(tmp_path) == 10
+
+
+def test_wordpiece_tokenizer_pads_with_special_tokens(tmp_path):
+    tokenizers = pytest.importorskip("tokenizers")
+    from tokenizers import models, normalizers, pre_tokenizers, processors
+    from app.transformer import WordPieceTokenizer
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, "[CLS]": 2, "[SEP]": 3, "i": 4, "love": 5, "it": 6}
+    tok = tokenizers.Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tok.normalizer = normalizers.Lowercase()
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 2), ("[SEP]", 3)])
+    tok.save(str(tmp_path / "tokenizer.json"))
+
+    wp = WordPieceTokenizer(str(tmp_path))
+    x = wp.encode_batch(["I love it", "love love love love"], 5)
+    assert x.tolist() == [[2, 4, 5, 6, 3], [2, 5, 5, 5, 3]]
+    assert wp.encode_batch(["it"], 6).tolist() == [[2, 6, 3, 0, 0, 0]]